@@ -1,47 +1,216 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import threading
+import hashlib
+import logging
+import base64
+import queue
 import time
 import os
+import re
+
+from render import atomic_output
+
+logger = logging.getLogger(__name__)
+
+WAIT_READY_STATE = "readystate"
+WAIT_NETWORK_IDLE = "networkidle"
+WAIT_MODES = (WAIT_READY_STATE, WAIT_NETWORK_IDLE)
+
+DEFAULT_BROWSERS = 4
+NETWORK_IDLE_SECONDS = 0.5
+POLL_INTERVAL = 0.1
+
+# Page.printToPDF equivalents of the print preview settings the kiosk flow used:
+# no header or footer, minimum margins, 175% scale and CSS backgrounds.
+PRINT_OPTIONS = {
+    "displayHeaderFooter": False,
+    "printBackground": True,
+    "scale": 1.75,
+    "marginTop": 0.4,
+    "marginBottom": 0.4,
+    "marginLeft": 0.4,
+    "marginRight": 0.4,
+}
+
+
+def new_browser(headless=True):
+    # selenium is only imported once a browser is actually needed.
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    return webdriver.Chrome(options=chrome_options)
+
+
+def pdf_filename(title, url):
+    # The print dialog named files after the page title; fall back to the URL
+    # path for untitled pages. A short hash of the URL keeps pages that share
+    # a title from overwriting each other within a batch.
+    name = (title or "").strip()
+    if not name:
+        parts = urlsplit(url)
+        name = f"{parts.netloc}{parts.path}".strip('/')
+    name = re.sub(r'[\\/:*?"<>|\s]+', '_', name)[:100] or "page"
+    return f"{name}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}.pdf"
+
+
+def wait_until_ready(browser, timeout, wait_for=WAIT_READY_STATE, selector=None):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.ui import WebDriverWait
+    wait = WebDriverWait(browser, timeout, poll_frequency=POLL_INTERVAL)
+    wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+    if selector:
+        wait.until(expected_conditions.presence_of_element_located((By.CSS_SELECTOR, selector)))
+    if wait_for == WAIT_NETWORK_IDLE:
+        # Idle once no new resource entries appear for NETWORK_IDLE_SECONDS.
+        deadline = time.monotonic() + timeout
+        count = browser.execute_script("return performance.getEntriesByType('resource').length")
+        quiet_since = time.monotonic()
+        while time.monotonic() - quiet_since < NETWORK_IDLE_SECONDS:
+            if time.monotonic() > deadline:
+                logger.warning(f"Network not idle after {timeout}s on {browser.current_url}, printing anyway.")
+                break
+            time.sleep(POLL_INTERVAL)
+            current = browser.execute_script("return performance.getEntriesByType('resource').length")
+            if current != count:
+                count, quiet_since = current, time.monotonic()
+
+
+def print_to_pdf(browser, web_link, download_path, timeout=10, wait_for=WAIT_READY_STATE, selector=None,
+                 filename=None):
+    browser.get(web_link)
+    browser.execute_script("window.scrollTo(0, document.body.scrollHeight)")
+    wait_until_ready(browser, timeout, wait_for, selector)
+    result = browser.execute_cdp_cmd("Page.printToPDF", PRINT_OPTIONS)
+    output_file = os.path.join(download_path, filename or pdf_filename(browser.title, web_link))
+    with atomic_output(output_file) as out:
+        out.write(base64.b64decode(result['data']))
+    return output_file
+
+
+class BrowserPool:
+    # A fixed set of headless browsers shared by worker threads. Each browser
+    # is used by one thread at a time and is replaced if it crashes; if the
+    # replacement cannot be started the pool goes on with one browser less.
+    def __init__(self, size=DEFAULT_BROWSERS, headless=True):
+        self.size = size
+        self.headless = headless
+        self._browsers = queue.Queue()
+        self._all = []
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._browsers.put(self._launch())
+
+    def _launch(self):
+        browser = new_browser(self.headless)
+        with self._lock:
+            self._all.append(browser)
+        return browser
+
+    def _replace(self):
+        # A fresh browser, or None if none can be started.
+        try:
+            return self._launch()
+        except Exception as e:
+            with self._lock:
+                left = len(self._all)
+            logger.error(f"Error starting a replacement browser, {left} left in the pool: {e}")
+            return None
+
+    def _release(self, browser):
+        # Only live browsers go back. Once none is left, a None wakes the
+        # threads waiting for one instead of leaving them blocked forever.
+        if browser is None:
+            with self._lock:
+                if self._all:
+                    return
+        self._browsers.put(browser)
+
+    def _discard(self, browser):
+        with self._lock:
+            if browser in self._all:
+                self._all.remove(browser)
+        try:
+            browser.quit()
+        except Exception as e:
+            logger.error(f"Error closing browser: {e}")
+
+    def print_url(self, web_link, download_path, timeout=10, wait_for=WAIT_READY_STATE, selector=None):
+        browser = self._browsers.get()
+        if browser is None:
+            self._browsers.put(None)
+            logger.error(f"Error printing {web_link}: no browser left in the pool")
+            return None
+        try:
+            output_file = print_to_pdf(browser, web_link, download_path, timeout, wait_for, selector)
+            logger.debug(f"{web_link} saved as {output_file}.")
+            return output_file
+        except Exception as e:
+            logger.error(f"Error printing {web_link}: {e}")
+            try:
+                browser.title
+            except Exception:
+                # The session is gone, not just the page; start a fresh browser.
+                self._discard(browser)
+                browser = self._replace()
+            return None
+        finally:
+            self._release(browser)
+
+    def print_urls(self, web_links, download_path, timeout=10, wait_for=WAIT_READY_STATE, selector=None):
+        # Returns the output file per URL, in order, None where printing failed.
+        os.makedirs(download_path, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(
+                lambda web_link: self.print_url(web_link, download_path, timeout, wait_for, selector), web_links
+            ))
+
+    def close(self):
+        with self._lock:
+            browsers, self._all = self._all, []
+        for browser in browsers:
+            try:
+                browser.quit()
+            except Exception as e:
+                logger.error(f"Error closing browser: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def download_save_as_local_pdfs(web_links, download_path, browsers=DEFAULT_BROWSERS, timeout=10,
+                                wait_for=WAIT_READY_STATE, selector=None):
+    web_links = list(web_links)
+    with BrowserPool(min(browsers, len(web_links)) or 1) as pool:
+        return pool.print_urls(web_links, download_path, timeout, wait_for, selector)
+
 
 class DownloadSaveAsLocalPDF:
-    def __init__(self, web_link, download_path, seconds=10):
+    # Single-URL wrapper kept for existing callers. `seconds` is now the
+    # longest the page may take to become ready rather than a fixed sleep.
+    def __init__(self, web_link, download_path, seconds=10, wait_for=WAIT_READY_STATE, selector=None):
         self.web_link = web_link
         self.download_path = download_path
         self.seconds = seconds
+        self.wait_for = wait_for
+        self.selector = selector
+        self.output_file = None
         self.download_save_as_local_pdf()
-    
+
     def download_save_as_local_pdf(self):
         os.makedirs(self.download_path, exist_ok=True)
-        chrome_options = Options()
-        settings = {
-            "recentDestinations": [{"id": "Save as PDF", "origin": "local"}],
-            "selectedDestinationId": "Save as PDF",
-            "version": 2,
-            "isHeaderFooterEnabled": False,
-            "customMargins": {},
-            "marginsType": 2,
-            "scaling": 175,
-            "scalingType": 3,
-            "scalingTypePdf": 3,
-            "isCssBackgroundEnabled": True
-        }
-        prefs = {
-            'printing.print_preview_sticky_settings.appState': json.dumps(settings),
-            'savefile.default_directory': self.download_path,
-            'download.directory_upgrade': True,
-            'download.extensions_to_open': 'pdf',
-            'safebrowsing.enabled': True
-        }
-        chrome_options.add_experimental_option('prefs', prefs)
-        chrome_options.add_argument('--kiosk-printing')
-
-        browser = webdriver.Chrome(options=chrome_options)
-        browser.get(self.web_link)
-        browser.execute_script("window.scrollTo(0, document.body.scrollHeight)")
-        time.sleep(self.seconds)
-        browser.execute_script('window.print();')
-        browser.execute_script("""
-                            document.querySelectorAll('print-preview-app')[0].shadowRoot.getElementById('sidebar').shadowRoot.querySelectorAll('print-preview-button-strip')[0].shadowRoot.querySelectorAll('div.controls')[0].querySelectorAll('cr-button.action-button')[0].click();
-                            """)
-        browser.close() 
\ No newline at end of file
+        browser = new_browser()
+        try:
+            self.output_file = print_to_pdf(browser, self.web_link, self.download_path, self.seconds,
+                                            self.wait_for, self.selector)
+        finally:
+            browser.quit()
@@ -0,0 +1,1519 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import socket
+import shutil
+import logging
+import argparse
+import asyncio
+import tempfile
+import importlib.util
+import tracemalloc
+import hashlib
+import threading
+import multiprocessing
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from fpdf import FPDF
+from PyPDF2 import PdfReader
+
+import sebenarnyamy
+import pmospeech
+import store
+import dedup
+import sitemap
+import http_client
+import runner
+import render
+import metrics
+import extraction
+import export
+import search
+import distributed
+
+import duckdb
+import requests
+
+logger = logging.getLogger(__name__)
+
+REGRESSION_THRESHOLD = 0.10  # slower than the baseline by more than this is a regression
+NOISE_FLOOR = 0.05  # seconds; timings below this are too noisy to compare
+
+# Every timed() measurement of this run, as written by --results.
+RESULTS = []
+current_benchmark = None
+
+SITEMAP_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{entries}
+</urlset>
+"""
+
+SITEMAP_INDEX_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{entries}
+</sitemapindex>
+"""
+
+SITEMAP_INDEX_ENTRY_TEMPLATE = "<sitemap><loc>{loc}</loc></sitemap>"
+
+SITEMAP_ENTRY_TEMPLATE = "<url><loc>{loc}</loc><lastmod>{lastmod}</lastmod></url>"
+
+ARTICLE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><title>{title}</title></head>
+<body>
+<article>
+<h1 class="entry-title">{title}</h1>
+<time class="entry-date">{date}</time>
+<div class="td-post-content">
+{paragraphs}
+<ul><li>Sumber: Kementerian Komunikasi</li><li>Tarikh: {date}</li></ul>
+</div>
+</article>
+</body>
+</html>
+"""
+
+LISTING_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><title>Ucapan</title></head>
+<body>
+<div id="primary"><main>
+<table>
+<thead><tr><th>Tajuk</th><th>Tarikh</th></tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+</main></div>
+</body>
+</html>
+"""
+
+SPEECH_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><title>{title}</title></head>
+<body>
+<div id="primary"><main><article>
+<h1 class="entry-title">{title}</h1>
+<div class="entry-content">
+{paragraphs}
+</div>
+{attachment}
+</article></main></div>
+</body>
+</html>
+"""
+
+SPEECH_ATTACHMENT_TEMPLATE = '<object class="wp-block-file__embed" data="{link}" type="application/pdf"></object>'
+
+LISTING_ROW_TEMPLATE = '<tr><td><a href="{link}">{title}</a></td><td>{date}</td></tr>'
+LISTING_LINKLESS_ROW_TEMPLATE = '<tr><td>{title}</td><td>{date}</td></tr>'
+
+# Theme markup around the post, which the fast extractors skip over.
+PAGE_CHROME_HEADER = "<nav>" + "".join(
+    f'<li class="menu-item"><a href="/kategori/{i}/">Kategori {i}</a></li>' for i in range(120)
+) + "</nav>"
+PAGE_CHROME_SIDEBAR = "<aside>" + "".join(
+    f'<div class="td-block"><h3 class="entry-title"><a href="/p/{i}/">Artikel berkaitan {i} &amp; lagi</a></h3>'
+    f'<p>Ringkasan {i}</p><script>var td_{i} = {{"a": "b"}};</script></div>' for i in range(60)
+) + "</aside>"
+
+# Saved pages of both sites, each with a .json of the link (and, for a
+# speech, the title and date from the listing) and the expected output.
+EXTRACTION_SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "extraction")
+
+# Post bodies the fast extractors must read exactly like the full soup,
+# including markup where they have to fall back from lxml.
+EXTRACTION_GOLDEN_BODIES = [
+    "<p>Biasa.</p><p>Dua &amp; tiga&nbsp;&#8220;petikan&#8221; &lt;tag&gt;</p>",
+    "<p>  ruang <b> tebal </b> ekor </p><p> </p><p></p>",
+    "<p>a<span>b<em>c</em>d</span>e<br>f</p><p><a href='/x'>pautan</a> teks</p>",
+    "<ol><li>satu</li><li>dua<ul><li>dua a</li></ul></li></ol>",
+    "<p>komen<!-- tersembunyi -->selepas</p><p>skrip<script>x()</script>gaya<style>.x{}</style>akhir</p>",
+    "<p>a<div>blok</div>c</p>",
+    "<p>a<ul><li>senarai</li></ul></p><p>a<blockquote>petik</blockquote></p>",
+    "<p>tidak ditutup<p>kedua",
+    "<ul><li>a<li>b</ul>",
+    "<p>baris\r\nbaru</p>",
+    "<p>&copy 2024 &notit; &#65 &foo; AT&T</p>",
+    "<p>é ü 中文 &hellip;</p><figure><img src=x><figcaption>kapsyen</figcaption></figure>",
+    "<p>kod<textarea>x <b>y</b></textarea>akhir</p><p>a<iframe>tiada <b>iframe</b></iframe>b</p>",
+    "<p>a<![CDATA[ data ]]>b</p><p>c<noembed>x <i>y</i></noembed>d<noframes><b>z</b></noframes></p>",
+    "<p>a<!bogus>b</ p>c</p><p>d<plaintext>selebihnya <b>teks</b></p>",
+]
+
+
+def make_listing(rows, base_url="https://www.pmo.gov.my", linkless=()):
+    # Rows numbered in linkless have a title but no link, as a listing row
+    # whose speech was taken down does.
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    return LISTING_TEMPLATE.format(rows="\n".join(
+        (LISTING_LINKLESS_ROW_TEMPLATE if i in linkless else LISTING_ROW_TEMPLATE).format(
+            link=f"{base_url}/speech/{i}/",
+            title=f"Ucapan YAB Perdana Menteri nombor {i}",
+            date=f"{i % 28 + 1:02d} {months[i % 12]} 2024",
+        )
+        for i in range(rows)
+    ))
+
+
+class SyntheticSite:
+    # max_in_flight > 0 makes the site answer 429 (with retry_after, if set)
+    # to requests beyond that many at once; crawl_delay goes into robots.txt.
+    def __init__(self, pages=2, posts_per_page=50, paragraphs=8, latency=0.0, speeches=0, attachment_pages=3,
+                 max_in_flight=0, retry_after=None, crawl_delay=None, attachment=None):
+        self.pages = pages
+        self.posts_per_page = posts_per_page
+        self.paragraphs = paragraphs
+        self.latency = latency
+        self.speeches = speeches
+        self.attachment_pages = attachment_pages
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.crawl_delay = crawl_delay
+        self.in_flight = 0
+        self.throttled = 0
+        self._attachment = attachment
+        self.base_url = ""
+        self.lastmods = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self.connections = 0
+        self._counter_lock = threading.Lock()
+
+    def connected(self):
+        with self._counter_lock:
+            self.connections += 1
+
+    def count(self, payload_size):
+        with self._counter_lock:
+            self.requests += 1
+            self.bytes_sent += payload_size
+
+    def reset_counters(self):
+        with self._counter_lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.connections = 0
+            self.throttled = 0
+
+    def enter(self):
+        # False if the request is one too many and should be throttled.
+        with self._counter_lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.throttled += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._counter_lock:
+            self.in_flight -= 1
+
+    def sitemap(self, page):
+        if page < 1 or page > self.pages:
+            return None
+        first = (page - 1) * self.posts_per_page
+        entries = "\n".join(
+            SITEMAP_ENTRY_TEMPLATE.format(loc=f"{self.base_url}/post-{i}/",
+                                          lastmod=self.lastmods.get(i, "2024-01-01T00:00:00+00:00"))
+            for i in range(first, first + self.posts_per_page)
+        )
+        return SITEMAP_TEMPLATE.format(entries=entries)
+
+    def sitemap_index(self):
+        locs = [f"{self.base_url}/wp-sitemap-posts-post-{page}.xml" for page in range(1, self.pages + 1)]
+        locs.append(f"{self.base_url}/wp-sitemap-taxonomies-category-1.xml")
+        return SITEMAP_INDEX_TEMPLATE.format(entries="\n".join(
+            SITEMAP_INDEX_ENTRY_TEMPLATE.format(loc=loc) for loc in locs
+        ))
+
+    def article(self, post):
+        if post < 0 or post >= self.pages * self.posts_per_page:
+            return None
+        paragraphs = "\n".join(
+            f"<p>Perenggan {n} untuk artikel {post}. Kenyataan ini adalah palsu dan tidak benar.</p>"
+            for n in range(self.paragraphs)
+        )
+        date = f"{post % 28 + 1:02d}/{post % 12 + 1:02d}/2024"
+        return ARTICLE_TEMPLATE.format(title=f"PALSU: Artikel ujian nombor {post}", date=date, paragraphs=paragraphs)
+
+    def speech(self, number):
+        if number < 0 or number >= self.speeches:
+            return None
+        paragraphs = "\n".join(
+            f"<p>Perenggan {n} ucapan {number}. Kerajaan komited untuk rakyat.</p>" for n in range(self.paragraphs)
+        )
+        # Every other speech embeds a PDF attachment to exercise the merge path.
+        attachment = SPEECH_ATTACHMENT_TEMPLATE.format(link=f"{self.base_url}/files/{number}.pdf") if number % 2 else ""
+        return SPEECH_TEMPLATE.format(title=f"Ucapan YAB Perdana Menteri nombor {number}", paragraphs=paragraphs,
+                                      attachment=attachment)
+
+    def attachment(self):
+        if self._attachment is None:
+            pdf = FPDF()
+            pdf.set_font("Arial", size=12)
+            for page in range(self.attachment_pages):
+                pdf.add_page()
+                pdf.multi_cell(190, 10, txt=f"Lampiran muka surat {page + 1}. " * 40)
+            self._attachment = pdf.output(dest='S').encode('latin-1')
+        return self._attachment
+
+    def render(self, path):
+        if path == "/robots.txt" and self.crawl_delay:
+            return f"User-agent: *\nCrawl-delay: {self.crawl_delay}\n", "text/plain"
+        if path == "/speech/":
+            return make_listing(self.speeches, self.base_url), "text/html"
+        if path.startswith("/speech/") and path.endswith("/"):
+            number = path[len("/speech/"):-1]
+            if number.isdigit():
+                return self.speech(int(number)), "text/html"
+        if path.startswith("/files/") and path.endswith(".pdf"):
+            return self.attachment(), "application/pdf"
+        if path == "/wp-sitemap.xml":
+            return self.sitemap_index(), "application/xml"
+        if path.startswith("/wp-sitemap-posts-post-") and path.endswith(".xml"):
+            number = path[len("/wp-sitemap-posts-post-"):-len(".xml")]
+            if number.isdigit():
+                return self.sitemap(int(number)), "application/xml"
+        elif path.startswith("/post-") and path.endswith("/"):
+            number = path[len("/post-"):-1]
+            if number.isdigit():
+                return self.article(int(number)), "text/html"
+        return None, None
+
+
+def make_handler(site):
+    class SyntheticSiteHandler(BaseHTTPRequestHandler):
+        # HTTP/1.1 so that clients can keep connections alive between requests.
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; without TCP_NODELAY
+            # a kept-alive connection stalls on delayed ACKs after each one.
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            site.connected()
+
+        def do_GET(self):
+            if not site.enter():
+                self.send_response(429)
+                if site.retry_after is not None:
+                    self.send_header("Retry-After", str(site.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            try:
+                self.respond()
+            finally:
+                site.leave()
+
+        def respond(self):
+            if site.latency:
+                time.sleep(site.latency)
+            body, content_type = site.render(self.path)
+            if body is None:
+                site.count(0)
+                self.send_error(404)
+                return
+            payload = body if isinstance(body, bytes) else body.encode('utf-8')
+            etag = '"' + hashlib.md5(payload).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                site.count(0)
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            site.count(len(payload))
+            self.send_response(200)
+            self.send_header("Content-Type", content_type if isinstance(body, bytes) else f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SyntheticSiteHandler
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients going away mid-response (a killed worker) are expected.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class LocalServer:
+    def __init__(self, site):
+        self.site = site
+        self.httpd = QuietHTTPServer(("127.0.0.1", 0), make_handler(site))
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        site.base_url = self.base_url
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.3f}s")
+    RESULTS.append({"benchmark": current_benchmark, "label": label, "seconds": elapsed})
+    return elapsed
+
+
+def bench_sebenarnya_crawl(pages, posts_per_page, latency, concurrency, rate_limit):
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency)
+    with LocalServer(site) as server:
+        template = server.base_url + "/wp-sitemap-posts-post-{}.xml"
+        index_url = server.base_url + "/wp-sitemap.xml"
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            results = {}
+            for mode in ("sequential", "async"):
+                pdf_dir = os.path.join(workdir, mode)
+                os.makedirs(pdf_dir)
+                db_path = os.path.join(workdir, f"{mode}.db")
+                if mode == "sequential":
+                    results[mode] = timed(f"sebenarnya {mode}", sebenarnyamy.main, template, pdf_dir, db_path,
+                                          sitemap_index_url=index_url)
+                else:
+                    results[mode] = timed(
+                        f"sebenarnya {mode} (concurrency={concurrency})", asyncio.run,
+                        sebenarnyamy.main_async(template, pdf_dir, db_path, concurrency, rate_limit,
+                                                sitemap_index_url=index_url),
+                    )
+                rows = sebenarnyamy.SebenarnyaMYData(db_path).read_records()
+                print(f"{'':<40} {len(rows)} records, {len(os.listdir(pdf_dir))} PDFs")
+            print(f"{'speedup':<40} {results['sequential'] / results['async']:8.2f}x")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_sebenarnya_incremental(pages, posts_per_page, latency):
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency)
+    with LocalServer(site) as server:
+        template = server.base_url + "/wp-sitemap-posts-post-{}.xml"
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            db_path = os.path.join(workdir, "incremental.db")
+            index_url = server.base_url + "/wp-sitemap.xml"
+            for run in ("initial", "unchanged", "one updated"):
+                if run == "one updated":
+                    site.lastmods[0] = "2024-06-01T00:00:00+00:00"
+                site.reset_counters()
+                timed(f"sebenarnya incremental, {run}", sebenarnyamy.main, template, workdir, db_path,
+                      incremental=True, sitemap_index_url=index_url)
+                print(f"{'':<40} {site.requests} requests, {site.bytes_sent} bytes")
+                store.close_all_connections()
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_sitemap_parse(entries):
+    site = SyntheticSite(pages=1, posts_per_page=entries)
+    payload = site.sitemap(1).encode('utf-8')
+
+    def legacy_parse():
+        # The pre-iterparse extraction: decode the whole body, split on <loc>.
+        xml_content = payload.decode('utf-8')
+        return [part.split("</loc>")[0].strip() for part in xml_content.split("<loc>")[1:]]
+
+    def streaming_parse():
+        return [loc for _, loc, _ in sitemap.iter_sitemap(io.BytesIO(payload))]
+
+    for label, func in (("split on <loc>", legacy_parse), ("iterparse", streaming_parse)):
+        timed(f"sitemap {label} ({entries} entries)", func)
+        # Measured in a second pass; tracemalloc slows the parse down several times.
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{'':<40} peak {peak / 1024 / 1024:.1f} MiB (body {len(payload) / 1024 / 1024:.1f} MiB)")
+
+
+def bench_render_pool(pages, posts_per_page, speeches, latency, render_workers):
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency, speeches=speeches)
+    with LocalServer(site) as server:
+        template = server.base_url + "/wp-sitemap-posts-post-{}.xml"
+        index_url = server.base_url + "/wp-sitemap.xml"
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            for workers in (0, render_workers):
+                label = "inline" if workers == 0 else f"{workers} render workers"
+                pdf_dir = os.path.join(workdir, f"sebenarnya-{workers}")
+                os.makedirs(pdf_dir)
+                db_path = os.path.join(workdir, f"sebenarnya-{workers}.db")
+                timed(f"sebenarnya render {label}", sebenarnyamy.main, template, pdf_dir, db_path,
+                      sitemap_index_url=index_url, render_workers=workers)
+                rows = sebenarnyamy.SebenarnyaMYData(db_path).read_records()
+                print(f"{'':<40} {len(rows)} records, {len(os.listdir(pdf_dir))} PDFs")
+
+                pdf_dir = os.path.join(workdir, f"pmo-{workers}")
+                os.makedirs(pdf_dir)
+                db_path = os.path.join(workdir, f"pmo-{workers}.db")
+                timed(f"pmo render {label}", pmospeech.main, server.base_url + "/speech/", db_path,
+                      render_workers=workers, pdf_store_path=pdf_dir)
+                rows = pmospeech.PMOSpeechData(db_path).read_records()
+                print(f"{'':<40} {len(rows)} records, {len(os.listdir(pdf_dir))} PDFs")
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_text_only(pages, posts_per_page, speeches, latency):
+    # The same crawls with and without rendering: text-only runs keep the
+    # records and their text but skip PDFs and attachment downloads.
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency, speeches=speeches)
+    with LocalServer(site) as server:
+        template = server.base_url + "/wp-sitemap-posts-post-{}.xml"
+        index_url = server.base_url + "/wp-sitemap.xml"
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            results = {}
+            for mode in ("pdf", "text"):
+                pdf_dir = os.path.join(workdir, mode)
+                os.makedirs(pdf_dir)
+                pdf_store_path = pdf_dir if mode == "pdf" else None
+                site.reset_counters()
+                db_path = os.path.join(workdir, f"sebenarnya-{mode}.db")
+                results[mode] = timed(f"sebenarnya and pmo, {mode}", lambda: (
+                    sebenarnyamy.main(template, pdf_store_path, db_path, sitemap_index_url=index_url, render_workers=0),
+                    pmospeech.main(server.base_url + "/speech/", os.path.join(workdir, f"pmo-{mode}.db"),
+                                   render_workers=0, pdf_store_path=pdf_store_path),
+                ))
+                texts = sum(
+                    store.get_connection(os.path.join(workdir, f"{name}-{mode}.db")).execute(
+                        f"SELECT COUNT(*) FROM {table}_text").fetchone()[0]
+                    for name, table in (("sebenarnya", "SebenarnyaMY"), ("pmo", "PMO_speech_data"))
+                )
+                assert texts == pages * posts_per_page + speeches, f"expected a text per record, found {texts}"
+                print(f"{'':<40} {site.requests} requests, {texts} texts, {len(os.listdir(pdf_dir))} PDFs")
+            print(f"{'speedup':<40} {results['pdf'] / results['text']:8.2f}x")
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_response_cache(pages, posts_per_page, speeches, latency):
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency, speeches=speeches)
+    with LocalServer(site) as server:
+        template = server.base_url + "/wp-sitemap-posts-post-{}.xml"
+        index_url = server.base_url + "/wp-sitemap.xml"
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            pdf_dir = os.path.join(workdir, "sebenarnya")
+            os.makedirs(pdf_dir)
+            db_path = os.path.join(workdir, "sebenarnya.db")
+            cache_dir = os.path.join(workdir, "cache-sebenarnya")
+            runs = (
+                ("sebenarnya cached crawl", {}),
+                # Records lost but PDFs and cache intact: bodies are fetched
+                # again and every render is skipped.
+                ("sebenarnya re-crawl, bodies unchanged", {}),
+                ("sebenarnya reparse from cache", {"reparse_from_cache": True}),
+            )
+            for label, options in runs:
+                if label.startswith("sebenarnya re-crawl"):
+                    store.get_connection(db_path).execute("DELETE FROM SebenarnyaMY")
+                    store.close_all_connections()
+                site.reset_counters()
+                timed(label, sebenarnyamy.main, template, pdf_dir, db_path, sitemap_index_url=index_url,
+                      cache_dir=cache_dir, **options)
+                rows = sebenarnyamy.SebenarnyaMYData(db_path).read_records()
+                print(f"{'':<40} {site.requests} requests, {len(rows)} records, {len(os.listdir(pdf_dir))} PDFs")
+                store.close_all_connections()
+
+            pdf_dir = os.path.join(workdir, "pmo")
+            os.makedirs(pdf_dir)
+            db_path = os.path.join(workdir, "pmo.db")
+            cache_dir = os.path.join(workdir, "cache-pmo")
+            for label, reparse in (("pmo cached crawl", False), ("pmo reparse from cache", True)):
+                site.reset_counters()
+                timed(label, pmospeech.main, server.base_url + "/speech/", db_path, pdf_store_path=pdf_dir,
+                      cache_dir=cache_dir, reparse_from_cache=reparse)
+                rows = pmospeech.PMOSpeechData(db_path).read_records()
+                print(f"{'':<40} {site.requests} requests, {len(rows)} records, {len(os.listdir(pdf_dir))} PDFs")
+                store.close_all_connections()
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_runner(pages, posts_per_page, speeches, latency, concurrency, rate_limit, render_workers):
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency, speeches=speeches)
+    with LocalServer(site) as server:
+        template = server.base_url + "/wp-sitemap-posts-post-{}.xml"
+        index_url = server.base_url + "/wp-sitemap.xml"
+        listing_url = server.base_url + "/speech/"
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            def paths(label):
+                for name in ("sebenarnya", "pmo"):
+                    os.makedirs(os.path.join(workdir, f"{label}-{name}"))
+                return {name: (os.path.join(workdir, f"{label}-{name}"), os.path.join(workdir, f"{label}-{name}.db"))
+                        for name in ("sebenarnya", "pmo")}
+
+            def sequential_scripts():
+                (sebenarnya_pdfs, sebenarnya_db), (pmo_pdfs, pmo_db) = targets["scripts"].values()
+                sebenarnyamy.main(template, sebenarnya_pdfs, sebenarnya_db, sitemap_index_url=index_url)
+                pmospeech.main(listing_url, pmo_db, pdf_store_path=pmo_pdfs)
+
+            def one_runner():
+                (sebenarnya_pdfs, sebenarnya_db), (pmo_pdfs, pmo_db) = targets["runner"].values()
+                sources = [
+                    sebenarnyamy.SebenarnyaMYSource(template, index_url, sebenarnya_pdfs, sebenarnya_db),
+                    pmospeech.PMOSpeechSource(listing_url, pmo_pdfs, pmo_db),
+                ]
+                asyncio.run(runner.Runner(concurrency * 2, concurrency, rate_limit, render_workers).run(sources))
+
+            targets = {"scripts": paths("scripts"), "runner": paths("runner")}
+            results = {}
+            for label, func in (("scripts", sequential_scripts), ("runner", one_runner)):
+                results[label] = timed(f"both sources, {'sequential scripts' if label == 'scripts' else 'one runner'}",
+                                       func)
+                counts = []
+                for name, store_class in (("sebenarnya", sebenarnyamy.SebenarnyaMYData),
+                                          ("pmo", pmospeech.PMOSpeechData)):
+                    pdf_dir, db_path = targets[label][name]
+                    counts.append(f"{name} {len(store_class(db_path).read_records())} records, "
+                                  f"{len(os.listdir(pdf_dir))} PDFs")
+                print(f"{'':<40} {'; '.join(counts)}")
+                store.close_all_connections()
+            print(f"{'speedup':<40} {results['scripts'] / results['runner']:8.2f}x")
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_politeness(pages, posts_per_page, speeches, latency, concurrency):
+    # The runner against a host that takes only a few requests at a time and
+    # answers 429 beyond that: concurrency has to settle below the limit and
+    # every throttled item has to come back instead of being dropped. Then
+    # against a host whose robots.txt asks for a crawl-delay.
+    items = pages * posts_per_page + speeches
+    for label, site in (
+        ("unlimited host", SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency,
+                                         speeches=speeches)),
+        ("host taking 3 at a time", SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency,
+                                                  speeches=speeches, max_in_flight=3, retry_after=1)),
+    ):
+        with LocalServer(site) as server:
+            workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+            try:
+                sources = [
+                    sebenarnyamy.SebenarnyaMYSource(server.base_url + "/wp-sitemap-posts-post-{}.xml",
+                                                    server.base_url + "/wp-sitemap.xml", None,
+                                                    os.path.join(workdir, "sebenarnya.db")),
+                    pmospeech.PMOSpeechSource(server.base_url + "/speech/", None, os.path.join(workdir, "pmo.db")),
+                ]
+                run = runner.Runner(concurrency * 2, concurrency, 0, 0)
+                stats = []
+                timed(label, lambda: stats.extend(asyncio.run(run.run(sources))))
+                saved = sum(source_stats.saved for source_stats in stats)
+                requeued = sum(source_stats.requeued for source_stats in stats)
+                print(f"{'':<40} {saved} saved, {requeued} requeued, {site.throttled} throttled responses")
+                for line in run._limiter.summary():
+                    print(f"{'':<40} {line}")
+                assert saved == items, f"expected {items} records, saved {saved}"
+            finally:
+                store.close_all_connections()
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    # robots.txt only allows whole seconds.
+    crawl_delay, articles = 1, 3
+    site = SyntheticSite(pages=1, posts_per_page=articles, crawl_delay=crawl_delay)
+    with LocalServer(site) as server:
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            source = sebenarnyamy.SebenarnyaMYSource(server.base_url + "/wp-sitemap-posts-post-{}.xml",
+                                                     server.base_url + "/wp-sitemap.xml", None,
+                                                     os.path.join(workdir, "sebenarnya.db"))
+            elapsed = timed(f"{articles} articles, crawl-delay {crawl_delay}s", asyncio.run,
+                            runner.Runner(concurrency, concurrency, 0, 0).run([source]))
+            assert elapsed >= (articles - 1) * crawl_delay, "crawl-delay was not honoured"
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def distributed_worker(base_url, coordination, shard_dir, worker, concurrency, lease):
+    # Entry point of one worker process in bench_distributed. Text only, so
+    # the comparison measures the crawl, not how many cores render PDFs.
+    logging.getLogger().setLevel(logging.WARNING)
+    sources = [
+        sebenarnyamy.SebenarnyaMYSource(base_url + "/wp-sitemap-posts-post-{}.xml", base_url + "/wp-sitemap.xml", None,
+                                        distributed.worker_db_path(shard_dir, "sebenarnyamy", worker)),
+        pmospeech.PMOSpeechSource(base_url + "/speech/", None,
+                                  distributed.worker_db_path(shard_dir, "pmospeech", worker)),
+    ]
+    coordinator = distributed.Coordinator(coordination, lease)
+    asyncio.run(distributed.ShardedRunner(coordinator, worker, 8, concurrency, concurrency, 0, 0).run(sources))
+
+
+# Run in a fresh interpreter by bench_startup, so that every measurement
+# includes the imports a cron invocation pays for.
+STARTUP_SCRIPT = """
+import sys, asyncio, runner
+base_url, workdir, mode = sys.argv[1:]
+sources = [
+    runner.load_source("sebenarnyamy", xml_url_template=base_url + "/wp-sitemap-posts-post-{}.xml",
+                       sitemap_index_url=base_url + "/wp-sitemap.xml", pdf_store_path=workdir,
+                       db_path=workdir + "/sebenarnya.db"),
+    runner.load_source("pmospeech", listing_url=base_url + "/speech/", pdf_store_path=workdir,
+                       db_path=workdir + "/pmo.db"),
+]
+if mode == "check":
+    print(sum(len(runner.find_new_items(source)[1]) for source in sources))
+else:
+    asyncio.run(runner.Runner(8, 4, 0, 0).run(sources))
+    print(0)
+print(" ".join(name for name in ("fpdf", "PyPDF2", "bs4", "selenium") if name in sys.modules))
+"""
+
+
+def bench_startup(pages, posts_per_page, speeches, latency):
+    # Cold processes: importing the scrapers must not load the PDF, browser
+    # or HTML tree libraries nor create directories, and a check for new
+    # items should cost discovery plus dedup on top of a light start.
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency, speeches=speeches)
+    workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+    cwd = os.path.join(workdir, "cwd")
+    environ = dict(os.environ, PYTHONPATH=package_dir)
+
+    def python(label, *arguments):
+        completed = []
+        timed(label, lambda: completed.append(subprocess.run(
+            [sys.executable, *arguments], cwd=cwd, env=environ, capture_output=True, text=True, check=True)))
+        return completed[0].stdout.split("\n")
+
+    try:
+        os.makedirs(cwd)
+        loaded = python("import both scrapers", "-c", "import sys, sebenarnyamy, pmospeech; "
+                        "print(' '.join(name for name in ('fpdf', 'PyPDF2', 'bs4', 'selenium') if name in sys.modules))")
+        assert not loaded[0], f"importing the scrapers loaded {loaded[0]}"
+        assert os.listdir(workdir) == ["cwd"] and not os.listdir(cwd), "importing the scrapers created files"
+        python("cli --help", os.path.join(package_dir, "cli.py"), "--help")
+        with LocalServer(site) as server:
+            results = {}
+            for label, mode, expected in (("check, nothing crawled yet", "check", pages * posts_per_page + speeches),
+                                          ("crawl", "crawl", 0), ("check after the crawl", "check", 0)):
+                site.reset_counters()
+                new, loaded = python(label, "-c", STARTUP_SCRIPT, server.base_url, workdir, mode)[:2]
+                results.setdefault(mode, RESULTS[-1]["seconds"])
+                assert int(new) == expected, f"{label}: expected {expected} new items, found {new}"
+                if mode == "check":
+                    assert not loaded, f"{label} loaded {loaded}"
+                print(f"{'':<40} {site.requests} requests, {new} new items")
+        print(f"{'check vs crawl':<40} {results['crawl'] / results['check']:8.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_distributed(pages, posts_per_page, speeches, latency, workers=4, concurrency=2, lease=2.0):
+    # Separate worker processes, each allowed `concurrency` requests at a
+    # time, share one coordination file and the local site; their shards are
+    # merged and must hold every item exactly once. The last run starts with
+    # a worker that is killed while holding a shard.
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency, speeches=speeches)
+    expected = {"sebenarnyamy": pages * posts_per_page, "pmospeech": speeches}
+    context = multiprocessing.get_context("spawn")
+    with LocalServer(site) as server:
+        results = {}
+        for label, count, doomed in (("1 worker", 1, False), (f"{workers} workers", workers, False),
+                                     (f"{workers} workers, one killed", workers, True)):
+            workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+            coordination = os.path.join(workdir, "coordination.sqlite")
+
+            def start(worker):
+                process = context.Process(target=distributed_worker, args=(
+                    server.base_url, coordination, workdir, worker, concurrency, lease))
+                process.start()
+                return process
+
+            def crawl():
+                if doomed:
+                    process = start("doomed")
+                    coordinator = distributed.Coordinator(coordination, lease)
+                    while not coordinator.progress("sebenarnyamy").get(distributed.SHARD_CLAIMED):
+                        time.sleep(0.05)
+                    process.kill()
+                    process.join()
+                    assert coordinator.unfinished("sebenarnyamy"), "a killed worker's shard counted as finished"
+                    coordinator.close()
+                processes = [start(f"worker{n}") for n in range(count)]
+                for process in processes:
+                    process.join()
+                    assert process.exitcode == 0, f"worker exited with {process.exitcode}"
+
+            try:
+                results[label] = timed(label, crawl)
+                coordinator = distributed.Coordinator(coordination, lease)
+                assert not any(coordinator.unfinished(name) for name in expected), "shards left unfinished"
+                coordinator.close()
+                counts = []
+                for name, total in expected.items():
+                    db_path = os.path.join(workdir, f"merged-{name}.db")
+                    # A shard that cannot be read must be left out, not reported as merged.
+                    unreadable = os.path.join(workdir, f"{name}-unreadable.db")
+                    with open(unreadable, "wb") as f:
+                        f.write(b"not a database")
+                    paths = distributed.shard_db_paths(workdir, name)
+                    added, merged = distributed.merge_shards(name, paths, db_path)
+                    assert merged == [path for path in paths if path != unreadable], \
+                        f"{name}: merged {merged} of {paths}"
+                    paths = merged
+                    connection = store.get_connection(db_path)
+                    table = {"sebenarnyamy": "SebenarnyaMY", "pmospeech": "PMO_speech_data"}[name]
+                    records, urls = connection.execute(f"SELECT COUNT(*), COUNT(DISTINCT url) FROM {table}").fetchone()
+                    texts = connection.execute(f"SELECT COUNT(*) FROM {table}_text").fetchone()[0]
+                    assert added == records == urls == texts == total, \
+                        f"{name}: expected {total}, merged {added} records, {urls} urls, {texts} texts"
+                    counts.append(f"{name} {records} records from {len(paths)} shards")
+                print(f"{'':<40} {'; '.join(counts)}")
+            finally:
+                store.close_all_connections()
+                shutil.rmtree(workdir, ignore_errors=True)
+        print(f"{'speedup':<40} {results['1 worker'] / results[f'{workers} workers']:8.2f}x")
+
+
+def make_large_pdf(megabytes, page_kb=1024):
+    # A PDF of about `megabytes`, one incompressible grey image per page, as
+    # large speech attachments with scanned pages are. Returns (bytes, pages).
+    side = int((page_kb * 1024) ** 0.5)
+    pages = max(1, megabytes * 1024 // page_kb)
+    random_bytes = os.urandom(side * side)
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+
+    def add(body):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % len(offsets) + body + b"\nendobj\n")
+
+    add(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{3 + page * 3} 0 R" for page in range(pages)).encode()
+    add(b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages)
+    content = b"q 500 0 0 500 50 150 cm /Im Do Q"
+    for page in range(pages):
+        number = 3 + page * 3
+        add(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /XObject << /Im %d 0 R >> >> >>" % (number + 1, number + 2))
+        add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        # Every page gets different pixels, so nothing is shared between pages.
+        pixels = random_bytes[page:] + random_bytes[:page]
+        add(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+            b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (side, side, len(pixels)) + pixels + b"\nendstream")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+    out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref))
+    return out.getvalue(), pages
+
+
+def attachment_worker(mode, url, output, results):
+    # Entry point of the process measured by bench_large_attachment: fetches
+    # the attachment at url and builds a speech PDF from it, either as before
+    # (the attachment sent to the render worker as bytes and merged by
+    # rewriting every page) or streamed and appended to.
+    start = time.perf_counter()
+    if mode == "idle":
+        results.put((0.0, metrics.peak_rss_bytes(), 0))
+        return
+    if mode == "bytes, full merge":
+        attachment = pmospeech.download_pdf_to_buffer(url, max_attachment_mb=0)
+        with attachment:
+            data = attachment.read()
+        render.write_merged_pdf([io.BytesIO(data), io.BytesIO(render.render_text_pdf_bytes("Ucapan"))], output)
+    else:
+        attachment = pmospeech.download_attachment(url, max_attachment_mb=0)
+        with attachment:
+            func, args = render.render_job("Ucapan", output, attachment)
+        func(*args)
+    elapsed = time.perf_counter() - start
+    peak = metrics.peak_rss_bytes()
+    with open(output, 'rb') as f:
+        results.put((elapsed, peak, len(PdfReader(f).pages)))
+
+
+def bench_large_attachment(attachment_mb, latency):
+    # Peak RSS of one process downloading a large speech attachment and
+    # merging the cover page into it, before and after streaming; then the
+    # size limit and the ETag revalidation in a cached crawl.
+    data, pages = make_large_pdf(attachment_mb)
+    site = SyntheticSite(speeches=2, latency=latency, attachment=data)
+    context = multiprocessing.get_context("spawn")
+    workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+    try:
+        with LocalServer(site) as server:
+            url = server.base_url + "/files/1.pdf"
+            baseline = None
+            for mode in ("idle", "bytes, full merge", "streamed, appended"):
+                results = context.Queue()
+                output = os.path.join(workdir, f"{mode.split(',')[0]}.pdf")
+                process = context.Process(target=attachment_worker, args=(mode, url, output, results))
+                process.start()
+                elapsed, peak, merged_pages = results.get()
+                process.join()
+                if mode == "idle":
+                    baseline = peak
+                    continue
+                RESULTS.append({"benchmark": current_benchmark, "label": f"{mode} ({attachment_mb} MB)",
+                                "seconds": elapsed})
+                print(f"{mode + f' ({attachment_mb} MB)':<40} {elapsed:8.3f}s")
+                assert merged_pages == pages + 1, f"{mode}: expected {pages + 1} pages, found {merged_pages}"
+                if peak is not None:
+                    print(f"{'':<40} peak RSS {peak / 1e6:.0f} MB, {(peak - baseline) / 1e6:.0f} MB above an idle "
+                          "worker")
+
+            listing_url = server.base_url + "/speech/"
+            pdf_dir = os.path.join(workdir, "pmo")
+            db_path = os.path.join(workdir, "pmo.db")
+            cache_dir = os.path.join(workdir, "cache")
+            for label, options, expected_pages in (
+                ("pmo cached crawl", {"max_attachment_mb": 0}, pages + 1),
+                # PDFs and records lost, cache intact: pages are fetched again,
+                # the attachment only revalidated.
+                ("pmo re-crawl, attachment unchanged", {"max_attachment_mb": 0}, pages + 1),
+                # Only the text is left once the attachment is over the limit.
+                (f"pmo crawl, attachments up to {attachment_mb // 2} MB", {"max_attachment_mb": attachment_mb // 2}, 1),
+            ):
+                if label != "pmo cached crawl":
+                    shutil.rmtree(pdf_dir)
+                    store.get_connection(db_path).execute("DELETE FROM PMO_speech_data")
+                    store.close_all_connections()
+                site.reset_counters()
+                downloaded = metrics.get_metrics().bytes_downloaded
+                timed(label, pmospeech.main, listing_url, db_path, pdf_store_path=pdf_dir, cache_dir=cache_dir,
+                      render_workers=1, **options)
+                store.close_all_connections()
+                downloaded = metrics.get_metrics().bytes_downloaded - downloaded
+                speech_pdf = [name for name in os.listdir(pdf_dir) if name.endswith("nombor 1.pdf")][0]
+                merged_pages = len(PdfReader(os.path.join(pdf_dir, speech_pdf)).pages)
+                assert merged_pages == expected_pages, f"{label}: expected {expected_pages} pages, found {merged_pages}"
+                print(f"{'':<40} {site.requests} requests, {downloaded / 1e6:.1f} MB downloaded, "
+                      f"{merged_pages} pages in the speech PDF")
+    finally:
+        store.close_all_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_resume(pages, posts_per_page, latency, concurrency, render_workers, interrupt_after):
+    # Interrupts a runner crawl after `interrupt_after` articles were extracted,
+    # then finishes it once with --resume and once with a plain run that
+    # discovers again, and compares the requests each needed.
+    site = SyntheticSite(pages=pages, posts_per_page=posts_per_page, latency=latency)
+    total = pages * posts_per_page
+    with LocalServer(site) as server:
+        template = server.base_url + "/wp-sitemap-posts-post-{}.xml"
+        index_url = server.base_url + "/wp-sitemap.xml"
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            class InterruptedSource(sebenarnyamy.SebenarnyaMYSource):
+                def __init__(self, *args, task=None, loop=None):
+                    super().__init__(*args)
+                    self.extracted = 0
+                    self.task = task
+                    self.loop = loop
+                    self._lock = threading.Lock()
+
+                def extract(self, item):
+                    extracted = super().extract(item)
+                    with self._lock:
+                        self.extracted += 1
+                        if self.extracted == interrupt_after:
+                            self.loop.call_soon_threadsafe(self.task.cancel)
+                    return extracted
+
+            async def interrupted_run(pdf_dir, db_path):
+                source = InterruptedSource(template, index_url, pdf_dir, db_path, loop=asyncio.get_running_loop())
+                source.task = asyncio.current_task()
+                try:
+                    await runner.Runner(concurrency, concurrency, 0, render_workers).run([source])
+                except asyncio.CancelledError:
+                    pass
+
+            results = {}
+            for label, resume in (("restart", False), ("resume", True)):
+                pdf_dir = os.path.join(workdir, f"{label}-pdfs")
+                db_path = os.path.join(workdir, f"{label}.db")
+                os.makedirs(pdf_dir)
+                asyncio.run(interrupted_run(pdf_dir, db_path))
+                records_before = len(sebenarnyamy.SebenarnyaMYData(db_path).read_records())
+                store.close_all_connections()
+                site.reset_counters()
+                source = sebenarnyamy.SebenarnyaMYSource(template, index_url, pdf_dir, db_path)
+                func = lambda: asyncio.run(runner.Runner(concurrency, concurrency, 0, render_workers)
+                                           .run([source], resume=resume))
+                results[label] = timed(f"finish interrupted crawl, {label}", func)
+                urls = [record[3] for record in sebenarnyamy.SebenarnyaMYData(db_path).read_records()]
+                print(f"{'':<40} {records_before} records before, {site.requests} requests to finish, "
+                      f"{len(urls)} records ({len(set(urls))} unique), {len(os.listdir(pdf_dir))} PDFs")
+                assert len(urls) == len(set(urls)) == total, f"{label}: expected {total} unique records"
+                texts = store.get_connection(db_path).execute(
+                    "SELECT COUNT(*) FROM SebenarnyaMY_text WHERE text IS NOT NULL").fetchone()[0]
+                assert texts == total, f"{label}: expected {total} texts, found {texts}"
+                store.close_all_connections()
+            print(f"{'speedup':<40} {results['restart'] / results['resume']:8.2f}x")
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_instrumentation(records):
+    # What the per-URL INFO lines cost compared with DEBUG lines that are
+    # filtered out, and what a timed stage adds to every call.
+    urls = [f"https://sebenarnya.my/rekod-{i}/" for i in range(records)]
+    bench_logger = logging.getLogger("scraping-bench.instrumentation")
+    bench_logger.propagate = False
+    with open(os.devnull, "w") as devnull:
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        bench_logger.addHandler(handler)
+        try:
+            def log_at(level):
+                def run():
+                    bench_logger.setLevel(level)
+                    for url in urls:
+                        bench_logger.info(f"Processing link: {url}")
+                        bench_logger.info(f"Record created: {url}")
+                        bench_logger.info(f"PDF saved: {url}")
+                return run
+
+            info = timed(f"3 per-URL log lines at INFO ({records} URLs)", log_at(logging.INFO))
+            debug = timed(f"same lines filtered at DEBUG ({records} URLs)", log_at(logging.WARNING))
+        finally:
+            bench_logger.removeHandler(handler)
+    print(f"{'speedup':<40} {info / debug:8.2f}x")
+
+    run_metrics = metrics.Metrics()
+
+    def stages():
+        for _ in urls:
+            with run_metrics.timed("fetch"):
+                pass
+
+    elapsed = timed(f"metrics.timed overhead ({records} calls)", stages)
+    print(f"{'':<40} {elapsed / records * 1e6:.2f}us per timed stage")
+
+
+def bench_stages(articles, speeches, latency):
+    # Each stage of the pipelines on its own, over the same synthetic pages,
+    # so a change to one of them shows up without the noise of a full crawl.
+    site = SyntheticSite(pages=1, posts_per_page=articles, latency=latency, speeches=speeches)
+    with LocalServer(site) as server:
+        links = [f"{server.base_url}/post-{post}/" for post in range(articles)]
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            pages, soups, extracted, covers = [], [], [], []
+            timed(f"stage fetch_html ({articles} articles)",
+                  lambda: pages.extend(sebenarnyamy.fetch_html(link) for link in links))
+            timed(f"stage parse_html ({articles} articles)",
+                  lambda: soups.extend(sebenarnyamy.parse_html(page) for page in pages))
+            timed(f"stage extract_info_from_soup ({articles})",
+                  lambda: extracted.extend(sebenarnyamy.extract_info_from_soup(soup, link)
+                                           for soup, link in zip(soups, links)))
+            assert all(title and content_text for title, _, content_text in extracted), "extraction lost content"
+            timed(f"stage render_text_pdf_bytes ({articles})",
+                  lambda: covers.extend(render.render_text_pdf_bytes(content_text)
+                                        for _, _, content_text in extracted))
+
+            attachment = site.attachment()
+
+            def merges():
+                for i in range(speeches):
+                    pmospeech.merge_pdfs([io.BytesIO(attachment), io.BytesIO(covers[i % len(covers)])],
+                                         os.path.join(workdir, f"merged-{i}.pdf"))
+
+            timed(f"stage merge_pdfs ({speeches} attachments)", merges)
+            assert len(os.listdir(workdir)) == speeches, "merge_pdfs did not write every PDF"
+
+            listing = sebenarnyamy.fetch_html(f"{server.base_url}/speech/")
+            rows = []
+            timed(f"stage iter_speech_rows ({speeches} rows)", lambda: rows.extend(pmospeech.iter_speech_rows(listing)))
+            assert len(rows) == speeches, f"expected {speeches} listing rows, found {len(rows)}"
+
+            db_path = os.path.join(workdir, "stages.db")
+            data = sebenarnyamy.SebenarnyaMYData(db_path)
+            records = [(title, sebenarnyamy.format_date(date), link)
+                       for (title, date, _), link in zip(extracted, links)]
+
+            def inserts():
+                with data.batch():
+                    for record in records:
+                        data.create_record(*record)
+
+            timed(f"stage db insert ({articles} records)", inserts)
+            known = []
+            timed(f"stage db check ({articles * 2} urls)",
+                  lambda: known.extend(url for url in links + [link + "baru/" for link in links]
+                                       if data.is_link_in_database(url)))
+            assert len(known) == articles, f"expected {articles} known urls, found {len(known)}"
+        finally:
+            store.close_all_connections()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def extraction_golden_pages(articles, speeches):
+    site = SyntheticSite(posts_per_page=articles, speeches=speeches)
+    chrome = lambda html: html.replace("<body>", "<body>" + PAGE_CHROME_HEADER).replace("</body>",
+                                                                                      PAGE_CHROME_SIDEBAR + "</body>")
+    article_pages = [chrome(site.article(post)) for post in range(articles)]
+    article_pages += [chrome(ARTICLE_TEMPLATE.format(title=f"Kes {i}", date="01/02/2024", paragraphs=body))
+                      for i, body in enumerate(EXTRACTION_GOLDEN_BODIES)]
+    speech_pages = [chrome(site.speech(number)) for number in range(speeches)]
+    speech_pages += [chrome(SPEECH_TEMPLATE.format(title=f"Kes {i}", paragraphs=body,
+                                                   attachment=SPEECH_ATTACHMENT_TEMPLATE.format(link=f"/files/{i}.pdf")))
+                     for i, body in enumerate(EXTRACTION_GOLDEN_BODIES)]
+    return article_pages, speech_pages
+
+
+def check_extraction_samples():
+    # Both extractors have to give the saved output of every sample page.
+    names = sorted(name[:-len(".html")] for name in os.listdir(EXTRACTION_SAMPLES_DIR) if name.endswith(".html"))
+    fallbacks = 0
+    for name in names:
+        with open(os.path.join(EXTRACTION_SAMPLES_DIR, name + ".html"), encoding="utf-8") as f:
+            html = f.read()
+        with open(os.path.join(EXTRACTION_SAMPLES_DIR, name + ".json"), encoding="utf-8") as f:
+            sample = json.load(f)
+        fallbacks += extraction.parse_tree(html) is None
+        for extractor in extraction.EXTRACTORS:
+            if name.startswith("sebenarnyamy-"):
+                title, date, text = sebenarnyamy.extract_article(html, sample["link"], extractor)
+                actual = {"title": title, "date": date, "text": text}
+            else:
+                text, attachment = pmospeech.parse_speech(html, sample["link"], sample["title"], sample["date"],
+                                                          extractor)
+                actual = {"text": text, "attachment": attachment}
+            assert actual == sample["expected"], f"{name} ({extractor}) differs from its expected output:\n{actual}"
+    print(f"{'saved sample pages as expected':<40} {len(names):8d} ({fallbacks} read without lxml)")
+
+
+def bench_extraction(articles, speeches):
+    # The fast extractors against the full soup on the same pages: the output
+    # has to be identical, page for page.
+    check_extraction_samples()
+    article_pages, speech_pages = extraction_golden_pages(articles, speeches)
+    link = "https://sebenarnya.my/artikel-ujian/"
+    outputs, seconds = {}, {}
+    for extractor in (extraction.EXTRACTOR_SOUP, extraction.EXTRACTOR_FAST):
+        extracted = outputs[extractor] = []
+
+        def extract():
+            extracted.extend(sebenarnyamy.extract_article(page, link, extractor) for page in article_pages)
+            extracted.extend(pmospeech.parse_speech(page, link, "Ucapan", "01 Jan 2024", extractor)
+                             for page in speech_pages)
+
+        seconds[extractor] = timed(
+            f"extract {len(article_pages)} articles, {len(speech_pages)} speeches ({extractor})", extract)
+    for expected, actual in zip(outputs[extraction.EXTRACTOR_SOUP], outputs[extraction.EXTRACTOR_FAST]):
+        assert expected == actual, f"fast extraction differs from the full soup:\n{expected}\n{actual}"
+    soup_articles = outputs[extraction.EXTRACTOR_SOUP][:len(article_pages)]
+    assert all(text for _, _, text in soup_articles), "extraction lost content"
+    lxml_pages = sum(extraction.parse_tree(page) is not None for page in article_pages + speech_pages)
+    print(f"{'pages read with lxml':<40} {lxml_pages:8d} of {len(article_pages) + len(speech_pages)}")
+    print(f"{'speedup':<40} {seconds[extraction.EXTRACTOR_SOUP] / seconds[extraction.EXTRACTOR_FAST]:8.2f}x")
+
+
+def bench_pmo_listing(rows):
+    # One row in the middle has no link: it is skipped, and the rows after it
+    # are still read.
+    html = make_listing(rows, linkless={rows // 2})
+
+    old_result = []
+    new_result = []
+
+    def old_rows():
+        for i in range(1, pmospeech.count_tr_elements(html) + 1):
+            tr_element = pmospeech.get_n_tr_elements(html, i)
+            if tr_element:
+                old_result.append(pmospeech.get_info_from_tr(tr_element))
+
+    def new_rows():
+        new_result.extend(pmospeech.iter_speech_rows(html))
+
+    old = timed(f"pmo listing get_n_tr_elements ({rows} rows)", old_rows)
+    new = timed(f"pmo listing iter_speech_rows ({rows} rows)", new_rows)
+    # get_n_tr_elements gives ("", "", "") for a row it cannot read.
+    assert [row for row in old_result if row[0]] == new_result, "iter_speech_rows disagrees with get_n_tr_elements"
+    assert len(new_result) == rows - 1, f"expected {rows - 1} rows, found {len(new_result)}"
+    print(f"{'speedup':<40} {old / new:8.2f}x")
+
+
+def synthetic_records(count):
+    start = date(2015, 1, 1)
+    for i in range(count):
+        yield (f"PALSU: Rekod sintetik nombor {i}", (start + timedelta(days=i % 3650)).isoformat(),
+               f"https://sebenarnya.my/rekod-{i}/")
+
+
+def bench_store_inserts(records, legacy_sample):
+    workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+    try:
+        legacy_path = os.path.join(workdir, "legacy.db")
+        batched_path = os.path.join(workdir, "batched.db")
+        sebenarnyamy.SebenarnyaMYData(legacy_path)
+        store.close_connection(legacy_path)
+
+        def legacy_inserts():
+            # The pre-store create_record: one connect and one INSERT per record.
+            query = "INSERT INTO SebenarnyaMY (number, title, date, url) VALUES (NEXTVAL('seq_number'), ?, ?, ?)"
+            for row in synthetic_records(min(records, legacy_sample)):
+                with duckdb.connect(legacy_path) as conn:
+                    conn.execute(query, row)
+
+        def batched_inserts():
+            data = sebenarnyamy.SebenarnyaMYData(batched_path, batch_size=10000)
+            with data.batch():
+                for row in synthetic_records(records):
+                    data.insert_row(row)
+
+        old = timed(f"duckdb connect per insert ({min(records, legacy_sample)} rows)", legacy_inserts)
+        if legacy_sample < records:
+            # A connect per row takes tens of milliseconds, so the full run is
+            # extrapolated from the sample instead of waiting for it.
+            old = old * records / legacy_sample
+            print(f"{'  extrapolated to ' + str(records) + ' rows':<40} {old:8.3f}s")
+        new = timed(f"duckdb batched store ({records} rows)", batched_inserts)
+        count = sebenarnyamy.SebenarnyaMYData(batched_path).fetchone("SELECT COUNT(*) FROM SebenarnyaMY")[0]
+        assert count == records, f"expected {records} rows, found {count}"
+        print(f"{'speedup':<40} {old / new:8.2f}x")
+    finally:
+        store.close_all_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_export(records):
+    # Handing every record and its text to the ingest side: the same query
+    # fetched into Python tuples, and exported by DuckDB as Parquet.
+    workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+    try:
+        data = sebenarnyamy.SebenarnyaMYData(os.path.join(workdir, "export.db"), batch_size=10000)
+        paragraph = "Kenyataan ini adalah palsu dan tidak benar. " * 10
+        with data.batch():
+            for row in synthetic_records(records):
+                data.create_record(*row, text=f"Title: {row[0]}\n{paragraph}")
+        exporter = export.RecordExport(data, "sebenarnyamy")
+        sql, parameters = exporter.query()
+        output = os.path.join(workdir, "parquet")
+        rows, written = [], []
+
+        def fetchall():
+            rows[:] = data.fetchall(sql, parameters)
+
+        def parquet():
+            written[:] = [exporter.write_parquet(output)]
+
+        for label, func in ((f"records and text fetchall ({records} rows)", fetchall),
+                            (f"records and text to parquet ({records} rows)", parquet)):
+            timed(label, func)
+            # Measured in a second pass; tracemalloc slows the query down.
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{'':<40} peak {peak / 1024 / 1024:.1f} MiB of Python objects")
+        assert len(rows) == records, f"expected {records} rows, found {len(rows)}"
+        assert written == [records], f"expected {records} exported rows, found {written}"
+        incremental = []
+        timed("incremental parquet, nothing new",
+              lambda: incremental.append(exporter.write_parquet(output, incremental=True)))
+        assert incremental == [0], f"incremental export repeated {incremental[0]} rows"
+        exported = duckdb.connect().execute(
+            "SELECT COUNT(*), COUNT(text) FROM read_parquet(?, hive_partitioning = true)",
+            [os.path.join(output, "**", "*.parquet")]
+        ).fetchone()
+        assert exported == (records, records), f"expected {records} rows with text, found {exported}"
+    finally:
+        store.close_all_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_search(records, queries=20):
+    workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+    try:
+        data = sebenarnyamy.SebenarnyaMYData(os.path.join(workdir, "search.db"), batch_size=10000)
+        with data.batch():
+            for i, row in enumerate(synthetic_records(records)):
+                data.create_record(*row, text=f"Title: {row[0]}\nKenyataan tular nombor {i % 1000} adalah palsu.")
+        text_search = search.TextSearch(data, "sebenarnyamy")
+        mode = "bm25" if text_search.use_fts else "words"
+        timed(f"search index build ({records} texts)", text_search.build_index)
+        matches = []
+        timed(f"search {mode} ({queries} queries)",
+              lambda: matches.extend(text_search.search(f"tular nombor {i}", 10) for i in range(queries)))
+        # Text i mentions number i % 1000, so query i matches every thousandth text from i on.
+        expected = [min(10, len(range(i, records, 1000))) for i in range(queries)]
+        assert [len(found) for found in matches] == expected, "search missed matching texts"
+        assert all(f"nombor {i}" in found[0][5] for i, found in enumerate(matches) if found), "best match lacks the query"
+    finally:
+        store.close_all_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_dedup_checks(records, legacy_sample):
+    workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+    try:
+        db_path = os.path.join(workdir, "dedup.db")
+        data = sebenarnyamy.SebenarnyaMYData(db_path, batch_size=records)
+        with data.batch():
+            for row in synthetic_records(records):
+                data.insert_row(row)
+        store.close_all_connections()
+        # Half the candidates are already known, half are new.
+        candidates = [f"https://sebenarnya.my/rekod-{i}/" for i in range(0, records * 2, 2)]
+
+        def legacy_checks():
+            query = "SELECT 1 FROM SebenarnyaMY WHERE url = ? LIMIT 1"
+            for url in candidates[:legacy_sample]:
+                with duckdb.connect(db_path) as conn:
+                    conn.execute(query, (url,)).fetchone()
+
+        old = timed(f"dedup connect per check ({min(records, legacy_sample)} urls)", legacy_checks)
+        if legacy_sample < records:
+            old = old * records / legacy_sample
+            print(f"{'  extrapolated to ' + str(records) + ' urls':<40} {old:8.3f}s")
+        for mode in dedup.DEDUP_MODES:
+            opened = []
+            found = []
+            # Bloom hits are only "maybe", so its checks include a query for every known url.
+            load = timed(f"dedup {mode} index load ({records} urls)",
+                         lambda: opened.append(sebenarnyamy.SebenarnyaMYData(db_path, dedup_mode=mode)))
+            checks = timed(f"dedup {mode} index checks ({records} urls)",
+                           lambda: found.extend(url for url in candidates if opened[0].is_link_in_database(url)))
+            new = load + checks
+            assert len(found) == records // 2, f"{mode} index found {len(found)} known urls"
+            print(f"{'speedup':<40} {old / new:8.2f}x")
+            store.close_all_connections()
+    finally:
+        store.close_all_connections()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_http_client(requests_count, latency):
+    site = SyntheticSite(pages=1, posts_per_page=requests_count, latency=latency)
+    with LocalServer(site) as server:
+        links = [f"{server.base_url}/post-{post}/" for post in range(requests_count)]
+
+        def bare_requests():
+            for link in links:
+                requests.get(link, verify=False).text
+
+        def shared_session():
+            client = http_client.HttpClient()
+            try:
+                for link in links:
+                    client.get(link).text
+            finally:
+                client.close()
+
+        results = {}
+        for label, func in (("bare requests.get", bare_requests), ("shared session", shared_session)):
+            site.reset_counters()
+            results[label] = timed(f"{label} ({requests_count} requests)", func)
+            print(f"{'':<40} {site.connections} connections")
+        print(f"{'speedup':<40} {results['bare requests.get'] / results['shared session']:8.2f}x")
+
+
+def bench_browser_print(pages, browsers):
+    # DownloadSaveAsLocalPDF imports selenium only once a browser starts.
+    if importlib.util.find_spec("selenium") is None:
+        print(f"{'browser print':<40} skipped (selenium is not installed)")
+        return
+    import DownloadSaveAsLocalPDF as browser_print
+    site = SyntheticSite(pages=1, posts_per_page=pages)
+    with LocalServer(site) as server:
+        links = [f"{server.base_url}/post-{post}/" for post in range(pages)]
+        workdir = tempfile.mkdtemp(prefix="scraping-bench-")
+        try:
+            outputs = []
+            timed(f"browser print {pages} pages, {browsers} browsers",
+                  lambda: outputs.extend(browser_print.download_save_as_local_pdfs(links, workdir, browsers)))
+            print(f"{'':<40} {sum(1 for output in outputs if output)} PDFs")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+# In the order they were added.
+BENCHMARKS = [
+    "sebenarnya-crawl",
+    "pmo-listing",
+    "store-inserts",
+    "dedup-checks",
+    "sebenarnya-incremental",
+    "sitemap-parse",
+    "render-pool",
+    "browser-print",
+    "http-client",
+    "response-cache",
+    "runner",
+    "resume",
+    "instrumentation",
+    "stages",
+    "extraction",
+    "export",
+    "search",
+    "text-only",
+    "politeness",
+    "distributed",
+    "startup",
+    "large-attachment",
+]
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_benchmark(name, func, stages):
+    # Stage timings recorded by the scrapers' own metrics during the benchmark
+    # are kept next to the wall-clock results.
+    global current_benchmark
+    current_benchmark = name
+    print(f"== {name}")
+    run_metrics = metrics.reset_metrics()
+    func()
+    snapshot = run_metrics.snapshot()
+    stages[name] = {stage: {"count": histogram["count"], "seconds": histogram["sum"]}
+                    for stage, histogram in snapshot["stages"].items()}
+
+
+def write_results(path, args, stages):
+    results = {"environment": environment(), "arguments": vars(args), "results": RESULTS, "stages": stages}
+    with open(path, "w") as out:
+        json.dump(results, out, indent=2)
+    print(f"results written to {path}")
+
+
+def compare_results(baseline_path, args, threshold=REGRESSION_THRESHOLD):
+    # Prints every measurement that exists in both runs and returns the
+    # number of regressions. Labels carry their sizes, so runs of other sizes
+    # do not match; other differing arguments such as latency are listed.
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(result["benchmark"], result["label"]): result["seconds"] for result in baseline["results"]}
+    print(f"== compared with {baseline_path} (commit {baseline['environment'].get('commit')})")
+    for name, value in vars(args).items():
+        if name not in ("only", "results", "compare", "threshold") and baseline["arguments"].get(name) != value:
+            print(f"warning: --{name.replace('_', '-')} was {baseline['arguments'].get(name)}, now {value}")
+    regressions = 0
+    for result in RESULTS:
+        key = (result["benchmark"], result["label"])
+        if key not in before:
+            continue
+        old, new = before[key], result["seconds"]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if max(old, new) >= NOISE_FLOOR and change > threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif max(old, new) >= NOISE_FLOOR and change < -threshold:
+            flag = "faster"
+        print(f"{result['label']:<40} {old:8.3f}s -> {new:8.3f}s {change * 100:+7.1f}% {flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against a local synthetic site.")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS,
+                        help="run only this benchmark, may be repeated; all of them by default")
+    parser.add_argument("--pages", type=int, default=2, help="number of sitemap pages")
+    parser.add_argument("--posts-per-page", type=int, default=50, help="articles per sitemap page")
+    parser.add_argument("--latency", type=float, default=0.05, help="artificial server latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=sebenarnyamy.MAX_CONCURRENCY_PER_HOST,
+                        help="max in-flight requests per host for the async crawl")
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests per second per host, 0 disables")
+    parser.add_argument("--sitemap-entries", type=int, default=50000, help="entries in the sitemap parse benchmark")
+    parser.add_argument("--speeches", type=int, default=40, help="speeches served by the synthetic PMO site")
+    parser.add_argument("--render-workers", type=int, default=os.cpu_count() or 2,
+                        help="render pool size compared against inline rendering")
+    parser.add_argument("--http-requests", type=int, default=500, help="sequential requests in the HTTP client benchmark")
+    parser.add_argument("--interrupt-after", type=int, default=30,
+                        help="articles extracted before the crawl in the resume benchmark is interrupted")
+    parser.add_argument("--attachment-mb", type=int, default=64,
+                        help="size of the speech attachment in the large attachment benchmark")
+    parser.add_argument("--browsers", type=int, default=4, help="headless browsers in the browser print pool")
+    parser.add_argument("--rows", type=int, default=300, help="rows in the synthetic PMO listing table")
+    parser.add_argument("--records", type=int, default=100000, help="records inserted by the store and dedup benchmarks")
+    parser.add_argument("--legacy-sample", type=int, default=2000,
+                        help="records inserted or checked the old way before extrapolating to --records")
+    parser.add_argument("--results", help="write every measurement, the stage timings and the environment as JSON")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="compare with a --results file of an earlier run; exits 1 if anything regressed")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown counted as a regression by --compare")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    selected = args.only or BENCHMARKS
+    benchmarks = {
+        "sebenarnya-crawl": lambda: bench_sebenarnya_crawl(args.pages, args.posts_per_page, args.latency,
+                                                           args.concurrency, args.rate_limit),
+        "pmo-listing": lambda: bench_pmo_listing(args.rows),
+        "store-inserts": lambda: bench_store_inserts(args.records, args.legacy_sample),
+        "dedup-checks": lambda: bench_dedup_checks(args.records, args.legacy_sample),
+        "sebenarnya-incremental": lambda: bench_sebenarnya_incremental(args.pages, args.posts_per_page, args.latency),
+        "sitemap-parse": lambda: bench_sitemap_parse(args.sitemap_entries),
+        "render-pool": lambda: bench_render_pool(args.pages, args.posts_per_page, args.speeches, args.latency,
+                                                 args.render_workers),
+        "browser-print": lambda: bench_browser_print(args.speeches, args.browsers),
+        "http-client": lambda: bench_http_client(args.http_requests, args.latency),
+        "response-cache": lambda: bench_response_cache(args.pages, args.posts_per_page, args.speeches, args.latency),
+        "runner": lambda: bench_runner(args.pages, args.posts_per_page, args.speeches, args.latency, args.concurrency,
+                                       args.rate_limit, args.render_workers),
+        "resume": lambda: bench_resume(args.pages, args.posts_per_page, args.latency, args.concurrency,
+                                       args.render_workers, args.interrupt_after),
+        "instrumentation": lambda: bench_instrumentation(args.records),
+        "stages": lambda: bench_stages(args.pages * args.posts_per_page, args.speeches, args.latency),
+        "extraction": lambda: bench_extraction(args.pages * args.posts_per_page, args.speeches),
+        "export": lambda: bench_export(args.records),
+        "search": lambda: bench_search(args.records),
+        "text-only": lambda: bench_text_only(args.pages, args.posts_per_page, args.speeches, args.latency),
+        "politeness": lambda: bench_politeness(args.pages, args.posts_per_page, args.speeches, args.latency,
+                                               args.concurrency),
+        "distributed": lambda: bench_distributed(args.pages, args.posts_per_page, args.speeches, args.latency),
+        "startup": lambda: bench_startup(args.pages, args.posts_per_page, args.speeches, args.latency),
+        "large-attachment": lambda: bench_large_attachment(args.attachment_mb, args.latency),
+    }
+    stages = {}
+    for name in BENCHMARKS:
+        if name in selected:
+            run_benchmark(name, benchmarks[name], stages)
+    if args.results:
+        write_results(args.results, args, stages)
+    if args.compare and compare_results(args.compare, args, args.threshold):
+        sys.exit(1)
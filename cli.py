@@ -0,0 +1,110 @@
+import sys
+import logging
+import argparse
+import importlib
+
+# Only the standard library is imported here; each command imports what it
+# needs once it runs, so a check never loads the PDF or browser stacks.
+
+PROG = "cli.py"
+
+
+def command_parser(name):
+    return argparse.ArgumentParser(prog=f"{PROG} {name}", description=COMMANDS[name][1])
+
+
+def run_crawl(argv):
+    import runner
+    parser = command_parser("crawl")
+    runner.add_arguments(parser)
+    runner.main(parser.parse_args(argv))
+    return 0
+
+
+def run_check(argv):
+    from runner import SOURCES, load_source, find_new_items
+    from http_client import configure_client, DEFAULT_USER_AGENT
+    parser = command_parser("check")
+    parser.add_argument("sources", nargs="*", metavar="source",
+                        help=f"sources to check, all of them by default: {', '.join(sorted(SOURCES))}")
+    parser.add_argument("--urls", action="store_true", help="list the new URLs too")
+    parser.add_argument("--exit-code", action="store_true", help="exit with 1 if any source has new items")
+    parser.add_argument("--user-agent", default=DEFAULT_USER_AGENT, help="User-Agent header sent with every request")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.sources if name not in SOURCES]
+    if unknown:
+        parser.error(f"unknown source: {', '.join(unknown)}")
+    configure_client(user_agent=args.user_agent)
+    found = 0
+    for name in args.sources or sorted(SOURCES):
+        discovered, new = find_new_items(load_source(name))
+        found += len(new)
+        print(f"{name}: {len(new)} new of {discovered} discovered")
+        if args.urls:
+            for item in new:
+                print(f"  {item.url}")
+    return 1 if args.exit_code and found else 0
+
+
+def run_export(argv):
+    import export
+    parser = command_parser("export")
+    export.add_arguments(parser)
+    export.main(parser.parse_args(argv))
+    return 0
+
+
+def run_reparse(argv):
+    from runner import SOURCES
+    from store import DEFAULT_BATCH_SIZE
+    from render import DEFAULT_RENDER_WORKERS
+    from extraction import use_extractor, EXTRACTOR_FAST, EXTRACTORS
+    parser = command_parser("reparse")
+    parser.add_argument("sources", nargs="+", choices=sorted(SOURCES), help="sources to rebuild")
+    parser.add_argument("--render-workers", type=int, default=DEFAULT_RENDER_WORKERS,
+                        help="worker processes that render PDFs, 0 renders inline")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="records buffered before they are written to the database in one transaction")
+    parser.add_argument("--no-pdf", dest="render_pdfs", action="store_false",
+                        help="only refresh records and their text, without rendering PDFs")
+    parser.add_argument("--extractor", choices=EXTRACTORS, default=EXTRACTOR_FAST,
+                        help="read pages with lxml/a strained parse (fast) or a full BeautifulSoup tree (soup)")
+    args = parser.parse_args(argv)
+    use_extractor(args.extractor)
+    for name in args.sources:
+        module = importlib.import_module(SOURCES[name].split(":")[0])
+        module.main(pdf_store_path=module.PDF_STORE_PATH if args.render_pdfs else None, batch_size=args.batch_size,
+                    render_workers=args.render_workers if args.render_pdfs else 0, cache_dir=module.CACHE_STORE_PATH,
+                    reparse_from_cache=True)
+    return 0
+
+
+COMMANDS = {
+    "crawl": (run_crawl, "scrape sources into their databases, PDFs and text"),
+    "check": (run_check, "count the items each source lists that are not in its database yet, without fetching them"),
+    "export": (run_export, "export records and their text as Parquet or Arrow"),
+    "reparse": (run_reparse, "rebuild records, text and PDFs from the response cache without network access"),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Scrape sebenarnya.my and the PMO speeches.",
+        epilog="commands:\n" + "\n".join(f"  {name:<9} {help}" for name, (_, help) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="one of the commands below")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER, help="options of the command, see <command> --help")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # check reports on stdout; only its warnings are logged.
+    level = logging.WARNING if args.command == "check" else logging.INFO
+    logging.basicConfig(level=level, format='%(asctime)s - %(levelname)s - %(message)s')
+    return COMMANDS[args.command][0](args.arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import math
+import hashlib
+
+DEDUP_SET = "set"
+DEDUP_BLOOM = "bloom"
+DEDUP_MODES = (DEDUP_SET, DEDUP_BLOOM)
+
+DEFAULT_BLOOM_CAPACITY = 100000
+MIN_BLOOM_CAPACITY = 1000
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    def __init__(self, capacity=DEFAULT_BLOOM_CAPACITY, error_rate=DEFAULT_BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: k positions derived from two independent 64-bit halves.
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, items):
+        # add() for a whole batch, with the hashing inlined: loading a large
+        # URL index is dominated by per-item call and generator overhead.
+        bits, size, hash_count = self.bits, self.size, self.hash_count
+        blake2b, from_bytes = hashlib.blake2b, int.from_bytes
+        for item in items:
+            digest = blake2b(item.encode('utf-8'), digest_size=16).digest()
+            position = from_bytes(digest[:8], 'little') % size
+            step = (from_bytes(digest[8:], 'little') | 1) % size
+            for _ in range(hash_count):
+                bits[position >> 3] |= 1 << (position & 7)
+                position = (position + step) % size
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class SeenUrlIndex:
+    # In "set" mode membership is exact. In "bloom" mode memory stays bounded
+    # but a hit only means "maybe", so callers must confirm it elsewhere.
+    def __init__(self, mode=DEDUP_SET, capacity=DEFAULT_BLOOM_CAPACITY, error_rate=DEFAULT_BLOOM_ERROR_RATE):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode: {mode}")
+        self.mode = mode
+        self.urls = set() if mode == DEDUP_SET else BloomFilter(capacity, error_rate)
+        self.exact = mode == DEDUP_SET
+
+    def add(self, url):
+        self.urls.add(url)
+
+    def update(self, urls):
+        self.urls.update(urls)
+
+    def __contains__(self, url):
+        return url in self.urls
@@ -0,0 +1,445 @@
+import os
+import re
+import glob
+import json
+import time
+import socket
+import sys
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+
+from store import get_connection, connection_lock, close_connection, DEFAULT_BATCH_SIZE
+from frontier import Frontier, STATE_FAILED
+from runner import (Runner, SourceStats, Item, SOURCES, load_source, DEFAULT_CONCURRENCY, DISCOVERY_CHUNK_SIZE)
+from render import DEFAULT_RENDER_WORKERS
+from dedup import DEDUP_SET, DEDUP_MODES
+from http_client import (configure_client, DEFAULT_POOL_SIZE, DEFAULT_USER_AGENT, MAX_CONCURRENCY_PER_HOST,
+                         RATE_LIMIT_PER_HOST)
+from metrics import write_metrics
+
+logger = logging.getLogger(__name__)
+
+COORDINATION_PATH = "../database/coordination.sqlite"
+SHARD_STORE_PATH = "../database/shards/"
+DEFAULT_SHARDS = 16
+LEASE_SECONDS = 60.0  # a worker that stops renewing its lease for this long loses its shard
+POLL_INTERVAL = 1.0  # seconds between checks while another worker discovers
+
+SHARD_PENDING = "pending"
+SHARD_CLAIMED = "claimed"
+SHARD_DONE = "done"
+
+
+def shard_of(url, shards):
+    # Stable across processes and machines, unlike hash().
+    return int.from_bytes(hashlib.sha1(url.encode('utf-8')).digest()[:8], 'big') % shards
+
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Coordinator:
+    # The work of a distributed crawl, shared through one SQLite file that
+    # every worker can open: a plain local file for processes on one machine,
+    # or a file on shared storage with working locks for several machines.
+    # One worker discovers a source's items and hash-partitions them into
+    # shards; every worker then claims whole shards under a lease it renews
+    # while working. A shard whose lease ran out (its worker died) is handed
+    # to the next worker that asks. Times are wall-clock seconds, so the
+    # machines' clocks have to agree to well within a lease.
+    def __init__(self, path=COORDINATION_PATH, lease_seconds=LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        # Transactions are explicit; BEGIN IMMEDIATE serializes claims across processes.
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._initialize_db()
+
+    def _initialize_db(self):
+        with self._lock:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS crawl_discovery (
+                    source TEXT PRIMARY KEY,
+                    shards INTEGER NOT NULL,
+                    worker TEXT,
+                    lease_until REAL,
+                    completed_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS crawl_items (
+                    source TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    context TEXT,
+                    shard INTEGER NOT NULL,
+                    PRIMARY KEY (source, url)
+                );
+                CREATE INDEX IF NOT EXISTS idx_crawl_items_shard ON crawl_items (source, shard);
+                CREATE TABLE IF NOT EXISTS crawl_shards (
+                    source TEXT NOT NULL,
+                    shard INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    worker TEXT,
+                    lease_until REAL,
+                    claims INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (source, shard)
+                );
+            """)
+
+    def _transaction(self, work):
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self.connection)
+                self.connection.execute("COMMIT")
+                return result
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def claim_discovery(self, source, worker, shards=DEFAULT_SHARDS):
+        # True if this worker has to discover the source's items: nobody has
+        # yet, or whoever did stopped before finishing. The first claim fixes
+        # the number of shards.
+        def claim(connection):
+            now = time.time()
+            row = connection.execute(
+                "SELECT lease_until, completed_at FROM crawl_discovery WHERE source = ?", (source,)
+            ).fetchone()
+            if row is None:
+                connection.execute("INSERT INTO crawl_discovery VALUES (?, ?, ?, ?, NULL)",
+                                   (source, shards, worker, now + self.lease_seconds))
+                connection.executemany(
+                    f"INSERT INTO crawl_shards (source, shard, state) VALUES (?, ?, '{SHARD_PENDING}')",
+                    [(source, shard) for shard in range(shards)],
+                )
+                return True
+            lease_until, completed_at = row
+            if completed_at is not None or lease_until > now:
+                return False
+            connection.execute("UPDATE crawl_discovery SET worker = ?, lease_until = ? WHERE source = ?",
+                               (worker, now + self.lease_seconds, source))
+            return True
+        return self._transaction(claim)
+
+    def discovery_complete(self, source):
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT completed_at FROM crawl_discovery WHERE source = ?", (source,)
+            ).fetchone()
+        return row is not None and row[0] is not None
+
+    def add_items(self, source, items):
+        # Items already known keep their shard. Returns how many were new.
+        def add(connection):
+            shards = connection.execute("SELECT shards FROM crawl_discovery WHERE source = ?", (source,)).fetchone()[0]
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO crawl_items VALUES (?, ?, ?, ?)",
+                [(source, item.url, json.dumps(item.context), shard_of(item.url, shards)) for item in items],
+            )
+            return connection.total_changes - before
+        return self._transaction(add) if items else 0
+
+    def finish_discovery(self, source, worker):
+        with self._lock:
+            self.connection.execute(
+                "UPDATE crawl_discovery SET completed_at = ?, lease_until = NULL WHERE source = ? AND worker = ?",
+                (time.time(), source, worker),
+            )
+
+    def claim_shard(self, source, worker):
+        # The next shard nobody works on, or None once every shard is taken.
+        def claim(connection):
+            now = time.time()
+            row = connection.execute(f"""
+                SELECT shard FROM crawl_shards
+                WHERE source = ? AND (state = '{SHARD_PENDING}' OR (state = '{SHARD_CLAIMED}' AND lease_until < ?))
+                ORDER BY claims, shard LIMIT 1
+            """, (source, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute(f"""
+                UPDATE crawl_shards SET state = '{SHARD_CLAIMED}', worker = ?, lease_until = ?, claims = claims + 1
+                WHERE source = ? AND shard = ?
+            """, (worker, now + self.lease_seconds, source, row[0]))
+            return row[0]
+        return self._transaction(claim)
+
+    def renew_lease(self, source, worker, shard=None):
+        # False if the lease was lost to another worker in the meantime.
+        with self._lock:
+            if shard is None:
+                cursor = self.connection.execute(
+                    "UPDATE crawl_discovery SET lease_until = ? WHERE source = ? AND worker = ? AND completed_at IS NULL",
+                    (time.time() + self.lease_seconds, source, worker),
+                )
+            else:
+                cursor = self.connection.execute(
+                    f"UPDATE crawl_shards SET lease_until = ? WHERE source = ? AND shard = ? AND worker = ? "
+                    f"AND state = '{SHARD_CLAIMED}'",
+                    (time.time() + self.lease_seconds, source, shard, worker),
+                )
+        return cursor.rowcount > 0
+
+    def shard_items(self, source, shard):
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT url, context FROM crawl_items WHERE source = ? AND shard = ? ORDER BY url", (source, shard)
+            ).fetchall()
+        return [Item(url, json.loads(context) if context else None) for url, context in rows]
+
+    def finish_shard(self, source, shard, worker):
+        with self._lock:
+            self.connection.execute(
+                f"UPDATE crawl_shards SET state = '{SHARD_DONE}', lease_until = NULL "
+                f"WHERE source = ? AND shard = ? AND worker = ?",
+                (source, shard, worker),
+            )
+
+    def progress(self, source):
+        with self._lock:
+            return dict(self.connection.execute(
+                "SELECT state, COUNT(*) FROM crawl_shards WHERE source = ? GROUP BY state", (source,)
+            ).fetchall())
+
+    def unfinished(self, source):
+        # True while the source still has shards nobody has finished crawling.
+        progress = self.progress(source)
+        return bool(progress.get(SHARD_PENDING) or progress.get(SHARD_CLAIMED))
+
+    def reset(self, source):
+        # Forgets the source's crawl so that the next workers start a new one.
+        def reset(connection):
+            for table in ("crawl_discovery", "crawl_items", "crawl_shards"):
+                connection.execute(f"DELETE FROM {table} WHERE source = ?", (source,))
+        self._transaction(reset)
+
+    def close(self):
+        self.connection.close()
+
+
+class ShardedRunner(Runner):
+    # A Runner that takes its work from a Coordinator instead of discovering
+    # everything itself. Each worker has its own DuckDB shard (the sources'
+    # db_path), so workers never share a database file; merge_shards()
+    # combines them afterwards.
+    def __init__(self, coordinator, worker, shards=DEFAULT_SHARDS, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.coordinator = coordinator
+        self.worker = worker
+        self.shards = shards
+
+    async def run_source(self, source, render_pool=None, resume=False, retry_failed=False, include_failed=False):
+        stats = SourceStats(source.name)
+        store = source.open_store(self.batch_size, self.dedup_mode)
+        frontier = Frontier(store.database, source.name)
+        source.start(store)
+        while not await asyncio.to_thread(self.coordinator.discovery_complete, source.name):
+            if await asyncio.to_thread(self.coordinator.claim_discovery, source.name, self.worker, self.shards):
+                lost = threading.Event()
+                heartbeat = asyncio.create_task(self.heartbeat(source.name, None, lost))
+                try:
+                    stats.discovered = await asyncio.to_thread(self.discover, source, store, frontier, lost)
+                finally:
+                    heartbeat.cancel()
+            else:
+                await asyncio.sleep(POLL_INTERVAL)
+
+        with store.batch():
+            self.recover(store, frontier, stats)
+            shards = 0
+            while (shard := await asyncio.to_thread(self.coordinator.claim_shard, source.name, self.worker)) is not None:
+                items = await asyncio.to_thread(self.coordinator.shard_items, source.name, shard)
+                frontier.add_items(items)
+                heartbeat = asyncio.create_task(self.heartbeat(source.name, shard))
+                try:
+                    await self.process_items(source, store, frontier, items, stats, render_pool)
+                finally:
+                    heartbeat.cancel()
+                self.coordinator.finish_shard(source.name, shard, self.worker)
+                shards += 1
+            source.finish(store, {url for url, _, _ in frontier.items((STATE_FAILED,))})
+            logger.info(f"{source.name}: {self.worker} worked through {shards} shards, "
+                        f"{self.coordinator.progress(source.name)}.")
+        stats.elapsed = time.perf_counter() - stats.started
+        return stats
+
+    def discover(self, source, store, frontier, lost=None):
+        # Runs in a worker thread while heartbeat() renews the discovery
+        # lease; stops as soon as the lease is lost, since the worker that
+        # took it over discovers everything again.
+        added = 0
+        chunk = []
+        for item in source.discover():
+            if lost is not None and lost.is_set():
+                logger.warning(f"{source.name}: {self.worker} stopped discovering after {added} items.")
+                return added
+            chunk.append(item)
+            if len(chunk) >= DISCOVERY_CHUNK_SIZE:
+                added += self.coordinator.add_items(source.name, chunk)
+                chunk = []
+        added += self.coordinator.add_items(source.name, chunk)
+        self.coordinator.finish_discovery(source.name, self.worker)
+        logger.info(f"{source.name}: {self.worker} discovered {added} items.")
+        return added
+
+    async def heartbeat(self, source_name, shard, lost=None):
+        # Renews the lease on a shard, or on the discovery if shard is None,
+        # until cancelled or the lease is lost; then sets lost if given.
+        while True:
+            await asyncio.sleep(self.coordinator.lease_seconds / 3)
+            if not await asyncio.to_thread(self.coordinator.renew_lease, source_name, self.worker, shard):
+                # Another worker has the lease now; finishing ours only duplicates work the merge drops.
+                leased = "the discovery" if shard is None else f"shard {shard}"
+                logger.warning(f"{source_name}: {self.worker} lost the lease on {leased}.")
+                if lost is not None:
+                    lost.set()
+                return
+
+
+def worker_db_path(shard_dir, name, worker):
+    return os.path.join(shard_dir, f"{name}-{re.sub(r'[^A-Za-z0-9_.-]', '_', worker)}.db")
+
+
+def shard_db_paths(shard_dir, name):
+    return sorted(glob.glob(os.path.join(shard_dir, f"{name}-*.db")))
+
+
+def merge_shards(name, paths, db_path=None):
+    # Adds the records and texts of every worker shard to the source's own
+    # database. A URL already there, or in an earlier shard, is skipped;
+    # its text is replaced only by a newer one. Each shard is merged in one
+    # transaction; a shard that cannot be read or merged is left out.
+    # Returns the number of records added and the paths actually merged.
+    target = load_source(name, db_path=db_path).open_store(dedup_mode=None)
+    target.flush()
+    columns = ", ".join(target.columns)
+    added = 0
+    merged = []
+    for path in paths:
+        close_connection(path)
+        with connection_lock(target.database):
+            connection = get_connection(target.database)
+            attached = False
+            try:
+                connection.execute(f"ATTACH '{path.replace(chr(39), chr(39) * 2)}' AS shard (READ_ONLY)")
+                attached = True
+                connection.execute("BEGIN TRANSACTION")
+                rows = connection.execute(f"""
+                    INSERT INTO {target.table} (number, {columns})
+                    SELECT NEXTVAL('seq_number'), {columns} FROM (
+                        SELECT * FROM shard.{target.table} s
+                        WHERE NOT EXISTS (SELECT 1 FROM {target.table} t WHERE t.url = s.url)
+                        QUALIFY row_number() OVER (PARTITION BY url ORDER BY number) = 1
+                    ) ORDER BY number
+                """).fetchone()[0]
+                connection.execute(f"""
+                    INSERT INTO {target.text_table} SELECT url, text, updated_at FROM shard.{target.text_table}
+                    ON CONFLICT (url) DO UPDATE SET text = excluded.text, updated_at = excluded.updated_at
+                    WHERE excluded.updated_at > {target.text_table}.updated_at
+                """)
+                connection.execute("COMMIT")
+            except Exception as e:
+                if attached:
+                    connection.execute("ROLLBACK")
+                logger.error(f"Error merging {path} into {target.database}: {e}")
+                continue
+            finally:
+                if attached:
+                    connection.execute("DETACH shard")
+        added += rows
+        merged.append(path)
+        logger.info(f"Merged {rows} {name} records from {path}.")
+    return added, merged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl with several workers sharing one coordination store.")
+    parser.add_argument("--coordination", default=COORDINATION_PATH, help="SQLite file every worker can reach")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    work = commands.add_parser("work", help="claim shards and crawl them into this worker's own database")
+    work.add_argument("sources", nargs="+", choices=sorted(SOURCES), help="sources to crawl")
+    work.add_argument("--worker", default=worker_name(), help="name of this worker, unique across machines")
+    work.add_argument("--shards", type=int, default=DEFAULT_SHARDS,
+                      help="shards each source is split into, fixed by the first worker")
+    work.add_argument("--shard-dir", default=SHARD_STORE_PATH, help="directory of the workers' databases")
+    work.add_argument("--lease", type=float, default=LEASE_SECONDS,
+                      help="seconds after which a silent worker's shard goes to another worker")
+    work.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="items in flight in this worker")
+    work.add_argument("--per-host", type=int, default=MAX_CONCURRENCY_PER_HOST,
+                      help="most in-flight items per host in this worker")
+    work.add_argument("--rate-limit", type=float, default=RATE_LIMIT_PER_HOST,
+                      help="max items started per second per host by this worker, 0 to disable")
+    work.add_argument("--render-workers", type=int, default=DEFAULT_RENDER_WORKERS,
+                      help="worker processes rendering PDFs, 0 renders in threads")
+    work.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                      help="records buffered before they are written to the database in one transaction")
+    work.add_argument("--dedup-index", choices=DEDUP_MODES, default=DEDUP_SET,
+                      help="in-memory index of known URLs: an exact set, or a bloom filter with bounded memory")
+    work.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="HTTP connections kept alive per host")
+    work.add_argument("--user-agent", default=DEFAULT_USER_AGENT, help="User-Agent header sent with every request")
+    work.add_argument("--no-pdf", dest="render_pdfs", action="store_false",
+                      help="only store records and their text, without rendering PDFs")
+    work.add_argument("--ignore-robots", dest="respect_robots", action="store_false",
+                      help="do not slow down to the crawl-delay of robots.txt")
+    work.add_argument("--metrics-out", help="write a run summary as JSON, or as a Prometheus textfile if it ends in .prom")
+
+    merge = commands.add_parser("merge", help="merge the workers' databases into the source's database")
+    merge.add_argument("source", choices=sorted(SOURCES))
+    merge.add_argument("--shard-dir", default=SHARD_STORE_PATH, help="directory of the workers' databases")
+    merge.add_argument("--db", help="database to merge into, the source's usual one by default")
+    merge.add_argument("--remove", action="store_true",
+                       help="delete the workers' databases that were merged, never those that failed to")
+
+    status = commands.add_parser("status", help="show how far each source's shards are")
+    status.add_argument("sources", nargs="+", choices=sorted(SOURCES))
+
+    reset = commands.add_parser("reset", help="forget a source's crawl so the next workers start a new one")
+    reset.add_argument("sources", nargs="+", choices=sorted(SOURCES))
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    if args.command == "merge":
+        # Workers still crawling keep writing to their databases, so merging
+        # now would miss records and --remove would delete them.
+        if os.path.exists(args.coordination):
+            coordinator = Coordinator(args.coordination)
+            unfinished = coordinator.unfinished(args.source)
+            progress = coordinator.progress(args.source)
+            coordinator.close()
+            if unfinished:
+                logger.error(f"Not merging {args.source}, its crawl is unfinished: {progress}")
+                sys.exit(1)
+        added, merged = merge_shards(args.source, shard_db_paths(args.shard_dir, args.source), args.db)
+        if args.remove:
+            for path in merged:
+                os.remove(path)
+    else:
+        coordinator = Coordinator(args.coordination, getattr(args, "lease", LEASE_SECONDS))
+        if args.command == "status":
+            for name in args.sources:
+                print(f"{name}: {coordinator.progress(name)}")
+        elif args.command == "reset":
+            for name in args.sources:
+                coordinator.reset(name)
+        else:
+            os.makedirs(args.shard_dir, exist_ok=True)
+            configure_client(pool_size=max(args.pool_size, args.per_host), user_agent=args.user_agent)
+            runner = ShardedRunner(coordinator, args.worker, args.shards, args.concurrency, args.per_host,
+                                   args.rate_limit, args.render_workers if args.render_pdfs else 0, args.batch_size,
+                                   args.dedup_index, args.respect_robots)
+            options = {} if args.render_pdfs else {"pdf_store_path": None}
+            sources = [load_source(name, db_path=worker_db_path(args.shard_dir, name, args.worker), **options)
+                       for name in args.sources]
+            asyncio.run(runner.run(sources))
+            if args.metrics_out:
+                write_metrics(args.metrics_out)
+        coordinator.close()
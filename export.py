@@ -0,0 +1,199 @@
+import os
+import shutil
+import itertools
+import logging
+import argparse
+from datetime import date, datetime
+
+from store import get_connection, connection_lock
+from runner import SOURCES, load_source
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_PATH = "../export/"
+ARROW_BATCH_ROWS = 64 * 1024  # rows per Arrow record batch
+FORMAT_PARQUET = "parquet"
+FORMAT_ARROW = "arrow"
+EXPORT_FORMATS = (FORMAT_PARQUET, FORMAT_ARROW)
+
+
+class RecordExport:
+    # Queries one source's records together with their extracted text,
+    # straight out of DuckDB: Parquet is written by DuckDB itself and Arrow
+    # batches come from DuckDB's Arrow reader, so no row becomes a Python
+    # object. An incremental export picks up where the last export to the
+    # same target stopped: records added since, and records whose text was
+    # refreshed since, which consumers should keep by latest text_updated_at.
+    def __init__(self, store, source):
+        self.store = store
+        self.source = source
+        self._initialize_db()
+
+    def _initialize_db(self):
+        try:
+            self.store.execute("""
+                CREATE TABLE IF NOT EXISTS export_state (
+                    target VARCHAR PRIMARY KEY,
+                    last_number INTEGER,
+                    last_text_update TIMESTAMP,
+                    exported_at TIMESTAMP NOT NULL
+                )
+            """)
+        except Exception as e:
+            logger.error(f"Error initializing export state: {e}")
+
+    def _bounds(self):
+        # Newest record and text at the start of the export; anything later
+        # is left for the next incremental export.
+        return self.store.fetchone(
+            f"SELECT (SELECT MAX(number) FROM {self.store.table}), (SELECT MAX(updated_at) FROM {self.store.text_table})"
+        )
+
+    def _last_export(self, target):
+        row = self.store.fetchone("SELECT last_number, last_text_update FROM export_state WHERE target = ?", (target,))
+        return row if row is not None else (0, None)
+
+    def _save_export(self, target, bounds):
+        self.store.execute("""
+            INSERT INTO export_state VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (target) DO UPDATE SET last_number = excluded.last_number,
+                last_text_update = excluded.last_text_update, exported_at = excluded.exported_at
+        """, (target, bounds[0] or 0, bounds[1]))
+
+    def query(self, date_from=None, date_to=None, since=None, bounds=None):
+        # (sql, parameters) selecting the records dated within [date_from,
+        # date_to]; since is the (last_number, last_text_update) of a previous
+        # export and bounds the _bounds() of this one.
+        pdf_path = "r.pdf_path" if "pdf_path" in self.store.columns else "NULL::VARCHAR"
+        conditions, parameters = [], [self.source]
+        if date_from is not None:
+            conditions.append("r.date >= ?")
+            parameters.append(date_from)
+        if date_to is not None:
+            conditions.append("r.date <= ?")
+            parameters.append(date_to)
+        if since is not None:
+            conditions.append("(r.number > ? OR t.updated_at > ?)")
+            parameters += list(since)
+        if bounds is not None:
+            conditions.append("r.number <= ? AND (t.updated_at IS NULL OR t.updated_at <= ?)")
+            parameters += [bounds[0] or 0, bounds[1]]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""
+            SELECT ?::VARCHAR AS source, r.number, r.title, r.date, r.url, {pdf_path} AS pdf_path, t.text,
+                   t.updated_at AS text_updated_at, strftime(r.date, '%Y-%m') AS month
+            FROM {self.store.table} r LEFT JOIN {self.store.text_table} t ON t.url = r.url
+            {where}
+            ORDER BY r.number
+        """
+        return sql, parameters
+
+    def _plan(self, date_from, date_to, target, incremental):
+        self.store.flush()
+        bounds = self._bounds()
+        since = self._last_export(target) if incremental else None
+        return self.query(date_from, date_to, since, bounds), bounds
+
+    def write_parquet(self, directory=EXPORT_PATH, date_from=None, date_to=None, incremental=False):
+        # Writes Parquet files partitioned as source=<name>/month=<YYYY-MM>/.
+        # A full export replaces this source's partitions; an incremental one
+        # adds files next to them. Returns the number of rows written.
+        target = f"parquet:{os.path.abspath(directory)}"
+        (sql, parameters), bounds = self._plan(date_from, date_to, target, incremental)
+        partition_dir = os.path.join(directory, f"source={self.source}")
+        if not incremental and os.path.isdir(partition_dir):
+            shutil.rmtree(partition_dir)
+        os.makedirs(directory, exist_ok=True)
+        path = directory.replace("'", "''")
+        with connection_lock(self.store.database):
+            rows = get_connection(self.store.database).execute(f"""
+                COPY ({sql}) TO '{path}'
+                (FORMAT PARQUET, PARTITION_BY (source, month), APPEND, COMPRESSION ZSTD,
+                 FILENAME_PATTERN 'records_{{uuid}}')
+            """, parameters).fetchone()[0]
+        self._save_export(target, bounds)
+        logger.info(f"Exported {rows} {self.source} records to {directory}.")
+        return rows
+
+    def record_batches(self, date_from=None, date_to=None, consumer=None, batch_rows=ARROW_BATCH_ROWS):
+        # Yields pyarrow.RecordBatch objects. With a consumer name only what
+        # that consumer has not seen yet is returned, and the export is
+        # recorded once every batch has been read.
+        if pyarrow is None:
+            raise RuntimeError("Arrow export needs pyarrow installed")
+        target = f"arrow:{consumer}"
+        (sql, parameters), bounds = self._plan(date_from, date_to, target, consumer is not None)
+        # A cursor is a separate connection to the same database, so the
+        # scrapers' shared connection is not held while the consumer reads.
+        cursor = get_connection(self.store.database).cursor()
+        try:
+            yield from cursor.execute(sql, parameters).fetch_record_batch(batch_rows)
+        finally:
+            cursor.close()
+        if consumer is not None:
+            self._save_export(target, bounds)
+
+    def write_arrow(self, directory=EXPORT_PATH, date_from=None, date_to=None, incremental=False):
+        # Writes an Arrow IPC stream file: <source>.arrows for a full export,
+        # a new timestamped file for every incremental one. Returns the number
+        # of rows written.
+        consumer = f"directory:{os.path.abspath(directory)}" if incremental else None
+        batches = self.record_batches(date_from, date_to, consumer)
+        first = next(batches, None)
+        if first is None:
+            logger.info(f"No {self.source} records to export.")
+            return 0
+        suffix = f"-{datetime.now().strftime('%Y%m%dT%H%M%S')}" if incremental else ""
+        path = os.path.join(directory, f"{self.source}{suffix}.arrows")
+        os.makedirs(directory, exist_ok=True)
+        rows = 0
+        with pyarrow.ipc.new_stream(path, first.schema) as writer:
+            for batch in itertools.chain([first], batches):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        logger.info(f"Exported {rows} {self.source} records to {path}.")
+        return rows
+
+
+def open_export(name):
+    # No dedup index: an export only reads.
+    return RecordExport(load_source(name).open_store(dedup_mode=None), name)
+
+
+def add_arguments(parser):
+    parser.add_argument("sources", nargs="+", choices=sorted(SOURCES), help="sources to export")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=FORMAT_PARQUET,
+                        help="Parquet partitioned by source and month, or Arrow IPC stream files per source")
+    parser.add_argument("--out", default=EXPORT_PATH, help="directory to write the export to")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat,
+                        help="only records dated on or after this day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat,
+                        help="only records dated on or before this day (YYYY-MM-DD)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only records added or re-extracted since the last export to the same place")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export scraped records and their text as Parquet or Arrow.")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(args):
+    for name in args.sources:
+        export = open_export(name)
+        if args.format == FORMAT_PARQUET:
+            export.write_parquet(args.out, args.date_from, args.date_to, args.incremental)
+        else:
+            export.write_arrow(args.out, args.date_from, args.date_to, args.incremental)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(parse_args())
@@ -0,0 +1,157 @@
+import re
+import logging
+from html.entities import name2codepoint
+from metrics import get_metrics
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+EXTRACTOR_FAST = "fast"
+EXTRACTOR_SOUP = "soup"
+EXTRACTORS = (EXTRACTOR_FAST, EXTRACTOR_SOUP)
+
+CONTENT_TAGS = ('p', 'ol', 'ul', 'li')
+# get_text() leaves out the strings of these, and comments.
+SKIPPED_TEXT_TAGS = frozenset(('script', 'style', 'template'))
+# html.parser nests an unclosed <p> or <li> inside the next one, libxml2 closes it.
+IMPLIED_END_TAGS = re.compile(r'<(/?)(p|li)\b', re.IGNORECASE)
+# Character references the two parsers decode differently: numeric ones
+# without ";", unknown names, and names starting with an entity but no ";".
+CHARACTER_REFERENCE = re.compile(r'&(#?)([0-9a-zA-Z]+)(;?)')
+# Elements whose contents html.parser keeps as raw text and libxml2 parses
+# as markup; <plaintext> makes the rest of the page text.
+RAW_TEXT_TAGS = ('textarea', 'iframe', 'noembed', 'noframes', 'xmp', 'plaintext')
+# CDATA sections, bogus comments and malformed end tags, which the two
+# parsers drop or keep differently. A cheap search comes first; the full
+# match skips what comments, scripts and styles contain, where WordPress
+# puts most of its CDATA.
+MARKUP_DECLARATION_HINT = re.compile(r'<!(?!--|doctype\b)|</(?![a-z])', re.IGNORECASE)
+MARKUP_DECLARATION = re.compile(
+    r'<!--.*?-->|<(script|style)\b.*?</\1\s*>|(<!(?!--|doctype\b|\[(?!CDATA\[))|</(?![a-z]))',
+    re.IGNORECASE | re.DOTALL,
+)
+
+_extractor = EXTRACTOR_FAST
+
+
+def use_extractor(name):
+    global _extractor
+    _extractor = name
+
+
+def get_extractor():
+    return _extractor
+
+
+def _ambiguous_reference(match):
+    numeric, name, semicolon = match.groups()
+    if numeric:
+        return not semicolon
+    if semicolon:
+        return name not in name2codepoint
+    return any(name.startswith(entity) for entity in name2codepoint)
+
+
+def _reads_differently(html, parser, root):
+    # True when libxml2 may read the page differently from html.parser: it
+    # closes a <p> before a block element (and then complains about the
+    # stray </p>), closes an unclosed <p>/<li> where html.parser nests,
+    # turns \r\n into \n, decodes malformed character references, and
+    # parses raw text elements and markup declarations its own way.
+    if '\r' in html:
+        return True
+    if any(len(element) or element.text for element in root.iter(*RAW_TEXT_TAGS)):
+        return True
+    if MARKUP_DECLARATION_HINT.search(html) and any(match.group(2) for match in MARKUP_DECLARATION.finditer(html)):
+        return True
+    if any(error.type == etree.ErrorTypes.ERR_TAG_NAME_MISMATCH for error in parser.error_log):
+        return True
+    counts = {}
+    for closing, tag in IMPLIED_END_TAGS.findall(html):
+        key = (closing, tag.lower())
+        counts[key] = counts.get(key, 0) + 1
+    if any(counts.get(('', tag), 0) != counts.get(('/', tag), 0) for tag in ('p', 'li')):
+        return True
+    return any(_ambiguous_reference(match) for match in CHARACTER_REFERENCE.finditer(html))
+
+
+def parse_tree(html):
+    # lxml tree of the page, or None if lxml is missing, cannot parse it, or
+    # would read it differently from html.parser; callers then fall back to
+    # BeautifulSoup so the extracted text never changes.
+    if etree is None or not html:
+        return None
+    try:
+        with get_metrics().timed("parse"):
+            parser = etree.HTMLParser()
+            root = etree.fromstring(html, parser)
+            if root is None or _reads_differently(html, parser, root):
+                return None
+        return root
+    except Exception as e:
+        logger.debug(f"lxml could not parse the page, using BeautifulSoup: {e}")
+        return None
+
+
+def class_strainer(*class_names):
+    # Keeps only tags carrying one of the classes, and everything inside them.
+    from bs4 import SoupStrainer
+    names = frozenset(class_names)
+    return SoupStrainer(class_=lambda value: value is not None and not names.isdisjoint(value.split()))
+
+
+def has_class(element, class_name):
+    return class_name in (element.get('class') or '').split()
+
+
+def find_first(element, tag, class_name):
+    # Like Tag.find(tag, class_=class_name): the first matching descendant.
+    for descendant in element.iterdescendants(tag):
+        if has_class(descendant, class_name):
+            return descendant
+    return None
+
+
+def find_by_id(element, element_id):
+    # Like soup.find(id=element_id) on the document: the element itself counts.
+    for candidate in element.iter(etree.Element):
+        if candidate.get('id') == element_id:
+            return candidate
+    return None
+
+
+def _collect_text(element, parts):
+    if element.tag in SKIPPED_TEXT_TAGS:
+        return
+    if element.text:
+        text = element.text.strip()
+        if text:
+            parts.append(text)
+    for child in element:
+        if isinstance(child.tag, str):
+            _collect_text(child, parts)
+        if child.tail:
+            text = child.tail.strip()
+            if text:
+                parts.append(text)
+
+
+def element_text(element):
+    # Same as BeautifulSoup's get_text(strip=True).
+    parts = []
+    _collect_text(element, parts)
+    return ''.join(parts)
+
+
+def content_text(element):
+    # The text of every p/ol/ul/li inside element, in document order, each
+    # followed by a space; built in one join.
+    return ''.join(element_text(child) + ' ' for child in element.iterdescendants(*CONTENT_TAGS))
+
+
+def soup_content_text(tag):
+    return ''.join(child.get_text(strip=True) + ' ' for child in tag.find_all(list(CONTENT_TAGS)))
@@ -0,0 +1,159 @@
+import json
+import logging
+
+from store import get_connection, connection_lock, staged_rows, csv_source
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = "pending"
+STATE_FETCHED = "fetched"
+STATE_RENDERED = "rendered"
+STATE_COMMITTED = "committed"
+STATE_FAILED = "failed"
+
+# fetched items are started again from scratch: the extracted content is not kept.
+RUNNABLE_STATES = (STATE_PENDING, STATE_FETCHED)
+
+
+class Frontier:
+    # Persistent work queue of one source, kept in the source's database.
+    # Items move pending -> fetched -> rendered -> committed, or to failed.
+    # A rendered item carries its record row and text, so a crash between
+    # writing the PDF and committing the record is repaired on the next run
+    # without fetching or rendering again.
+    def __init__(self, database, source):
+        self.database = database
+        self.source = source
+        self._initialize_db()
+
+    def _initialize_db(self):
+        try:
+            with connection_lock(self.database):
+                get_connection(self.database).execute("""
+                    CREATE TABLE IF NOT EXISTS frontier (
+                        source VARCHAR NOT NULL,
+                        url VARCHAR NOT NULL,
+                        context VARCHAR,
+                        state VARCHAR NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        last_error VARCHAR,
+                        record VARCHAR,
+                        updated_at TIMESTAMP NOT NULL,
+                        text VARCHAR,
+                        PRIMARY KEY (source, url)
+                    );
+                    CREATE TABLE IF NOT EXISTS frontier_discovery (
+                        source VARCHAR PRIMARY KEY,
+                        started_at TIMESTAMP,
+                        completed_at TIMESTAMP
+                    );
+                """)
+        except Exception as e:
+            logger.error(f"Error initializing frontier: {e}")
+
+    def _execute(self, query, parameters=None):
+        with connection_lock(self.database):
+            return get_connection(self.database).execute(query, parameters).fetchall()
+
+    def start_discovery(self):
+        self._execute(
+            "INSERT OR REPLACE INTO frontier_discovery VALUES (?, CURRENT_TIMESTAMP, NULL)", (self.source,)
+        )
+
+    def finish_discovery(self):
+        self._execute(
+            "UPDATE frontier_discovery SET completed_at = CURRENT_TIMESTAMP WHERE source = ?", (self.source,)
+        )
+
+    def discovery_complete(self):
+        rows = self._execute("SELECT completed_at FROM frontier_discovery WHERE source = ?", (self.source,))
+        return bool(rows and rows[0][0])
+
+    def add_items(self, items):
+        # Items already in the frontier keep their state but take the context
+        # they were discovered with this time. Returns how many were new.
+        rows = [(self.source, item.url, json.dumps(item.context)) for item in items]
+        if not rows:
+            return 0
+        with staged_rows(rows, prefix="frontier") as staging_path:
+            self._execute(f"""
+                UPDATE frontier SET context = staged.context
+                FROM {csv_source(('source', 'url', 'context'))} AS staged
+                WHERE frontier.source = staged.source AND frontier.url = staged.url
+                AND frontier.context IS DISTINCT FROM staged.context
+            """, (staging_path,))
+            inserted = self._execute(f"""
+                INSERT INTO frontier (source, url, context, state, attempts, updated_at)
+                SELECT source, url, context, '{STATE_PENDING}', 0, CURRENT_TIMESTAMP
+                FROM {csv_source(('source', 'url', 'context'))}
+                ON CONFLICT DO NOTHING
+                RETURNING url
+            """, (staging_path,))
+        return len(inserted)
+
+    def items(self, states=RUNNABLE_STATES):
+        # (url, context, record) of every item in one of `states`, oldest first.
+        placeholders = ", ".join("?" for _ in states)
+        rows = self._execute(
+            f"SELECT url, context, record FROM frontier WHERE source = ? AND state IN ({placeholders}) "
+            f"ORDER BY updated_at, url",
+            [self.source, *states],
+        )
+        return [(url, json.loads(context) if context else None, json.loads(record) if record else None)
+                for url, context, record in rows]
+
+    def rendered_items(self):
+        # (url, record, text) of every rendered item, oldest first.
+        rows = self._execute(
+            f"SELECT url, record, text FROM frontier WHERE source = ? AND state = '{STATE_RENDERED}' "
+            f"ORDER BY updated_at, url",
+            (self.source,),
+        )
+        return [(url, json.loads(record) if record else None, text) for url, record, text in rows]
+
+    def requeue(self, urls, states=None):
+        # Back to pending, to be fetched and rendered again: from one of
+        # `states` if given, whatever their state otherwise.
+        if not urls:
+            return
+        state_filter = f"AND state IN ({', '.join('?' for _ in states)})" if states else ""
+        with staged_rows([(url,) for url in urls], prefix="frontier") as staging_path:
+            self._execute(f"""
+                UPDATE frontier SET state = '{STATE_PENDING}', record = NULL, text = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE source = ? AND url IN (SELECT url FROM {csv_source(('url',))}) {state_filter}
+            """, [self.source, staging_path, *(states or ())])
+
+    def mark_fetched(self, url):
+        self._execute(
+            f"UPDATE frontier SET state = '{STATE_FETCHED}', attempts = attempts + 1, last_error = NULL, "
+            f"updated_at = CURRENT_TIMESTAMP WHERE source = ? AND url = ?",
+            (self.source, url),
+        )
+
+    def mark_rendered(self, url, row, text=None):
+        self._execute(
+            f"UPDATE frontier SET state = '{STATE_RENDERED}', record = ?, text = ?, updated_at = CURRENT_TIMESTAMP "
+            f"WHERE source = ? AND url = ?",
+            (json.dumps(list(row), default=str), text, self.source, url),
+        )
+
+    def mark_failed(self, url, error, count_attempt=True):
+        self._execute(
+            f"UPDATE frontier SET state = '{STATE_FAILED}', attempts = attempts + ?, last_error = ?, "
+            f"updated_at = CURRENT_TIMESTAMP WHERE source = ? AND url = ?",
+            (1 if count_attempt else 0, str(error), self.source, url),
+        )
+
+    def mark_committed(self, urls):
+        if not urls:
+            return
+        with staged_rows([(url,) for url in urls], prefix="frontier") as staging_path:
+            self._execute(f"""
+                UPDATE frontier SET state = '{STATE_COMMITTED}', record = NULL, text = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE source = ? AND url IN (SELECT url FROM {csv_source(('url',))})
+            """, (self.source, staging_path))
+
+    def counts(self):
+        return dict(self._execute(
+            "SELECT state, COUNT(*) FROM frontier WHERE source = ? GROUP BY state", (self.source,)
+        ))
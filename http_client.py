@@ -0,0 +1,368 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+
+from metrics import get_metrics
+
+# Suppress insecure request warnings; both target sites are fetched with verify=False.
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 16  # kept connections per host
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; scraping-pack/1.0)"
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0  # seconds, doubled after every failed attempt
+MAX_RETRY_AFTER = 300  # longest Retry-After we are willing to sleep for
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}  # the host asks us to slow down
+MAX_CONCURRENCY_PER_HOST = 8  # ceiling of the adaptive per-host concurrency
+INITIAL_CONCURRENCY_PER_HOST = 2
+RATE_LIMIT_PER_HOST = 10.0  # requests per second, 0 disables the limit
+LATENCY_SMOOTHING = 0.2  # weight of the newest response in the smoothed latency
+CONGESTION_LATENCY_RATIO = 3.0  # smoothed latency this many times the fastest seen means overload
+MIN_CONGESTION_LATENCY = 0.05  # seconds; below this latency changes are noise
+PROBE_INTERVAL = 30.0  # seconds after an overload before concurrency may grow past what the host took
+MAX_REQUEUES = 5  # times an item failed by an overloaded host is tried again
+ROBOTS_TIMEOUT = 10
+
+# Set by HostLimiter.slot() so that HttpClient reports every request made
+# while the slot is held, including from the worker thread doing the fetch.
+_request_observer = contextvars.ContextVar("request_observer", default=None)
+
+try:
+    import brotli  # noqa: F401 -- urllib3 only decodes br when a brotli module is importable
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date.
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class RequestStats:
+    # Per-request timings, aggregated per host. `elapsed` is the time until the
+    # response headers arrived, so streamed bodies are not included.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hosts = {}
+
+    def record(self, host, elapsed, status=None):
+        with self._lock:
+            stats = self.hosts.setdefault(host, {"requests": 0, "errors": 0, "seconds": 0.0, "slowest": 0.0})
+            stats["requests"] += 1
+            stats["seconds"] += elapsed
+            stats["slowest"] = max(stats["slowest"], elapsed)
+            if status is None or status >= 400:
+                stats["errors"] += 1
+
+    def summary(self):
+        with self._lock:
+            return [
+                f"{host}: {stats['requests']} requests, {stats['errors']} errors, "
+                f"avg {stats['seconds'] / stats['requests'] * 1000:.1f}ms, slowest {stats['slowest'] * 1000:.1f}ms"
+                for host, stats in self.hosts.items()
+            ]
+
+
+class HostState:
+    # Adaptive concurrency of one host, kept like a TCP congestion window:
+    # it doubles every round trip (slow start) until the host first shows
+    # overload, then grows by one per round trip and halves on overload
+    # (additive increase, multiplicative decrease). Overload is a 429/503,
+    # a 5xx or failed connection, or a smoothed latency well above the
+    # fastest one seen. After an overload the window stays below the level
+    # that caused it for PROBE_INTERVAL, so a host that always pushes back at
+    # the same level costs one Retry-After per interval, not one per cycle.
+    def __init__(self, host, initial, ceiling, min_interval):
+        self.host = host
+        self.limit = float(min(initial, ceiling))
+        self.ceiling = ceiling
+        self.threshold = float(ceiling)
+        self.tolerated = ceiling
+        self.in_flight = 0
+        self.min_interval = min_interval
+        self.crawl_delay = None
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.latency = None
+        self.fastest = None
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.ready = asyncio.Condition()
+        self.robots = None
+
+    def record(self, elapsed, status, retry_after, now):
+        self.requests += 1
+        if status in THROTTLE_STATUS_CODES:
+            self.throttled += 1
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            overloaded = True
+        elif status is None or status >= 500:
+            self.errors += 1
+            overloaded = True
+        else:
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+            self.fastest = elapsed if self.fastest is None else min(self.fastest, elapsed)
+            overloaded = self.latency > CONGESTION_LATENCY_RATIO * max(self.fastest, MIN_CONGESTION_LATENCY)
+        if overloaded:
+            # Responses already in flight report the same overload; react once per round trip.
+            if now - self.last_decrease >= (self.latency or elapsed):
+                self.tolerated = max(1, int(self.limit) - 1)
+                self.threshold = max(1.0, self.limit / 2)
+                self.limit = self.threshold
+                self.last_decrease = now
+                logger.debug(f"{self.host}: overloaded ({status or 'no response'}), concurrency down to {self.limit:.1f}")
+            return
+        cap = self.ceiling if now - self.last_decrease >= PROBE_INTERVAL else self.tolerated
+        if self.limit < self.threshold:
+            self.limit = min(self.limit + 1, cap)
+        else:
+            self.limit = max(self.limit, min(self.limit + 1 / self.limit, cap))
+
+    def summary(self):
+        latency = f"{self.latency * 1000:.1f}ms" if self.latency is not None else "n/a"
+        crawl_delay = f", crawl-delay {self.crawl_delay}s" if self.crawl_delay else ""
+        return (f"{self.host}: concurrency {self.limit:.1f} of {self.ceiling}, {self.requests} requests, "
+                f"{self.throttled} throttled, {self.errors} errors, smoothed latency {latency}{crawl_delay}")
+
+
+class HostSlot:
+    # Held while working on one item; counts the requests that failed in a
+    # way worth retrying later.
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.failures = 0
+
+    def observe(self, host, elapsed, status, retry_after):
+        if status is None or status in RETRY_STATUS_CODES:
+            self.failures += 1
+        self.limiter.record(host, elapsed, status, retry_after)
+
+
+class HostLimiter:
+    # Per-host politeness for the async crawlers: adaptive concurrency (see
+    # HostState) up to max_concurrency, at most rate_limit starts per second
+    # or robots.txt's crawl-delay if that is slower, and no requests while a
+    # host's Retry-After runs.
+    def __init__(self, max_concurrency=MAX_CONCURRENCY_PER_HOST, rate_limit=RATE_LIMIT_PER_HOST,
+                 initial_concurrency=INITIAL_CONCURRENCY_PER_HOST, respect_robots=True):
+        self.max_concurrency = max_concurrency
+        self.min_interval = 1.0 / rate_limit if rate_limit else 0.0
+        self.initial_concurrency = initial_concurrency
+        self.respect_robots = respect_robots
+        self._hosts = {}
+        # Outcomes are recorded from worker threads.
+        self._lock = threading.Lock()
+
+    def _state(self, url):
+        parts = urlparse(url)
+        state = self._hosts.get(parts.netloc)
+        if state is None:
+            state = HostState(parts.netloc, self.initial_concurrency, self.max_concurrency, self.min_interval)
+            if self.respect_robots:
+                state.robots = asyncio.ensure_future(self._load_robots(state, f"{parts.scheme}://{parts.netloc}/robots.txt"))
+            self._hosts[parts.netloc] = state
+        return state
+
+    async def _load_robots(self, state, robots_url):
+        try:
+            response = await asyncio.to_thread(get_client().get, robots_url, timeout=ROBOTS_TIMEOUT, retries=0)
+        except requests.RequestException as e:
+            logger.debug(f"No robots.txt for {state.host}: {e}")
+            return
+        parser = RobotFileParser()
+        parser.parse(response.text.splitlines())
+        user_agent = get_client().session.headers.get("User-Agent", "*")
+        crawl_delay = parser.crawl_delay(user_agent)
+        request_rate = parser.request_rate(user_agent)
+        if request_rate and request_rate.requests:
+            crawl_delay = max(float(crawl_delay or 0), request_rate.seconds / request_rate.requests)
+        if crawl_delay:
+            state.crawl_delay = float(crawl_delay)
+            state.min_interval = max(state.min_interval, state.crawl_delay)
+            logger.info(f"{state.host}: robots.txt asks for {state.crawl_delay}s between requests.")
+
+    def record(self, host, elapsed, status, retry_after=None):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state.record(elapsed, status, retry_after, time.monotonic())
+
+    async def _wait_turn(self, state):
+        # Reserve the next start slot for this host before sleeping so that
+        # concurrent callers are spaced out instead of waking up together.
+        now = time.monotonic()
+        with self._lock:
+            slot = max(now, state.next_slot, state.paused_until)
+            state.next_slot = slot + state.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    @asynccontextmanager
+    async def slot(self, url):
+        # Waits until the host of url may take another request, then yields
+        # a HostSlot to which every request made inside is reported.
+        state = self._state(url)
+        if state.robots is not None:
+            await state.robots
+        async with state.ready:
+            await state.ready.wait_for(lambda: state.in_flight < int(state.limit))
+            state.in_flight += 1
+        host_slot = HostSlot(self)
+        token = _request_observer.set(host_slot.observe)
+        try:
+            await self._wait_turn(state)
+            yield host_slot
+        finally:
+            _request_observer.reset(token)
+            async with state.ready:
+                state.in_flight -= 1
+                state.ready.notify_all()
+
+    def retry_delay(self, url, attempt, backoff=RETRY_BACKOFF):
+        # Exponential backoff, or until the host's Retry-After ends if later.
+        state = self._hosts.get(urlparse(url).netloc)
+        paused = state.paused_until - time.monotonic() if state is not None else 0.0
+        return max(backoff * (2 ** attempt), paused)
+
+    def summary(self):
+        with self._lock:
+            return [state.summary() for state in self._hosts.values()]
+
+
+class HttpClient:
+    # One requests.Session shared by every fetch, so connections to a host are
+    # kept alive and reused instead of reopened (with a TLS handshake) per URL.
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=REQUEST_TIMEOUT, user_agent=DEFAULT_USER_AGENT,
+                 retries=MAX_RETRIES, backoff=RETRY_BACKOFF, verify=False):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = RequestStats()
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "Connection": "keep-alive",
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _record(self, host, elapsed, response=None):
+        status = response.status_code if response is not None else None
+        self.stats.record(host, elapsed, status)
+        observer = _request_observer.get()
+        if observer is not None:
+            observer(host, elapsed, status, retry_after_seconds(response) if status in RETRY_STATUS_CODES else None)
+
+    def get(self, url, headers=None, stream=False, timeout=None, retries=None):
+        # Returns a response with a 2xx or 304 status, or raises the last
+        # requests exception. Timeouts, connection errors, 429 and 5xx are
+        # retried with exponential backoff, waiting at least Retry-After, except
+        # for 429/503 inside a HostLimiter slot. Streamed bodies are counted as
+        # downloaded bytes by whoever reads them.
+        retries = self.retries if retries is None else retries
+        host = urlparse(url).netloc
+        metrics = get_metrics()
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            response = None
+            try:
+                with metrics.timed("fetch"):
+                    response = self.session.get(url, headers=headers, stream=stream, timeout=timeout or self.timeout)
+                    self._record(host, time.perf_counter() - start, response)
+                    logger.debug(f"GET {url} {response.status_code} in {response.elapsed.total_seconds() * 1000:.1f}ms")
+                    response.raise_for_status()
+                if not stream:
+                    metrics.add_bytes(len(response.content))
+                return response
+            except requests.HTTPError as e:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                    raise
+                if response.status_code in THROTTLE_STATUS_CODES and _request_observer.get() is not None:
+                    # Inside a HostLimiter slot: the caller requeues once the
+                    # host's Retry-After is over instead of sleeping in the slot.
+                    raise
+                error = e
+            except requests.RequestException as e:
+                if response is None:
+                    self._record(host, time.perf_counter() - start)
+                if attempt == retries:
+                    raise
+                error = e
+            delay = max(self.backoff * (2 ** attempt), retry_after_seconds(response) or 0.0)
+            if response is not None:
+                response.close()
+            logger.warning(f"Retrying {url} in {delay:.1f}s ({attempt + 1}/{retries}): {error}")
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def configure_client(**kwargs):
+    # Replaces the shared client, e.g. with options from the command line.
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = HttpClient(**kwargs)
+        return _client
+
+
+def log_request_stats(limiter=None):
+    if _client is not None:
+        for line in _client.stats.summary():
+            logger.info(f"HTTP {line}")
+    if limiter is not None:
+        for line in limiter.summary():
+            logger.info(f"Politeness {line}")
@@ -0,0 +1,344 @@
+import io
+import os
+import sys
+import json
+import time
+import logging
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("fetch", "parse", "extract", "render", "merge", "db_check", "db_insert")
+# Upper bounds in seconds; the last bucket catches everything slower.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROGRESS_INTERVAL = 10.0  # seconds between progress lines
+
+PROFILE_CPU = "cpu"
+PROFILE_MEMORY = "memory"
+PROFILE_MODES = (PROFILE_CPU, PROFILE_MEMORY)
+PROFILE_OUTPUT = {PROFILE_CPU: "scrape-profile.pstats", PROFILE_MEMORY: "scrape-memory.txt"}
+PROFILE_TOP = 25  # entries logged at the end of a profiled run
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for i, count in enumerate(other["buckets"]):
+            self.counts[i] += count
+        self.count += other["count"]
+        self.sum += other["sum"]
+        self.max = max(self.max, other["max"])
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max, "buckets": list(self.counts)}
+
+
+class _StageTimer:
+    # A plain class rather than @contextmanager: it wraps every URL check and
+    # insert, and a generator costs several times as much per call.
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.metrics.error(self.stage)
+
+
+def peak_rss_bytes():
+    # Highest resident set size of this process so far, or None if unknown.
+    # On Linux ru_maxrss of a spawned process starts at its parent's RSS at
+    # the fork, so the high-water mark of its own memory is read instead.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Metrics:
+    # Per-stage latency histograms, error counts and throughput counters for
+    # one run. Shared by every thread of the process; render workers send
+    # their own snapshot back, which is merged in.
+    def __init__(self, progress_interval=PROGRESS_INTERVAL):
+        self.progress_interval = progress_interval
+        self.stages = {}
+        self.errors = {}
+        self.pages = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+        self.worker_peak_rss = None
+        self.started = time.perf_counter()
+        self._last_progress = self.started
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = Histogram()
+            self.stages[stage].observe(seconds)
+
+    def error(self, stage):
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def timed(self, stage):
+        # Exceptions are counted as errors of the stage and re-raised.
+        return _StageTimer(self, stage)
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes_downloaded += count
+
+    def item_failed(self):
+        with self._lock:
+            self.failed += 1
+
+    def page_done(self):
+        with self._lock:
+            self.pages += 1
+            now = time.perf_counter()
+            if now - self._last_progress < self.progress_interval:
+                return
+            self._last_progress = now
+        logger.info(self.progress())
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def progress(self):
+        elapsed = self.elapsed()
+        return (
+            f"Progress: {self.pages} pages in {elapsed:.0f}s ({self.pages / elapsed:.1f}/s), "
+            f"{self.bytes_downloaded / 1e6:.1f} MB downloaded, {self.failed} failed, "
+            f"{sum(self.errors.values())} stage errors"
+        )
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = self.elapsed()
+            return {
+                "elapsed_seconds": elapsed,
+                "pages": self.pages,
+                "pages_per_second": self.pages / elapsed if elapsed else 0.0,
+                "failed": self.failed,
+                "bytes_downloaded": self.bytes_downloaded,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "worker_peak_rss_bytes": self.worker_peak_rss,
+                "errors": dict(self.errors),
+                "buckets": list(LATENCY_BUCKETS),
+                "stages": {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+            }
+
+    def merge(self, snapshot):
+        # Adds the stage timings and errors of another process's snapshot and
+        # keeps the highest peak RSS of the processes merged in.
+        with self._lock:
+            if snapshot.get("peak_rss_bytes") is not None:
+                self.worker_peak_rss = max(self.worker_peak_rss or 0, snapshot["peak_rss_bytes"])
+            for stage, other in snapshot["stages"].items():
+                if stage not in self.stages:
+                    self.stages[stage] = Histogram()
+                self.stages[stage].merge(other)
+            for stage, count in snapshot["errors"].items():
+                self.errors[stage] = self.errors.get(stage, 0) + count
+
+    def summary(self):
+        lines = [self.progress()]
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else 99)
+            for stage, histogram in stages:
+                lines.append(
+                    f"{stage}: {histogram.count} calls, {histogram.sum:.2f}s total, "
+                    f"avg {histogram.sum / histogram.count * 1000:.1f}ms, p50 {histogram.quantile(0.5) * 1000:.1f}ms, "
+                    f"p95 {histogram.quantile(0.95) * 1000:.1f}ms, max {histogram.max * 1000:.1f}ms, "
+                    f"{self.errors.get(stage, 0)} errors"
+                )
+            worker_peak = self.worker_peak_rss
+        peak = peak_rss_bytes()
+        if peak is not None:
+            workers = f", render workers {worker_peak / 1e6:.1f} MB" if worker_peak is not None else ""
+            lines.append(f"Peak RSS: {peak / 1e6:.1f} MB{workers}")
+        return lines
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP scraper_stage_seconds Time spent in each pipeline stage.",
+            "# TYPE scraper_stage_seconds histogram",
+        ]
+        for stage, histogram in snapshot["stages"].items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                cumulative += count
+                lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        lines += ["# HELP scraper_stage_errors_total Errors raised in each pipeline stage.",
+                  "# TYPE scraper_stage_errors_total counter"]
+        lines += [f'scraper_stage_errors_total{{stage="{stage}"}} {count}' for stage, count in snapshot["errors"].items()]
+        for name, kind, help_text, value in (
+            ("scraper_pages_total", "counter", "Pages scraped and recorded.", snapshot["pages"]),
+            ("scraper_failed_total", "counter", "Items that could not be scraped.", snapshot["failed"]),
+            ("scraper_downloaded_bytes_total", "counter", "Response bytes downloaded.", snapshot["bytes_downloaded"]),
+            ("scraper_pages_per_second", "gauge", "Pages recorded per second over the run.",
+             snapshot["pages_per_second"]),
+            ("scraper_run_seconds", "gauge", "Duration of the run.", snapshot["elapsed_seconds"]),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        for name, help_text, value in (
+            ("scraper_peak_rss_bytes", "Peak resident set size of the scraping process.", snapshot["peak_rss_bytes"]),
+            ("scraper_render_worker_peak_rss_bytes", "Highest peak resident set size of the render workers.",
+             snapshot["worker_peak_rss_bytes"]),
+        ):
+            if value is not None:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # A Prometheus textfile if path ends in .prom, JSON otherwise.
+        if path.endswith(".prom"):
+            data = self.prometheus()
+        else:
+            data = json.dumps(self.snapshot(), indent=2)
+        # Written aside and renamed, so a textfile collector never reads half a file.
+        partial_path = f"{path}.part"
+        with open(partial_path, "w") as out:
+            out.write(data)
+        os.replace(partial_path, path)
+        logger.info(f"Run metrics written to {path}.")
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def reset_metrics(**kwargs):
+    global _metrics
+    _metrics = Metrics(**kwargs)
+    return _metrics
+
+
+def log_metrics():
+    for line in _metrics.summary():
+        logger.info(line)
+
+
+def write_metrics(path):
+    try:
+        _metrics.write(path)
+    except Exception as e:
+        logger.error(f"Error writing run metrics to {path}: {e}")
+
+
+@contextmanager
+def _cpu_profile(output):
+    # cProfile only sees the thread that enabled it, so every thread started
+    # during the run gets its own profiler and all of them are merged at the end.
+    profiles = [cProfile.Profile()]
+
+    def profile_thread(*args):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles every thread from the first profiler.
+            return
+        profiles.append(profile)
+
+    threading.setprofile(profile_thread)
+    profiles[0].enable()
+    try:
+        yield
+    finally:
+        profiles[0].disable()
+        threading.setprofile(None)
+        top = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=top)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(output)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        logger.info(f"CPU profile of {len(profiles)} threads written to {output}.\n{top.getvalue()}")
+
+
+@contextmanager
+def _memory_profile(output):
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        top = snapshot.statistics("lineno")
+        with open(output, "w") as out:
+            out.write(f"current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+            for stat in top:
+                out.write(f"{stat}\n")
+        logger.info(f"Memory profile written to {output}: peak {peak / 1e6:.1f} MB traced; largest allocations:")
+        for stat in top[:PROFILE_TOP]:
+            logger.info(str(stat))
+
+
+@contextmanager
+def profiled(mode=None, output=None):
+    # Profiles the enclosed run with cProfile or tracemalloc, or does nothing.
+    if mode is None:
+        yield
+        return
+    profile = _cpu_profile if mode == PROFILE_CPU else _memory_profile
+    with profile(output or PROFILE_OUTPUT[mode]):
+        yield
@@ -1,156 +1,181 @@
 import requests
-from bs4 import BeautifulSoup
-from fpdf import FPDF
-from PyPDF2 import PdfReader, PdfWriter
 import os
-import duckdb
+import sys
+import argparse
+import asyncio
+import hashlib
+import tempfile
 from datetime import datetime
 import urllib3
 import logging
+from io import BytesIO
+from store import DuckDBStore, DEFAULT_BATCH_SIZE
+from render import render_text_pdf, write_merged_pdf, format_title, DEFAULT_RENDER_WORKERS
+from dedup import DEDUP_SET, DEDUP_MODES
+from runner import Runner, Source, Item, Extracted
+from response_cache import open_cache, CACHE_MAX_MB, CACHE_MAX_AGE_DAYS
+from http_client import get_client, configure_client, DEFAULT_POOL_SIZE, DEFAULT_USER_AGENT
+from metrics import get_metrics, write_metrics, profiled, PROFILE_MODES
+from extraction import (parse_tree, find_first, find_by_id, content_text, soup_content_text, use_extractor,
+                        get_extractor, EXTRACTOR_FAST, EXTRACTOR_SOUP, EXTRACTORS)
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
 
 # Suppress insecure request warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Constants
 PDF_STORE_PATH = "../uningest/"
 DATABASE_STORE_PATH = "../database/"
+CACHE_STORE_PATH = "../cache/pmospeech/"
+SPEECH_LISTING_URL = "https://www.pmo.gov.my/speech/"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+ATTACHMENT_SPOOL_SIZE = 16 * 1024 * 1024  # attachments above this spill to a temporary file
+MAX_ATTACHMENT_MB = 256  # larger attachments are left out of the speech PDF, 0 disables the limit
+
+class AttachmentTooLarge(Exception):
+    pass
 
-# Ensure necessary directories exist
-os.makedirs(PDF_STORE_PATH, exist_ok=True)
-os.makedirs(DATABASE_STORE_PATH, exist_ok=True)
+class PMOSpeechData(DuckDBStore):
+    table = "PMO_speech_data"
+    columns = ("title", "date", "url", "pdf_path")
 
-class PMOSpeechData:
-    def __init__(self, db_path=os.path.join(DATABASE_STORE_PATH, "PMOSpeech.db")):
-        self.database = db_path
-        self._initialize_db()
+    def __init__(self, db_path=os.path.join(DATABASE_STORE_PATH, "PMOSpeech.db"), batch_size=DEFAULT_BATCH_SIZE,
+                 dedup_mode=DEDUP_SET):
+        super().__init__(db_path, batch_size, dedup_mode)
 
     def _initialize_db(self):
         try:
-            with duckdb.connect(self.database) as conn:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS PMO_speech_data (
-                        number INTEGER PRIMARY KEY,
-                        title VARCHAR NOT NULL,
-                        date DATE NOT NULL,
-                        url VARCHAR NOT NULL,
-                        pdf_path VARCHAR NOT NULL
-                    );
-                    CREATE SEQUENCE IF NOT EXISTS seq_number START 1;
-                """)
+            self.execute("""
+                CREATE TABLE IF NOT EXISTS PMO_speech_data (
+                    number INTEGER PRIMARY KEY,
+                    title VARCHAR NOT NULL,
+                    date DATE NOT NULL,
+                    url VARCHAR NOT NULL,
+                    pdf_path VARCHAR NOT NULL
+                );
+                CREATE SEQUENCE IF NOT EXISTS seq_number START 1;
+                CREATE INDEX IF NOT EXISTS idx_pmo_speech_data_url ON PMO_speech_data (url);
+            """)
             logger.info("Database initialized.")
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
 
-    def create_record(self, title, date, url, pdf_path):
-        try:
-            with duckdb.connect(self.database) as conn:
-                query = "INSERT INTO PMO_speech_data (number, title, date, url, pdf_path) VALUES (NEXTVAL('seq_number'), ?, ?, ?, ?)"
-                conn.execute(query, (title, date, url, pdf_path))
-            logger.info(f"Record created: {title}, {date}, {url}, {pdf_path}")
-        except Exception as e:
-            logger.error(f"Error creating record: {e}")
+    def update_record(self, number, new_title=None, new_date=None, new_url=None, new_pdf_path=None):
+        self.update_columns(number, {'title': new_title, 'date': new_date, 'url': new_url, 'pdf_path': new_pdf_path})
 
-    def read_records(self):
-        try:
-            with duckdb.connect(self.database) as conn:
-                return conn.execute("SELECT * FROM PMO_speech_data").fetchall()
-        except Exception as e:
-            logger.error(f"Error reading records: {e}")
-            return []
+def download_pdf(url, filename):
+    try:
+        response = get_client().get(url, stream=True)
+        with open(filename, 'wb') as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        get_metrics().add_bytes(os.path.getsize(filename))
+        logger.debug(f"PDF downloaded successfully as {filename}.")
+    except requests.RequestException as e:
+        logger.error(f"Failed to download the PDF from {url}: {e}")
 
-    def update_record(self, number, new_title=None, new_date=None, new_url=None, new_pdf_path=None):
-        updates = []
-        parameters = []
-
-        if new_title:
-            updates.append("title = ?")
-            parameters.append(new_title)
-        if new_date:
-            updates.append("date = ?")
-            parameters.append(new_date)
-        if new_url:
-            updates.append("url = ?")
-            parameters.append(new_url)
-        if new_pdf_path:
-            updates.append("pdf_path = ?")
-            parameters.append(new_pdf_path)
-
-        if updates:
-            parameters.append(number)
-            query = f"UPDATE PMO_speech_data SET {', '.join(updates)} WHERE number = ?"
-            try:
-                with duckdb.connect(self.database) as conn:
-                    conn.execute(query, parameters)
-                logger.info(f"Record updated: {number}")
-            except Exception as e:
-                logger.error(f"Error updating record: {e}")
-
-    def delete_record(self, number):
-        try:
-            with duckdb.connect(self.database) as conn:
-                conn.execute("DELETE FROM PMO_speech_data WHERE number = ?", (number,))
-            logger.info(f"Record deleted: {number}")
-        except Exception as e:
-            logger.error(f"Error deleting record: {e}")
+def check_attachment_size(url, size, max_attachment_mb):
+    if max_attachment_mb and size > max_attachment_mb * 1024 * 1024:
+        raise AttachmentTooLarge(f"{url} is over {max_attachment_mb} MB")
 
-    def get_latest_records(self, limit=10):
+def read_attachment(response, url, max_attachment_mb=MAX_ATTACHMENT_MB):
+    # Streams a response body into a buffer, hashing it on the way, and gives
+    # up as soon as it is known to be too large: from Content-Length before
+    # anything is read, or once that much has been read. Returns (buffer,
+    # content_hash).
+    with response:
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit():
+            check_attachment_size(url, int(length), max_attachment_mb)
+        buffer = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_SIZE)
+        digest = hashlib.sha256()
         try:
-            with duckdb.connect(self.database) as conn:
-                query = "SELECT * FROM PMO_speech_data ORDER BY date DESC LIMIT ?"
-                return conn.execute(query, (limit,)).fetchall()
-        except Exception as e:
-            logger.error(f"Error getting latest records: {e}")
-            return []
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                buffer.write(chunk)
+                digest.update(chunk)
+                check_attachment_size(url, buffer.tell(), max_attachment_mb)
+        except BaseException:
+            buffer.close()
+            raise
+    get_metrics().add_bytes(buffer.tell())
+    buffer.seek(0)
+    return buffer, digest.hexdigest()
 
-    def is_link_in_database(self, url):
-        query = "SELECT 1 FROM PMO_speech_data WHERE url = ? LIMIT 1;"
-        try:
-            with duckdb.connect(self.database) as conn:
-                result = conn.execute(query, (url,)).fetchone()
-            return result is not None
-        except Exception as e:
-            logger.error(f"Error checking link in database: {e}")
-            return False
+def download_pdf_to_buffer(url, max_attachment_mb=MAX_ATTACHMENT_MB):
+    # Small attachments stay in memory, large ones spill to an anonymous
+    # temporary file; either way nothing is left behind in the working directory.
+    # Raises AttachmentTooLarge beyond max_attachment_mb.
+    try:
+        buffer, _ = read_attachment(get_client().get(url, stream=True), url, max_attachment_mb)
+        logger.debug(f"PDF downloaded successfully from {url}.")
+        return buffer
+    except requests.RequestException as e:
+        logger.error(f"Failed to download the PDF from {url}: {e}")
+        return None
 
-def download_pdf(url, filename):
+def cached_attachment(cache, url, max_attachment_mb=MAX_ATTACHMENT_MB):
+    cached = cache.open(url)
+    if cached is None:
+        return None
+    buffer = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_SIZE)
     try:
-        response = requests.get(url, stream=True, verify=False)
-        response.raise_for_status()
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-        logger.info(f"PDF downloaded successfully as {filename}.")
+        with cached:
+            for chunk in iter(lambda: cached.read(DOWNLOAD_CHUNK_SIZE), b''):
+                buffer.write(chunk)
+                check_attachment_size(url, buffer.tell(), max_attachment_mb)
+    except BaseException:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
+
+def download_attachment(url, cache=None, max_attachment_mb=MAX_ATTACHMENT_MB):
+    # Like download_pdf_to_buffer, but keeps a copy in the response cache and
+    # reads it back from there when the cache is offline, or when the server
+    # answers that the cached copy's ETag is still current.
+    if cache is None:
+        return download_pdf_to_buffer(url, max_attachment_mb)
+    if cache.offline:
+        buffer = cached_attachment(cache, url, max_attachment_mb)
+        if buffer is None:
+            logger.warning(f"Not in response cache: {url}")
+        return buffer
+    etag = cache.etag(url)
+    try:
+        response = get_client().get(url, headers={'If-None-Match': etag} if etag else None, stream=True)
+        if response.status_code == 304:
+            response.close()
+            buffer = cached_attachment(cache, url, max_attachment_mb)
+            if buffer is not None:
+                cache.touch(url)
+                logger.debug(f"Attachment unchanged, reusing the cached copy of {url}.")
+                return buffer
+            response = get_client().get(url, stream=True)
+        buffer, content_hash = read_attachment(response, url, max_attachment_mb)
     except requests.RequestException as e:
         logger.error(f"Failed to download the PDF from {url}: {e}")
+        return None
+    cache.put(url, buffer, content_hash, response.headers.get('ETag'))
+    buffer.seek(0)
+    return buffer
 
 def text_to_pdf(text, output_file):
     try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        latin_text = text.encode('latin-1', 'replace').decode('latin-1')
-        cell_width = 190
-        cell_height = 10
-        pdf.multi_cell(cell_width, cell_height, txt=latin_text, align='L')
-        pdf.output(output_file)
-        logger.info(f"Text saved to PDF as {output_file}.")
+        render_text_pdf(text, output_file)
+        logger.debug(f"Text saved to PDF as {output_file}.")
     except Exception as e:
         logger.error(f"Error converting text to PDF: {e}")
 
 def merge_pdfs(pdf_list, output):
     try:
-        pdf_writer = PdfWriter()
-        for pdf in pdf_list:
-            pdf_reader = PdfReader(pdf)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                pdf_writer.add_page(page)
-        with open(output, 'wb') as out:
-            pdf_writer.write(out)
-        logger.info(f"PDFs merged into {output}.")
+        write_merged_pdf(pdf_list, output)
+        logger.debug(f"PDFs merged into {output}.")
     except Exception as e:
         logger.error(f"Error merging PDFs: {e}")
 
@@ -158,7 +183,7 @@ def delete_pdf(*filenames):
     for filename in filenames:
         try:
             os.remove(filename)
-            logger.info(f"Deleted {filename}")
+            logger.debug(f"Deleted {filename}")
         except FileNotFoundError:
             logger.warning(f"{filename} not found")
         except Exception as e:
@@ -166,8 +191,7 @@ def delete_pdf(*filenames):
 
 def get_request_from_sublink(link):
     try:
-        response = requests.get(link, verify=False)
-        response.raise_for_status()
+        response = get_client().get(link)
         return response.text
     except requests.RequestException as e:
         logger.error(f"Error fetching content from {link}: {e}")
@@ -175,17 +199,20 @@ def get_request_from_sublink(link):
 
 def get_html(url):
     try:
-        response = requests.get(url, verify=False)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return soup.prettify()
+        response = get_client().get(url)
+        return response.text
     except requests.RequestException as e:
         logger.error(f"Error fetching HTML from {url}: {e}")
         return ""
 
+def parse_html(html, parse_only=None):
+    # bs4 is only needed when lxml is missing or reads a page differently.
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser', parse_only=parse_only)
+
 def count_tr_elements(html):
     try:
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = parse_html(html)
         td_elements = soup.findAll('tr')
         return len(td_elements) - 1
     except Exception as e:
@@ -194,7 +221,7 @@ def count_tr_elements(html):
 
 def get_n_tr_elements(html, n):
     try:
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = parse_html(html)
         td_elements = soup.findAll('tr')
         return td_elements[n]
     except IndexError:
@@ -215,69 +242,302 @@ def get_info_from_tr(tr_element):
         logger.error(f"Error extracting info from 'tr' element: {e}")
         return "", "", ""
 
-def get_info_from_sublink(link, title, date):
-    html = get_request_from_sublink(link)
-    if html:
-        soup = BeautifulSoup(html, 'html.parser')
-        content = soup.find(id='primary').main.article
-        if content:
-            entry_content_div = content.find('div', {'class': 'entry-content'})
-            content_text = ''
-            if entry_content_div:
-                tags_of_interest = ['p', 'ol', 'ul', 'li']
-                elements = entry_content_div.find_all(tags_of_interest)
-                content_text += f'Source: {link}\nTitle: {title}\nDate: {date}\n'
-                for element in elements:
-                    content_text += element.get_text(strip=True) + ' '
-
-            pdf_link = content.find('object', class_='wp-block-file__embed')
-            if pdf_link:
-                pdf_link = pdf_link['data']
-                title_part = title.split(':')[-1].strip()
-                max_length = 40
-                if len(title_part) > max_length:
-                    title_part = title_part[:max_length]
-                sanitized_title = title_part.replace('/', '-').replace('\\', '-')
-                filename = os.path.join(PDF_STORE_PATH, f"{date}_{sanitized_title}.pdf")
-                filenameTmp1 = f"tmp_{date}_{sanitized_title}.pdf"
-                filenameTmp2 = f"{date}_laterreplace.pdf"
-
-                download_pdf(pdf_link, filenameTmp1)
-                text_to_pdf(content_text, filenameTmp2)
-                merge_pdfs([filenameTmp1, filenameTmp2], filename)
-                delete_pdf(filenameTmp1, filenameTmp2)
-            else:
-                title_part = title.split(':')[-1].strip()
-                max_length = 40
-                if len(title_part) > max_length:
-                    title_part = title_part[:max_length]
-                sanitized_title = title_part.replace('/', '-').replace('\\', '-')
-                filename = os.path.join(PDF_STORE_PATH, f"{date}_{sanitized_title}.pdf")
-                text_to_pdf(content_text, filename)
-
-            return title, date, filename
-    return None
+def _row_from_lxml(tr_element):
+    td_elements = list(tr_element.iter('td'))
+    link_tag = td_elements[0].find('.//a') if td_elements else None
+    link = link_tag.get('href') if link_tag is not None else None
+    title = ''.join(td_elements[0].itertext()).strip() if td_elements else ''
+    date = ''.join(td_elements[1].itertext()).strip() if len(td_elements) > 1 else ''
+    return link, title, date
 
-if __name__ == "__main__":
-    pmodatabase = PMOSpeechData()
-    html = get_html('https://www.pmo.gov.my/speech/')
-    if html:
-        for i in range(1, count_tr_elements(html) + 1):
-            tr_element = get_n_tr_elements(html, i)
-            if tr_element:
-                link_url, title, date = get_info_from_tr(tr_element)
-                if link_url and not pmodatabase.is_link_in_database(link_url):
-                    try:
-                        date_obj = datetime.strptime(date, "%d %b %Y")
-                        formatted_date = date_obj.strftime("%Y-%m-%d")
-                        title, date, filename = get_info_from_sublink(link_url, title, date)
-                        if title and date and filename:
-                            pmodatabase.create_record(title, formatted_date, link_url, filename)
-                            logger.info(f"{date} - {title} - {link_url} saved in database.")
-                        else:
-                            logger.warning(f"Failed to process: {link_url}")
-                    except ValueError as e:
-                        logger.error(f"Date parsing error for {date}: {e}")
-                else:
-                    logger.info(f"{date} - {title} - {link_url} already in database.")
+def _row_from_bs4(tr_element):
+    td_elements = tr_element.find_all('td')
+    link_tag = td_elements[0].find('a') if td_elements else None
+    link = link_tag.get('href') if link_tag else None
+    title = td_elements[0].get_text().strip() if td_elements else ''
+    date = td_elements[1].get_text().strip() if len(td_elements) > 1 else ''
+    return link, title, date
+
+def _read_row(read, tr_element):
+    # A row that cannot be read comes out without a link, so that it is
+    # skipped on its own instead of ending the listing.
+    try:
+        return read(tr_element)
+    except Exception as e:
+        logger.error(f"Error extracting info from 'tr' element: {e}")
+        return None, '', ''
+
+def _iter_tr_lxml(html):
+    # Streams <tr> elements out of the document and frees each row once it has
+    # been read, so the listing never exists as a full tree in memory.
+    source = BytesIO(html.encode('utf-8') if isinstance(html, str) else html)
+    for _, tr_element in etree.iterparse(source, events=('end',), tag='tr', html=True, recover=True):
+        row = _read_row(_row_from_lxml, tr_element)
+        tr_element.clear()
+        while tr_element.getprevious() is not None:
+            del tr_element.getparent()[0]
+        yield row
+
+def _iter_tr_bs4(html):
+    soup = parse_html(html)
+    for tr_element in soup.find_all('tr'):
+        yield _read_row(_row_from_bs4, tr_element)
+
+def iter_speech_rows(html):
+    # Parses the listing once and yields (link, title, date) for every row
+    # after the header row, skipping rows without a link or a date cell.
+    rows = _iter_tr_lxml(html) if etree is not None else _iter_tr_bs4(html)
+    try:
+        next(rows, None)
+        for link, title, date in rows:
+            if not link or not date:
+                logger.error(f"Error extracting info from 'tr' element: missing link or date in row '{title}'")
+                continue
+            yield link, title, date
+    except Exception as e:
+        logger.error(f"Error iterating 'tr' elements: {e}")
+
+def speech_filename(title, date, pdf_store_path=PDF_STORE_PATH):
+    # None in text-only crawls, which have no PDF store.
+    if pdf_store_path is None:
+        return None
+    return os.path.join(pdf_store_path, f"{date}_{format_title(title)}.pdf")
+
+def fetch_speech_page(link, cache=None):
+    # Returns (html, content_hash); the hash is None when caching is off.
+    if cache is None:
+        return get_request_from_sublink(link), None
+    return cache.fetch_text(link, get_request_from_sublink)
+
+def speech_header(link, title, date):
+    return f'Source: {link}\nTitle: {title}\nDate: {date}\n'
+
+def _speech_from_soup(soup, link, title, date):
+    primary = soup.find(id='primary')
+    content = primary.main.article if primary and primary.main else None
+    if not content:
+        return None
+
+    entry_content_div = content.find('div', {'class': 'entry-content'})
+    content_text = ''
+    if entry_content_div:
+        content_text = speech_header(link, title, date) + soup_content_text(entry_content_div)
+    pdf_link = content.find('object', class_='wp-block-file__embed')
+    return content_text, pdf_link['data'] if pdf_link else None
+
+def _speech_from_tree(root, link, title, date):
+    # _speech_from_soup for an lxml tree.
+    primary = find_by_id(root, 'primary')
+    main = next(primary.iterdescendants('main'), None) if primary is not None else None
+    content = next(main.iterdescendants('article'), None) if main is not None else None
+    if content is None:
+        return None
+
+    entry_content_div = find_first(content, 'div', 'entry-content')
+    text = ''
+    if entry_content_div is not None:
+        text = speech_header(link, title, date) + content_text(entry_content_div)
+    pdf_link = find_first(content, 'object', 'wp-block-file__embed')
+    return text, pdf_link.attrib['data'] if pdf_link is not None else None
+
+def parse_speech(html, link, title, date, extractor=None):
+    # (content_text, attachment_url) of a speech page, or None if it has no
+    # article. The fast extractor parses with lxml, or only the #primary
+    # subtree with html.parser where lxml would read the page differently.
+    metrics = get_metrics()
+    parse_only = None
+    if (extractor or get_extractor()) == EXTRACTOR_FAST:
+        root = parse_tree(html)
+        if root is not None:
+            with metrics.timed("extract"):
+                return _speech_from_tree(root, link, title, date)
+        from bs4 import SoupStrainer
+        parse_only = SoupStrainer(id='primary')
+    with metrics.timed("parse"):
+        soup = parse_html(html, parse_only)
+    with metrics.timed("extract"):
+        return _speech_from_soup(soup, link, title, date)
+
+def extract_speech(link, title, date, pdf_store_path=PDF_STORE_PATH, html=None, cache=None,
+                   max_attachment_mb=MAX_ATTACHMENT_MB, attach=True):
+    # Network and parsing half of a speech: returns (content_text, filename,
+    # attachment), where attachment is a buffer holding the embedded PDF or
+    # None. A speech whose attachment is too large gets a PDF of its text.
+    # Without attach the attachment is not downloaded at all.
+    if html is None:
+        html = get_request_from_sublink(link)
+    if not html:
+        return None
+    parsed = parse_speech(html, link, title, date)
+    if parsed is None:
+        return None
+
+    content_text, attachment_url = parsed
+    filename = speech_filename(title, date, pdf_store_path)
+    attachment = None
+    # The attachment only goes into the PDF.
+    if attach and attachment_url is not None and filename is not None:
+        try:
+            attachment = download_attachment(attachment_url, cache, max_attachment_mb)
+        except AttachmentTooLarge as e:
+            logger.warning(f"Leaving the attachment out of {filename}: {e}")
+        else:
+            if attachment is None:
+                return None
+    return content_text, filename, attachment
+
+def check_extraction(cache, listing_url=SPEECH_LISTING_URL):
+    # Golden check over the saved speech pages: the fast extractor must give
+    # exactly the text and attachment the full soup gives. Returns the pages
+    # that differ.
+    html, _ = cache.read_text(listing_url)
+    checked = differ = 0
+    for link_url, title, date in iter_speech_rows(html) if html else []:
+        page, _ = cache.read_text(link_url)
+        if not page:
+            continue
+        checked += 1
+        if (parse_speech(page, link_url, title, date, EXTRACTOR_FAST)
+                != parse_speech(page, link_url, title, date, EXTRACTOR_SOUP)):
+            logger.error(f"Fast extraction differs from the full soup for {link_url}")
+            differ += 1
+    logger.info(f"Extraction check: {differ} of {checked} cached speeches differ.")
+    return differ
+
+class PMOSpeechSource(Source):
+    # Runner plugin: speeches in the listing table, with their attachments.
+    # With a cache the listing, pages and attachments are kept, and
+    # reparse_from_cache rebuilds every cached speech without any network
+    # I/O, refreshing existing records in place.
+    name = "pmospeech"
+    store_class = PMOSpeechData
+
+    def __init__(self, listing_url=SPEECH_LISTING_URL, pdf_store_path=PDF_STORE_PATH, db_path=None,
+                 max_attachment_mb=MAX_ATTACHMENT_MB, cache_dir=None, cache_max_mb=CACHE_MAX_MB,
+                 cache_max_age_days=CACHE_MAX_AGE_DAYS, reparse_from_cache=False):
+        self.listing_url = listing_url
+        self.pdf_store_path = pdf_store_path
+        self.db_path = db_path
+        self.max_attachment_mb = max_attachment_mb
+        self.cache_dir = cache_dir or (CACHE_STORE_PATH if reparse_from_cache else None)
+        self.cache_max_mb = cache_max_mb
+        self.cache_max_age_days = cache_max_age_days
+        self.reparse_from_cache = reparse_from_cache
+        self.cache = None
+
+    def start(self, store):
+        self.cache = open_cache(store.database, self.cache_dir, self.cache_max_mb, self.cache_max_age_days,
+                                offline=self.reparse_from_cache)
+
+    def discover(self):
+        if self.cache is not None:
+            html, _ = self.cache.fetch_text(self.listing_url, get_html)
+        else:
+            html = get_html(self.listing_url)
+        if html:
+            for link_url, title, date in iter_speech_rows(html):
+                yield Item(link_url, (title, date))
+
+    def refresh(self, item):
+        return self.reparse_from_cache
+
+    def extract(self, item):
+        title, date = item.context
+        try:
+            formatted_date = datetime.strptime(date, "%d %b %Y").strftime("%Y-%m-%d")
+        except ValueError as e:
+            logger.error(f"Date parsing error for {date}: {e}")
+            return None
+        page, content_hash = fetch_speech_page(item.url, self.cache)
+        filename = speech_filename(title, date, self.pdf_store_path)
+        # The attachment link is part of the page, so a new attachment URL
+        # changes the hash too.
+        unchanged = (not self.reparse_from_cache and self.cache is not None
+                     and self.cache.is_unchanged(item.url, content_hash, filename))
+        extracted = extract_speech(item.url, title, date, self.pdf_store_path, page, self.cache,
+                                   self.max_attachment_mb, attach=not unchanged)
+        if extracted is None:
+            return None
+        content_text, filename, attachment = extracted
+        pdf_path = filename if filename is not None else ""
+        if unchanged:
+            logger.debug(f"Content unchanged, keeping {filename}")
+            filename = None
+        return Extracted((title, formatted_date, item.url, pdf_path), filename, content_text, attachment, content_hash)
+
+    def committed(self, item, extracted):
+        if self.cache is not None:
+            self.cache.mark_rendered(item.url, extracted.content_hash)
+
+    def finish(self, store, failed):
+        if self.cache is not None:
+            self.cache.evict()
+
+def main(listing_url=SPEECH_LISTING_URL, db_path=None, batch_size=DEFAULT_BATCH_SIZE, dedup_mode=DEDUP_SET,
+         render_workers=DEFAULT_RENDER_WORKERS, pdf_store_path=PDF_STORE_PATH, cache_dir=None,
+         cache_max_mb=CACHE_MAX_MB, cache_max_age_days=CACHE_MAX_AGE_DAYS, reparse_from_cache=False,
+         max_attachment_mb=MAX_ATTACHMENT_MB, resume=False, retry_failed=False):
+    # One speech at a time, while the render workers each have up to two
+    # PDFs in hand.
+    runner = Runner(2 * render_workers + 1, 1, 0, render_workers, batch_size, dedup_mode, respect_robots=False)
+    source = PMOSpeechSource(listing_url, pdf_store_path, db_path, max_attachment_mb, cache_dir, cache_max_mb,
+                             cache_max_age_days, reparse_from_cache)
+    asyncio.run(runner.run([source], resume, retry_failed, include_failed=True))
     logger.info("PMOScrap - update done!")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape pmo.gov.my speeches into PDFs.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="records buffered before they are written to the database in one transaction")
+    parser.add_argument("--dedup-index", choices=DEDUP_MODES, default=DEDUP_SET,
+                        help="in-memory index of known URLs: an exact set, or a bloom filter with bounded memory")
+    parser.add_argument("--render-workers", type=int, default=DEFAULT_RENDER_WORKERS,
+                        help="worker processes that render and merge PDFs while scraping continues, 0 renders inline")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="HTTP connections kept alive per host")
+    parser.add_argument("--user-agent", default=DEFAULT_USER_AGENT, help="User-Agent header sent with every request")
+    parser.add_argument("--cache", dest="use_cache", action="store_true",
+                        help="keep compressed copies of fetched pages and attachments, skip rebuilding unchanged ones")
+    parser.add_argument("--cache-dir", default=CACHE_STORE_PATH, help="directory of the response cache")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_MB,
+                        help="evict the oldest cached responses beyond this size, 0 keeps everything")
+    parser.add_argument("--cache-max-age-days", type=float, default=CACHE_MAX_AGE_DAYS,
+                        help="evict cached responses older than this, 0 keeps everything")
+    parser.add_argument("--reparse-from-cache", action="store_true",
+                        help="rebuild PDFs and records from the response cache without any network access")
+    parser.add_argument("--no-pdf", dest="render_pdfs", action="store_false",
+                        help="only store records and their text, without rendering PDFs or downloading attachments")
+    parser.add_argument("--max-attachment-mb", type=float, default=MAX_ATTACHMENT_MB,
+                        help="leave larger attachments out of the speech PDFs, 0 takes attachments of any size")
+    parser.add_argument("--extractor", choices=EXTRACTORS, default=EXTRACTOR_FAST,
+                        help="read speech pages with lxml/a strained parse (fast) or a full BeautifulSoup tree (soup)")
+    parser.add_argument("--check-extraction", action="store_true",
+                        help="compare both extractors on every speech in the response cache and exit")
+    parser.add_argument("--frontier", action="store_true",
+                        help="ignored, kept for older scripts: every run now tracks its items in a persistent work queue")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the previous run from its work queue, skipping discovery if it had completed")
+    parser.add_argument("--retry-failed", action="store_true", help="only retry items that failed in earlier runs")
+    parser.add_argument("--metrics-out", help="write a run summary as JSON, or as a Prometheus textfile if it ends in .prom")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="profile the run with cProfile (cpu) or tracemalloc (memory)")
+    parser.add_argument("--profile-out", help="where to write the profile, by default in the working directory")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    configure_client(pool_size=args.pool_size, user_agent=args.user_agent)
+    use_extractor(args.extractor)
+    pdf_store_path = PDF_STORE_PATH if args.render_pdfs else None
+    render_workers = args.render_workers if args.render_pdfs else 0
+    cache_dir = args.cache_dir if args.use_cache or args.reparse_from_cache else None
+    if args.check_extraction:
+        cache = open_cache(PMOSpeechData(dedup_mode=None).database, args.cache_dir, offline=True)
+        sys.exit(1 if check_extraction(cache) else 0)
+    with profiled(args.profile, args.profile_out):
+        main(batch_size=args.batch_size, dedup_mode=args.dedup_index, render_workers=render_workers,
+             pdf_store_path=pdf_store_path, cache_dir=cache_dir, cache_max_mb=args.cache_max_mb, cache_max_age_days=args.cache_max_age_days,
+             reparse_from_cache=args.reparse_from_cache, max_attachment_mb=args.max_attachment_mb,
+             resume=args.resume, retry_failed=args.retry_failed)
+    if args.metrics_out:
+        write_metrics(args.metrics_out)
@@ -0,0 +1,341 @@
+import os
+import queue
+import shutil
+import asyncio
+import tempfile
+import logging
+import threading
+import itertools
+import multiprocessing
+from io import BytesIO
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import get_metrics, reset_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDER_WORKERS = 0  # 0 renders inline in the scraping loop
+COPY_CHUNK_SIZE = 1024 * 1024
+STARTXREF_TAIL = 2048  # bytes at the end of a PDF searched for its startxref
+INLINE_ATTACHMENT_SIZE = 4 * 1024 * 1024  # larger attachments reach render workers as a file, not bytes
+
+
+@contextmanager
+def atomic_output(output_file):
+    # Writes go to a temporary file next to the target, which replaces the
+    # target only once it is complete, so readers never see a partial PDF.
+    directory = os.path.dirname(output_file) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, partial_path = tempfile.mkstemp(prefix=".", suffix=".part", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            yield out
+        os.replace(partial_path, output_file)
+    except BaseException:
+        os.remove(partial_path)
+        raise
+
+
+def render_text_pdf_bytes(text):
+    # fpdf and PyPDF2 are imported on first use: crawls that render nothing
+    # never load them.
+    from fpdf import FPDF
+    with get_metrics().timed("render"):
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        latin_text = text.encode('latin-1', 'replace').decode('latin-1')
+        cell_width = 190
+        cell_height = 10
+        pdf.multi_cell(cell_width, cell_height, txt=latin_text, align='L')
+        # fpdf returns a latin-1 str, fpdf2 a bytearray.
+        output = pdf.output(dest='S')
+        return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+
+def render_text_pdf(text, output_file):
+    data = render_text_pdf_bytes(text)
+    with atomic_output(output_file) as out:
+        out.write(data)
+
+
+def write_merged_pdf(pdf_list, output):
+    # pdf_list may mix file paths and binary streams.
+    from PyPDF2 import PdfReader, PdfWriter
+    with get_metrics().timed("merge"):
+        pdf_writer = PdfWriter()
+        for pdf in pdf_list:
+            pdf_reader = PdfReader(pdf)
+            for page_num in range(len(pdf_reader.pages)):
+                page = pdf_reader.pages[page_num]
+                pdf_writer.add_page(page)
+        with atomic_output(output) as out:
+            pdf_writer.write(out)
+
+
+def _appendix_update(document, appendix):
+    # The incremental update that adds the pages of appendix (PDF bytes) at
+    # the end of document, a seekable binary stream: the appendix's pages and
+    # whatever they reference as new objects, a new version of the
+    # document's page tree root, and an xref section chained to the
+    # document's own. Only the trailer, catalog and page tree root of the
+    # document are parsed. Returns the bytes to write after the document.
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+    end = document.seek(0, os.SEEK_END)
+    document.seek(max(end - STARTXREF_TAIL, 0))
+    tail = document.read()
+    position = tail.rfind(b"startxref")
+    if position < 0:
+        raise ValueError("no startxref")
+    previous_xref = int(tail[position + len(b"startxref"):].split()[0])
+    document.seek(0)
+    reader = PdfReader(document)
+    if reader.is_encrypted:
+        raise ValueError("encrypted")
+    tree_ref = reader.trailer["/Root"].raw_get("/Pages")
+    if not isinstance(tree_ref, IndirectObject):
+        raise ValueError("page tree is not an indirect object")
+    tree = tree_ref.get_object()
+    # Trailers read from xref streams come without /Size.
+    size = max([reader.trailer.get("/Size", 0), *(number + 1 for entries in reader.xref.values() for number in entries),
+                *(number + 1 for number in reader.xref_objStm)])
+    numbers, pending, relocated = {}, [], set()
+
+    def relocate(obj):
+        # Renumbers the references of an appendix object in place, queueing
+        # every object they lead to.
+        nonlocal size
+        if isinstance(obj, IndirectObject):
+            if obj.idnum not in numbers:
+                numbers[obj.idnum] = size
+                size += 1
+                pending.append((numbers[obj.idnum], obj.get_object()))
+            return IndirectObject(numbers[obj.idnum], 0, None)
+        if isinstance(obj, (DictionaryObject, ArrayObject)) and id(obj) not in relocated:
+            relocated.add(id(obj))
+            for key, value in list(obj.items() if isinstance(obj, DictionaryObject) else enumerate(obj)):
+                obj[key] = relocate(value)
+        return obj
+
+    pages = PdfReader(BytesIO(appendix)).pages
+    refs = []
+    for page in pages:
+        numbers[page.indirect_reference.idnum] = size
+        refs.append(IndirectObject(size, 0, None))
+        size += 1
+    for page, ref in zip(pages, refs):
+        # Pages come with what they inherited from the appendix's page tree
+        # and are kept from inheriting anything from the document's.
+        del page["/Parent"]
+        relocate(page)
+        page[NameObject("/Parent")] = IndirectObject(tree_ref.idnum, tree_ref.generation, None)
+        page.setdefault(NameObject("/Rotate"), NumberObject(0))
+        if "/CropBox" not in page:
+            page[NameObject("/CropBox")] = page["/MediaBox"]
+        pending.append((ref.idnum, page))
+    tree[NameObject("/Kids")] = ArrayObject(list(tree["/Kids"]) + refs)
+    tree[NameObject("/Count")] = NumberObject(tree["/Count"] + len(refs))
+
+    out = BytesIO()
+    if not tail.endswith((b"\n", b"\r")):
+        out.write(b"\n")
+    offsets = {}
+
+    def write(number, generation, obj):
+        offsets[number] = (end + out.tell(), generation)
+        out.write(f"{number} {generation} obj\n".encode())
+        obj.write_to_stream(out, None)
+        out.write(b"\nendobj\n")
+
+    write(tree_ref.idnum, tree_ref.generation, tree)
+    while pending:
+        number, obj = pending.pop(0)
+        write(number, 0, relocate(obj))
+    xref = end + out.tell()
+    # The free head entry is not required in an update, but readers that
+    # take the first subsection for the start of the table expect it.
+    out.write(b"xref\n0 1\n0000000000 65535 f \n")
+    ordered = sorted(offsets)
+    for _, run in itertools.groupby(enumerate(ordered), lambda pair: pair[1] - pair[0]):
+        run = [number for _, number in run]
+        out.write(f"{run[0]} {len(run)}\n".encode())
+        for number in run:
+            offset, generation = offsets[number]
+            out.write(f"{offset:010d} {generation:05d} n \n".encode())
+    trailer = DictionaryObject({NameObject(key): reader.trailer.raw_get(key)
+                                for key in ("/Root", "/Info", "/ID") if key in reader.trailer})
+    trailer[NameObject("/Size")] = NumberObject(size)
+    trailer[NameObject("/Prev")] = NumberObject(previous_xref)
+    out.write(b"trailer\n")
+    trailer.write_to_stream(out, None)
+    out.write(f"\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def write_appended_pdf(document, appendix, output):
+    # Writes document (a path or binary stream) to output unchanged, followed
+    # by the pages of appendix (PDF bytes) as an incremental update, so the
+    # document is copied in chunks and never held in memory page by page.
+    # Documents that cannot be updated that way (encrypted, no readable
+    # trailer) are merged in full.
+    opened = isinstance(document, str)
+    source = open(document, 'rb') if opened else document
+    try:
+        with get_metrics().timed("merge"):
+            try:
+                update = _appendix_update(source, appendix)
+            except Exception as e:
+                logger.warning(f"Cannot append to the attachment of {output} incrementally, merging in full: {e}")
+                update = None
+            if update is not None:
+                source.seek(0)
+                with atomic_output(output) as out:
+                    shutil.copyfileobj(source, out, COPY_CHUNK_SIZE)
+                    out.write(update)
+                return
+        source.seek(0)
+        write_merged_pdf([source, BytesIO(appendix)], output)
+    finally:
+        if opened:
+            source.close()
+
+
+def build_pdf(content_text, filename, attachment=None):
+    # The text alone, or an attachment (path, stream or bytes) followed by the
+    # text as a cover page. Raises on failure; safe to run in a RenderPool
+    # worker.
+    if attachment is None:
+        render_text_pdf(content_text, filename)
+        return
+    if isinstance(attachment, (bytes, bytearray)):
+        attachment = BytesIO(attachment)
+    write_appended_pdf(attachment, render_text_pdf_bytes(content_text), filename)
+
+
+def build_spilled_pdf(content_text, filename, attachment_path):
+    # build_pdf for an attachment copied aside by render_job, removing the
+    # copy whether or not the PDF could be built.
+    try:
+        build_pdf(content_text, filename, attachment_path)
+    finally:
+        os.remove(attachment_path)
+
+
+def render_job(content_text, filename, attachment=None):
+    # (func, args) that builds a PDF in a RenderPool worker. Buffers cannot
+    # cross the process boundary: a small attachment is sent as bytes, a
+    # large one is copied next to the PDF and sent as a path, so neither
+    # process holds a large attachment in memory.
+    if not hasattr(attachment, 'read'):
+        return build_pdf, (content_text, filename, attachment)
+    attachment.seek(0)
+    if attachment.seek(0, os.SEEK_END) <= INLINE_ATTACHMENT_SIZE:
+        attachment.seek(0)
+        return build_pdf, (content_text, filename, attachment.read())
+    attachment.seek(0)
+    directory = os.path.dirname(filename) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=".", suffix=".part", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(attachment, out, COPY_CHUNK_SIZE)
+    except BaseException:
+        os.remove(path)
+        raise
+    return build_spilled_pdf, (content_text, filename, path)
+
+
+def measured_job(func, *args):
+    # Runs a RenderPool job and returns the stage timings it recorded, which
+    # would otherwise stay in the worker process.
+    metrics = reset_metrics()
+    func(*args)
+    return metrics.snapshot()
+
+
+def format_title(title):
+    # Last part of a "Section: Title" heading, trimmed and safe as a filename.
+    try:
+        title_part = title.split(':')[-1].strip()
+        max_length = 40
+        if len(title_part) > max_length:
+            title_part = title_part[:max_length]
+        return title_part.replace('/', '-').replace('\\', '-')
+    except Exception as e:
+        logger.error(f"Error formatting title: {e}")
+        return "untitled"
+
+
+class RenderPool:
+    # Runs PDF jobs in worker processes. submit() blocks once max_pending jobs
+    # are queued, and results are handed back to the scraping thread through
+    # collect(), so records are only committed by the thread that owns the
+    # database and only after their PDF exists.
+    def __init__(self, workers, max_pending=None):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 2
+        # Spawned rather than forked: the parent holds DuckDB connections and
+        # worker threads that must not be duplicated into the children.
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._async_slots = None
+        self._completed = queue.Queue()
+        self._outstanding = 0
+        self.rendered = 0
+        self.failed = 0
+
+    def submit(self, func, args, on_success=None, label=None):
+        self._slots.acquire()
+        self._outstanding += 1
+        future = self._executor.submit(measured_job, func, *args)
+        future.add_done_callback(partial(self._done, label or repr(args[-1]), on_success))
+
+    def _done(self, label, on_success, future):
+        if future.exception() is None:
+            get_metrics().merge(future.result())
+        self._slots.release()
+        self._completed.put((label, on_success, future.exception()))
+
+    def collect(self, wait=False):
+        while self._outstanding:
+            try:
+                label, on_success, error = self._completed.get(block=wait)
+            except queue.Empty:
+                return
+            self._outstanding -= 1
+            if error is not None:
+                self.failed += 1
+                get_metrics().error("render")
+                get_metrics().item_failed()
+                logger.error(f"Error rendering {label}: {error}")
+            else:
+                self.rendered += 1
+                if on_success is not None:
+                    on_success()
+
+    async def render(self, func, *args):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_pending)
+        async with self._async_slots:
+            try:
+                snapshot = await asyncio.wrap_future(self._executor.submit(measured_job, func, *args))
+            except Exception:
+                self.failed += 1
+                get_metrics().error("render")
+                raise
+            get_metrics().merge(snapshot)
+            self.rendered += 1
+
+    def close(self):
+        self.collect(wait=True)
+        self._executor.shutdown()
+        logger.info(f"Render pool done: {self.rendered} rendered, {self.failed} failed.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
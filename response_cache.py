@@ -0,0 +1,250 @@
+import io
+import os
+import gzip
+import hashlib
+import logging
+import tempfile
+
+from store import get_connection, connection_lock
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_MB = 0  # 0 disables size-based eviction
+CACHE_MAX_AGE_DAYS = 0  # 0 disables age-based eviction
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class ResponseCache:
+    # Response bodies are stored gzip-compressed under their SHA-256, so a body
+    # seen under several URLs or on several runs is kept once. The url -> hash
+    # mapping lives in DuckDB next to the scraped records, together with the
+    # hash the PDF was last rendered from and the ETag the body was served
+    # with. In offline mode nothing is fetched and bodies are only read back
+    # from the cache.
+    def __init__(self, database, directory, max_mb=CACHE_MAX_MB, max_age_days=CACHE_MAX_AGE_DAYS, offline=False):
+        self.database = database
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age_days = max_age_days
+        self.offline = offline
+        os.makedirs(directory, exist_ok=True)
+        self._initialize_db()
+
+    def _initialize_db(self):
+        try:
+            with connection_lock(self.database):
+                get_connection(self.database).execute("""
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        url VARCHAR PRIMARY KEY,
+                        content_hash VARCHAR NOT NULL,
+                        size BIGINT NOT NULL,
+                        stored_size BIGINT NOT NULL,
+                        fetched_at TIMESTAMP NOT NULL,
+                        rendered_hash VARCHAR,
+                        etag VARCHAR
+                    );
+                """)
+        except Exception as e:
+            logger.error(f"Error initializing response cache: {e}")
+
+    def _path(self, content_hash):
+        return os.path.join(self.directory, content_hash[:2], f"{content_hash}.gz")
+
+    def _store_body(self, source):
+        # Hashes and compresses in one pass, then moves the blob into place
+        # under its hash unless an identical body is already stored.
+        digest = hashlib.sha256()
+        size = 0
+        fd, partial_path = tempfile.mkstemp(prefix=".", suffix=".part", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as out:
+                for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+            content_hash = digest.hexdigest()
+            path = self._path(content_hash)
+            if os.path.exists(path):
+                os.remove(partial_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(partial_path, path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        return content_hash, size, os.path.getsize(path)
+
+    def put(self, url, body, content_hash=None, etag=None):
+        # body is bytes or a binary file object read from its current position.
+        # A content_hash computed while downloading saves storing a body the
+        # URL already has again. Returns the content hash, or None if the body
+        # could not be cached.
+        source = io.BytesIO(body) if isinstance(body, (bytes, bytearray)) else body
+        try:
+            row = self.lookup(url) if content_hash else None
+            if row is not None and row[0] == content_hash and os.path.exists(self._path(content_hash)):
+                self.touch(url, etag)
+                return content_hash
+            content_hash, size, stored_size = self._store_body(source)
+            with connection_lock(self.database):
+                get_connection(self.database).execute("""
+                    INSERT INTO response_cache (url, content_hash, size, stored_size, fetched_at, etag)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+                    ON CONFLICT (url) DO UPDATE SET content_hash = excluded.content_hash, size = excluded.size,
+                        stored_size = excluded.stored_size, fetched_at = excluded.fetched_at, etag = excluded.etag
+                """, (url, content_hash, size, stored_size, etag))
+            return content_hash
+        except Exception as e:
+            logger.error(f"Error caching response for {url}: {e}")
+            return None
+
+    def lookup(self, url):
+        # (content_hash, rendered_hash) for a cached URL, or None.
+        try:
+            with connection_lock(self.database):
+                return get_connection(self.database).execute(
+                    "SELECT content_hash, rendered_hash FROM response_cache WHERE url = ?", (url,)
+                ).fetchone()
+        except Exception as e:
+            logger.error(f"Error reading response cache for {url}: {e}")
+            return None
+
+    def etag(self, url):
+        # ETag of the cached body of url, to revalidate it with If-None-Match.
+        try:
+            with connection_lock(self.database):
+                row = get_connection(self.database).execute(
+                    "SELECT etag FROM response_cache WHERE url = ?", (url,)
+                ).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error reading response cache for {url}: {e}")
+            return None
+
+    def touch(self, url, etag=None):
+        # The cached body of url is still current: it counts as fetched now.
+        try:
+            with connection_lock(self.database):
+                get_connection(self.database).execute(
+                    "UPDATE response_cache SET fetched_at = CURRENT_TIMESTAMP, etag = coalesce(?, etag) WHERE url = ?",
+                    (etag, url),
+                )
+        except Exception as e:
+            logger.error(f"Error refreshing cached response for {url}: {e}")
+
+    def open(self, url):
+        row = self.lookup(url)
+        if row is None:
+            return None
+        try:
+            return gzip.open(self._path(row[0]), 'rb')
+        except OSError as e:
+            logger.error(f"Error opening cached response for {url}: {e}")
+            return None
+
+    def get(self, url):
+        cached = self.open(url)
+        if cached is None:
+            return None
+        try:
+            with cached:
+                return cached.read()
+        except OSError as e:
+            logger.error(f"Error reading cached response for {url}: {e}")
+            return None
+
+    def read_text(self, url):
+        # (text, content_hash) of a cached URL, or ("", None) on a miss.
+        row = self.lookup(url)
+        body = self.get(url) if row else None
+        if body is None:
+            return "", None
+        return body.decode('utf-8'), row[0]
+
+    def fetch_text(self, url, fetch):
+        # Fetches with fetch(url) and caches the text, or only reads the cache
+        # when offline. Returns (text, content_hash).
+        if self.offline:
+            text, content_hash = self.read_text(url)
+            if not text:
+                logger.warning(f"Not in response cache: {url}")
+            return text, content_hash
+        text = fetch(url)
+        if not text:
+            return text, None
+        return text, self.put(url, text.encode('utf-8'))
+
+    def is_rendered(self, url, content_hash):
+        row = self.lookup(url) if content_hash else None
+        return row is not None and row[1] == content_hash
+
+    def is_unchanged(self, url, content_hash, filename):
+        # Same body as the one the existing file was built from.
+        return filename is not None and self.is_rendered(url, content_hash) and os.path.exists(filename)
+
+    def mark_rendered(self, url, content_hash):
+        if not content_hash:
+            return
+        try:
+            with connection_lock(self.database):
+                get_connection(self.database).execute(
+                    "UPDATE response_cache SET rendered_hash = ? WHERE url = ?", (content_hash, url)
+                )
+        except Exception as e:
+            logger.error(f"Error marking {url} as rendered: {e}")
+
+    def urls(self, prefix=""):
+        try:
+            with connection_lock(self.database):
+                rows = get_connection(self.database).execute(
+                    "SELECT url FROM response_cache WHERE starts_with(url, ?) ORDER BY url", (prefix,)
+                ).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            logger.error(f"Error listing response cache: {e}")
+            return []
+
+    def evict(self):
+        # Drops entries older than max_age_days, then the least recently
+        # fetched ones until the stored size fits max_bytes, and finally every
+        # blob no entry points to any more.
+        try:
+            with connection_lock(self.database):
+                conn = get_connection(self.database)
+                if self.max_age_days:
+                    conn.execute(
+                        "DELETE FROM response_cache WHERE fetched_at < CURRENT_TIMESTAMP - to_seconds(?)",
+                        (float(self.max_age_days) * 86400,),
+                    )
+                if self.max_bytes:
+                    conn.execute("""
+                        DELETE FROM response_cache WHERE url IN (
+                            SELECT url FROM (
+                                SELECT url, SUM(stored_size) OVER (ORDER BY fetched_at DESC, url) AS running_size
+                                FROM response_cache
+                            ) WHERE running_size > ?
+                        )
+                    """, (self.max_bytes,))
+                referenced = {row[0] for row in conn.execute("SELECT DISTINCT content_hash FROM response_cache").fetchall()}
+        except Exception as e:
+            logger.error(f"Error evicting response cache entries: {e}")
+            return
+        removed = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".gz") and name[:-len(".gz")] not in referenced:
+                    try:
+                        os.remove(os.path.join(root, name))
+                        removed += 1
+                    except OSError as e:
+                        logger.error(f"Error removing cached body {name}: {e}")
+        if removed:
+            logger.info(f"Evicted {removed} cached bodies from {self.directory}.")
+
+
+def open_cache(database, directory=None, max_mb=CACHE_MAX_MB, max_age_days=CACHE_MAX_AGE_DAYS, offline=False):
+    # A cache next to the records in database, or None without a directory.
+    if not directory:
+        return None
+    return ResponseCache(database, directory, max_mb, max_age_days, offline)
@@ -0,0 +1,385 @@
+import time
+import asyncio
+import logging
+import argparse
+import importlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from store import DEFAULT_BATCH_SIZE
+from frontier import Frontier, RUNNABLE_STATES, STATE_FAILED, STATE_COMMITTED
+from render import RenderPool, build_pdf, render_job, DEFAULT_RENDER_WORKERS
+from dedup import DEDUP_SET, DEDUP_MODES
+from http_client import (HostLimiter, configure_client, log_request_stats, DEFAULT_POOL_SIZE, DEFAULT_USER_AGENT,
+                         MAX_CONCURRENCY_PER_HOST, RATE_LIMIT_PER_HOST, MAX_REQUEUES)
+from metrics import get_metrics, log_metrics, write_metrics, profiled, PROFILE_MODES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 16  # items in flight across all sources
+DISCOVERY_CHUNK_SIZE = 1000  # discovered items written to the frontier at a time
+
+# Registered sources as "module:class", imported only when selected.
+SOURCES = {
+    "sebenarnyamy": "sebenarnyamy:SebenarnyaMYSource",
+    "pmospeech": "pmospeech:PMOSpeechSource",
+}
+
+# A unit of work found by discover(); context is whatever extract() needs
+# besides the URL (a lastmod, a listing row, ...).
+Item = namedtuple("Item", ["url", "context"])
+
+# What extract() hands back: the record row in the store's column order, the
+# PDF to build (None if there is nothing to render), its text, an optional
+# attachment (bytes or a binary file) placed in front of the text, and the
+# hash of the cached body it came from, if any.
+Extracted = namedtuple("Extracted", ["row", "filename", "content_text", "attachment", "content_hash"],
+                       defaults=(None,))
+
+
+class Source:
+    # A scraping source plugin. Subclasses name their store, discover items
+    # and extract them; the runner owns dedup, concurrency, rendering,
+    # persistence and metrics. discover() and extract() run in worker threads
+    # and may block on the network. The remaining hooks are optional and run
+    # on the event loop thread, except that refresh() is also asked during
+    # discovery.
+    name = None
+    store_class = None
+    db_path = None
+
+    def open_store(self, batch_size=DEFAULT_BATCH_SIZE, dedup_mode=DEDUP_SET):
+        # Without a db_path the store opens its default database.
+        if self.db_path:
+            return self.store_class(self.db_path, batch_size, dedup_mode)
+        return self.store_class(batch_size=batch_size, dedup_mode=dedup_mode)
+
+    def start(self, store):
+        # Called with the open store before discovery.
+        pass
+
+    def discover(self):
+        # Yields Item(url, context).
+        raise NotImplementedError
+
+    def refresh(self, item):
+        # Asked for items already in the store: True if the item has to be
+        # extracted again and its record refreshed.
+        return False
+
+    def extract(self, item):
+        # Returns Extracted(row, filename, content_text, attachment[, content_hash]), or None.
+        raise NotImplementedError
+
+    def committed(self, item, extracted):
+        # Called once the item's record is in the store's batch.
+        pass
+
+    def finish(self, store, failed):
+        # Called once every record of the run is flushed; failed holds the
+        # URLs of the items that are failed in the frontier.
+        pass
+
+
+def load_source(name, **options):
+    module_name, class_name = SOURCES[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)(**options)
+
+
+class SourceStats:
+    def __init__(self, name):
+        self.name = name
+        self.discovered = 0
+        self.skipped = 0
+        self.recovered = 0
+        self.requeued = 0
+        self.saved = 0
+        self.failed = 0
+        self.extract_seconds = 0.0
+        self.render_seconds = 0.0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def summary(self):
+        return (
+            f"{self.name}: {self.discovered} newly discovered, {self.skipped} already known, "
+            f"{self.recovered} recovered, {self.requeued} requeued, {self.saved} saved, {self.failed} failed "
+            f"in {self.elapsed:.1f}s "
+            f"(extract {self.extract_seconds:.1f}s, render {self.render_seconds:.1f}s summed over items)"
+        )
+
+
+class Runner:
+    # Runs any number of sources in one event loop. `concurrency` bounds the
+    # items in flight across all of them, and the per-host limits still apply
+    # on top, so sources on different hosts share the budget fairly. Work goes
+    # through each source's persistent Frontier, so an interrupted run can be
+    # resumed and failed items retried. An item whose extraction failed on an
+    # overloaded or unreachable host is requeued rather than failed.
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, max_concurrency_per_host=MAX_CONCURRENCY_PER_HOST,
+                 rate_limit=RATE_LIMIT_PER_HOST, render_workers=DEFAULT_RENDER_WORKERS,
+                 batch_size=DEFAULT_BATCH_SIZE, dedup_mode=DEDUP_SET, respect_robots=True):
+        self.concurrency = concurrency
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.rate_limit = rate_limit
+        self.render_workers = render_workers
+        self.batch_size = batch_size
+        self.dedup_mode = dedup_mode
+        self.respect_robots = respect_robots
+
+    async def run(self, sources, resume=False, retry_failed=False, include_failed=False):
+        # extract() blocks, so every in-flight item needs its own thread.
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency + 4))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._limiter = HostLimiter(self.max_concurrency_per_host, self.rate_limit, respect_robots=self.respect_robots)
+        render_pool = RenderPool(self.render_workers) if self.render_workers > 0 else None
+        try:
+            stats = await asyncio.gather(*(
+                self.run_source(source, render_pool, resume, retry_failed, include_failed) for source in sources
+            ))
+        finally:
+            if render_pool is not None:
+                render_pool.close()
+        for source_stats in stats:
+            logger.info(source_stats.summary())
+        log_request_stats(self._limiter)
+        log_metrics()
+        return stats
+
+    async def run_source(self, source, render_pool=None, resume=False, retry_failed=False, include_failed=False):
+        # A normal run discovers again, so new URLs are picked up, and then
+        # works through everything not yet committed, and with include_failed
+        # also through the items that failed before. resume skips discovery
+        # if the last one completed; retry_failed only works on failed items.
+        stats = SourceStats(source.name)
+        store = source.open_store(self.batch_size, self.dedup_mode)
+        frontier = Frontier(store.database, source.name)
+        source.start(store)
+        with store.batch():
+            states = RUNNABLE_STATES + (STATE_FAILED,) if include_failed else RUNNABLE_STATES
+            if retry_failed:
+                states = (STATE_FAILED,)
+            elif resume and frontier.discovery_complete():
+                logger.info(f"{source.name}: resuming without discovery.")
+            else:
+                stats.discovered = await asyncio.to_thread(self.discover, source, store, frontier)
+
+            self.recover(store, frontier, stats)
+            items = [Item(url, context) for url, context, _ in frontier.items(states)]
+            await self.process_items(source, store, frontier, items, stats, render_pool)
+            source.finish(store, {url for url, _, _ in frontier.items((STATE_FAILED,))})
+            logger.info(f"{source.name}: {frontier.counts()}.")
+        stats.elapsed = time.perf_counter() - stats.started
+        return stats
+
+    def recover(self, store, frontier, stats):
+        # Rendered but not committed when the last run stopped: the PDF
+        # exists, only the record and its text are missing or, for a
+        # refreshed item, out of date. Items rendered before the frontier
+        # kept their text are done again instead.
+        recovered, restarted = [], []
+        for url, record, text in frontier.rendered_items():
+            if text is None:
+                restarted.append(url)
+                continue
+            if store.is_link_in_database(url):
+                store.refresh_record(*record, text=text)
+            else:
+                store.create_record(*record, text=text)
+            stats.recovered += 1
+            recovered.append(url)
+        frontier.requeue(restarted)
+        self.commit(store, frontier, recovered)
+
+    async def process_items(self, source, store, frontier, items, stats, render_pool=None):
+        # Processes the items that are in the frontier and either not yet in
+        # the store or to be refreshed there.
+        todo, refreshed, known = [], set(), []
+        for item in items:
+            if not store.is_link_in_database(item.url):
+                todo.append(item)
+            elif source.refresh(item):
+                todo.append(item)
+                refreshed.add(item.url)
+            else:
+                known.append(item)
+        stats.skipped += len(known)
+        frontier.mark_committed([item.url for item in known])
+        logger.info(f"{source.name}: {len(todo)} items to process.")
+
+        uncommitted = []
+        await asyncio.gather(*(
+            self.process(source, store, frontier, item, stats, uncommitted, render_pool, item.url in refreshed)
+            for item in todo
+        ))
+        self.commit(store, frontier, uncommitted)
+
+    def discover(self, source, store, frontier):
+        # Runs in a worker thread; items are written to the frontier as they
+        # are found, so a crash during discovery keeps what was found so far.
+        # Known items the source wants refreshed are queued again even if
+        # they were committed.
+        frontier.start_discovery()
+        added = 0
+        chunk = []
+        for item in source.discover():
+            chunk.append(item)
+            if len(chunk) >= DISCOVERY_CHUNK_SIZE:
+                added += self.add_items(source, store, frontier, chunk)
+                chunk = []
+        added += self.add_items(source, store, frontier, chunk)
+        frontier.finish_discovery()
+        return added
+
+    def add_items(self, source, store, frontier, items):
+        # Committed items whose records are gone are queued again, and so
+        # are known items the source wants refreshed.
+        added = frontier.add_items(items)
+        known = {item.url for item in items if store.is_link_in_database(item.url)}
+        frontier.requeue([item.url for item in items if item.url not in known], (STATE_COMMITTED,))
+        frontier.requeue([item.url for item in items if item.url in known and source.refresh(item)])
+        return added
+
+    def commit(self, store, frontier, urls):
+        # Items are committed only once their records are in the database.
+        if urls and store.flush():
+            frontier.mark_committed(list(urls))
+        urls.clear()
+
+    async def extract(self, source, item, stats):
+        # Returns (extracted, error, retry); retry is True if nothing was
+        # extracted and a request on the way failed in a way worth retrying.
+        async with self._limiter.slot(item.url) as slot:
+            start = time.perf_counter()
+            error = "nothing extracted"
+            try:
+                extracted = await asyncio.to_thread(source.extract, item)
+            except Exception as e:
+                logger.error(f"Error extracting {item.url}: {e}")
+                extracted, error = None, e
+            stats.extract_seconds += time.perf_counter() - start
+        return extracted, error, extracted is None and slot.failures > 0
+
+    async def process(self, source, store, frontier, item, stats, uncommitted, render_pool=None, refresh=False):
+        for attempt in range(MAX_REQUEUES + 1):
+            if attempt:
+                # Waiting does not hold one of the run's slots.
+                delay = self._limiter.retry_delay(item.url, attempt - 1)
+                logger.warning(f"Requeueing {item.url} in {delay:.1f}s ({attempt}/{MAX_REQUEUES})")
+                stats.requeued += 1
+                await asyncio.sleep(delay)
+            async with self._slots:
+                extracted, error, retry = await self.extract(source, item, stats)
+                if retry and attempt < MAX_REQUEUES:
+                    continue
+                if extracted is None:
+                    logger.warning(f"Failed to process: {item.url}")
+                    frontier.mark_failed(item.url, error)
+                    get_metrics().item_failed()
+                    stats.failed += 1
+                    return
+                frontier.mark_fetched(item.url)
+
+                start = time.perf_counter()
+                try:
+                    await self.render(extracted, render_pool)
+                except Exception as e:
+                    logger.error(f"Error building PDF {extracted.filename}: {e}")
+                    frontier.mark_failed(item.url, e, count_attempt=False)
+                    get_metrics().item_failed()
+                    stats.failed += 1
+                    return
+                finally:
+                    stats.render_seconds += time.perf_counter() - start
+                frontier.mark_rendered(item.url, extracted.row, extracted.content_text)
+                break
+        # Only the event loop thread writes to the store, and only once the PDF exists.
+        if refresh:
+            store.refresh_record(*extracted.row, text=extracted.content_text)
+        else:
+            store.create_record(*extracted.row, text=extracted.content_text)
+        source.committed(item, extracted)
+        stats.saved += 1
+        uncommitted.append(item.url)
+        if len(uncommitted) >= self.batch_size:
+            self.commit(store, frontier, uncommitted)
+
+    async def render(self, extracted, render_pool=None):
+        # Sources without a PDF store, or whose PDF is still current, extract
+        # no filename: nothing to render.
+        attachment = extracted.attachment
+        try:
+            if extracted.filename is None:
+                return
+            if render_pool is None:
+                await asyncio.to_thread(build_pdf, extracted.content_text, extracted.filename, attachment)
+                return
+            func, args = await asyncio.to_thread(render_job, extracted.content_text, extracted.filename, attachment)
+            await render_pool.render(func, *args)
+        finally:
+            if hasattr(extracted.attachment, 'close'):
+                extracted.attachment.close()
+
+
+def find_new_items(source, dedup_mode=DEDUP_SET):
+    # Discovery and dedup only: (items discovered, those not yet in the
+    # source's database), without fetching or rendering any of them.
+    store = source.open_store(dedup_mode=dedup_mode)
+    discovered, new = 0, []
+    for item in source.discover():
+        discovered += 1
+        if not store.is_link_in_database(item.url):
+            new.append(item)
+    return discovered, new
+
+
+def add_arguments(parser):
+    parser.add_argument("sources", nargs="+", choices=sorted(SOURCES), help="sources to scrape")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="items in flight across all sources")
+    parser.add_argument("--per-host", type=int, default=MAX_CONCURRENCY_PER_HOST,
+                        help="most in-flight items per host; the actual number adapts to how the host responds")
+    parser.add_argument("--rate-limit", type=float, default=RATE_LIMIT_PER_HOST,
+                        help="max items started per second per host, 0 to disable")
+    parser.add_argument("--ignore-robots", dest="respect_robots", action="store_false",
+                        help="do not slow down to the crawl-delay of robots.txt")
+    parser.add_argument("--render-workers", type=int, default=DEFAULT_RENDER_WORKERS,
+                        help="worker processes shared by all sources for rendering PDFs, 0 renders in threads")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="records buffered before they are written to the database in one transaction")
+    parser.add_argument("--dedup-index", choices=DEDUP_MODES, default=DEDUP_SET,
+                        help="in-memory index of known URLs: an exact set, or a bloom filter with bounded memory")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE, help="HTTP connections kept alive per host")
+    parser.add_argument("--user-agent", default=DEFAULT_USER_AGENT, help="User-Agent header sent with every request")
+    parser.add_argument("--no-pdf", dest="render_pdfs", action="store_false",
+                        help="only store records and their text, without rendering PDFs")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the previous run from the frontier, skipping discovery if it had completed")
+    parser.add_argument("--retry-failed", action="store_true", help="only retry items that failed in earlier runs")
+    parser.add_argument("--metrics-out", help="write a run summary as JSON, or as a Prometheus textfile if it ends in .prom")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="profile the run with cProfile (cpu) or tracemalloc (memory)")
+    parser.add_argument("--profile-out", help="where to write the profile, by default in the working directory")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape several sources in one process.")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(args):
+    configure_client(pool_size=max(args.pool_size, args.per_host), user_agent=args.user_agent)
+    runner = Runner(args.concurrency, args.per_host, args.rate_limit, args.render_workers if args.render_pdfs else 0,
+                    args.batch_size, args.dedup_index, args.respect_robots)
+    options = {} if args.render_pdfs else {"pdf_store_path": None}
+    with profiled(args.profile, args.profile_out):
+        asyncio.run(runner.run([load_source(name, **options) for name in args.sources], args.resume,
+                               args.retry_failed))
+    if args.metrics_out:
+        write_metrics(args.metrics_out)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(parse_args())
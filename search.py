@@ -0,0 +1,193 @@
+import re
+import logging
+import argparse
+
+from store import get_connection, connection_lock
+from runner import SOURCES, load_source
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+SNIPPET_CHARS = 160  # characters of text shown around the first match
+SNIPPET_LEAD = 40  # of which before the match
+# Snowball has no Malay stemmer; Indonesian is the closest.
+FTS_STEMMER = "indonesian"
+# Words are runs of letters and digits, in SQL and in queries alike.
+WORD_SEPARATOR = r"[^\p{L}\p{N}]+"
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+_fts_loaded = {}
+_fts_installed = None  # None until INSTALL fts has been tried in this process
+
+
+def query_words(query):
+    return WORD_PATTERN.findall(query.lower())
+
+
+def load_fts(database):
+    # True if DuckDB's full-text search extension is usable on this database.
+    # The extension is loaded per database, but downloaded (INSTALL, which
+    # needs the network) at most once per process.
+    global _fts_installed
+    if database not in _fts_loaded:
+        connection = get_connection(database)
+        try:
+            with connection_lock(database):
+                try:
+                    connection.execute("LOAD fts")
+                except Exception:
+                    if _fts_installed is None:
+                        _fts_installed = False
+                        connection.execute("INSTALL fts")
+                        _fts_installed = True
+                    if not _fts_installed:
+                        raise
+                    connection.execute("LOAD fts")
+            _fts_loaded[database] = True
+        except Exception as e:
+            logger.warning(f"DuckDB full-text search is unavailable for {database}, so matches are whole words "
+                           f"ranked by how often they occur instead of by BM25: {str(e).splitlines()[0]}")
+            _fts_loaded[database] = False
+    return _fts_loaded[database]
+
+
+class TextSearch:
+    # Ranked search over one source's extracted text. With the fts extension
+    # matches are ranked by BM25 over a stemmed index, rebuilt whenever the
+    # text changed since it was built; without it every word of the query has
+    # to occur in the text as a whole word and matches are ranked by how
+    # often they occur.
+    def __init__(self, store, source):
+        self.store = store
+        self.source = source
+        self.use_fts = load_fts(store.database)
+        self._initialize_db()
+
+    def _initialize_db(self):
+        try:
+            self.store.execute("""
+                CREATE TABLE IF NOT EXISTS search_index (
+                    text_table VARCHAR PRIMARY KEY,
+                    documents INTEGER NOT NULL,
+                    indexed_through TIMESTAMP
+                )
+            """)
+        except Exception as e:
+            logger.error(f"Error initializing search index state: {e}")
+
+    def _text_state(self):
+        return self.store.fetchone(f"SELECT COUNT(*), MAX(updated_at) FROM {self.store.text_table}")
+
+    def index_is_current(self):
+        row = self.store.fetchone(
+            "SELECT documents, indexed_through FROM search_index WHERE text_table = ?", (self.store.text_table,)
+        )
+        return row is not None and row == self._text_state()
+
+    def build_index(self):
+        # The fts index is a snapshot of the table, so it is rebuilt in full.
+        if not self.use_fts:
+            return
+        documents, indexed_through = self._text_state()
+        try:
+            self.store.execute(
+                f"PRAGMA create_fts_index('{self.store.text_table}', 'url', 'text', stemmer = '{FTS_STEMMER}', "
+                "stopwords = 'none', overwrite = 1)"
+            )
+            self.store.execute(
+                "INSERT OR REPLACE INTO search_index VALUES (?, ?, ?)",
+                (self.store.text_table, documents, indexed_through),
+            )
+            logger.info(f"Search index of {self.source} built over {documents} texts.")
+        except Exception as e:
+            logger.error(f"Error building search index of {self.source}: {e}")
+            self.use_fts = False
+
+    def _snippet(self, word):
+        # (sql, parameters) of the text around the first whole-word occurrence
+        # of word in t.text.
+        before = f"(?s)^(.*?)(?:{WORD_SEPARATOR}|^){word}(?:{WORD_SEPARATOR}|$)"
+        sql = (f"substr(t.text, greatest(1, length(regexp_extract(lower(t.text), ?, 1)) - {SNIPPET_LEAD}), "
+               f"{SNIPPET_CHARS})")
+        return sql, [before]
+
+    def _fts_query(self, query, limit):
+        snippet, snippet_parameters = self._snippet(query_words(query)[0])
+        sql = f"""
+            SELECT score, ?::VARCHAR, r.title, r.date, r.url, {snippet}
+            FROM (
+                SELECT url, text, fts_main_{self.store.text_table}.match_bm25(url, ?, conjunctive := 1) AS score
+                FROM {self.store.text_table}
+            ) t JOIN {self.store.table} r ON r.url = t.url
+            WHERE score IS NOT NULL
+            ORDER BY score DESC
+            LIMIT ?
+        """
+        return sql, [self.source] + snippet_parameters + [query, limit]
+
+    def _word_query(self, query, limit):
+        words = query_words(query)
+        snippet, snippet_parameters = self._snippet(words[0])
+        occurrences = " + ".join("len(list_filter(t.words, lambda w: w = ?))" for _ in words)
+        sql = f"""
+            SELECT ({occurrences})::DOUBLE AS score, ?::VARCHAR, r.title, r.date, r.url, {snippet}
+            FROM (
+                SELECT url, text, string_split_regex(lower(text), '{WORD_SEPARATOR}') AS words
+                FROM {self.store.text_table}
+            ) t JOIN {self.store.table} r ON r.url = t.url
+            WHERE {' AND '.join('list_contains(t.words, ?)' for _ in words)}
+            ORDER BY score DESC
+            LIMIT ?
+        """
+        return sql, words + [self.source] + snippet_parameters + words + [limit]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        # [(score, source, title, date, url, snippet)], best match first.
+        if not query_words(query):
+            return []
+        if self.use_fts and not self.index_is_current():
+            self.build_index()
+        sql, parameters = (self._fts_query if self.use_fts else self._word_query)(query, limit)
+        try:
+            return self.store.fetchall(sql, parameters)
+        except Exception as e:
+            logger.error(f"Error searching {self.source}: {e}")
+            return []
+
+
+def search_sources(searches, query, limit=DEFAULT_LIMIT):
+    # Merges the best matches of every source into one ranking. Scores of
+    # different indexes (or of BM25 and word counts) are not comparable, so
+    # each source's are divided by its best one before merging.
+    matches = []
+    for text_search in searches:
+        found = text_search.search(query, limit)
+        best = max((match[0] for match in found), default=0) or 1
+        matches += [(match[0] / best,) + tuple(match[1:]) for match in found]
+    return sorted(matches, key=lambda match: match[0], reverse=True)[:limit]
+
+
+def open_search(name):
+    # No dedup index: searching only reads.
+    return TextSearch(load_source(name).open_store(dedup_mode=None), name)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search the extracted text of every scraped source.")
+    parser.add_argument("query", help="words that must all occur in a match")
+    parser.add_argument("--source", dest="sources", action="append", choices=sorted(SOURCES),
+                        help="search only this source, may be repeated; all of them by default")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="matches to show")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the full-text indexes before searching")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    searches = [open_search(name) for name in args.sources or sorted(SOURCES)]
+    if args.reindex:
+        for text_search in searches:
+            text_search.build_index()
+    for score, source, title, date, url, snippet in search_sources(searches, args.query, args.limit):
+        print(f"{score:8.3f}  {source}  {date}  {title}\n          {url}\n          {' '.join(snippet.split())}")
@@ -1,222 +1,413 @@
 import os
+import sys
 import logging
+import argparse
+import asyncio
+import itertools
 import requests
-from bs4 import BeautifulSoup
-from fpdf import FPDF
-import duckdb
 import urllib3
+from store import DuckDBStore, DEFAULT_BATCH_SIZE
+from render import format_title, DEFAULT_RENDER_WORKERS
+from dedup import DEDUP_SET, DEDUP_MODES
+from sitemap import SitemapState, read_sitemap, ENTRY_UPDATED
+from runner import Runner, Source, Item, Extracted
+from response_cache import open_cache, CACHE_MAX_MB, CACHE_MAX_AGE_DAYS
+from metrics import get_metrics, write_metrics, profiled, PROFILE_MODES
+from extraction import (parse_tree, class_strainer, find_first, element_text, content_text, soup_content_text,
+                        use_extractor, get_extractor, EXTRACTOR_FAST, EXTRACTOR_SOUP, EXTRACTORS)
+from http_client import (get_client, configure_client, DEFAULT_POOL_SIZE, DEFAULT_USER_AGENT, MAX_CONCURRENCY_PER_HOST,
+                         RATE_LIMIT_PER_HOST, MAX_RETRIES)
 
 # Suppress insecure request warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Constants
 XML_URL_TEMPLATE = "https://sebenarnya.my/wp-sitemap-posts-post-{}.xml"
+SITEMAP_INDEX_URL = "https://sebenarnya.my/wp-sitemap.xml"
+SITEMAP_PAGE_PATTERN = "wp-sitemap-posts-post-"
 PDF_STORE_PATH = "../uningest/"
 DATABASE_STORE_PATH = "../database/"
+CACHE_STORE_PATH = "../cache/sebenarnyamy/"
 NUMBER_PAGE_START = 1
+ARTICLE_CLASSES = ("entry-title", "entry-date", "td-post-content")  # all an article's extraction looks at
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Ensure necessary directories exist
-os.makedirs(PDF_STORE_PATH, exist_ok=True)
-os.makedirs(DATABASE_STORE_PATH, exist_ok=True)
+class SebenarnyaMYData(DuckDBStore):
+    table = "SebenarnyaMY"
+    columns = ("title", "date", "url")
 
-class SebenarnyaMYData:
-    def __init__(self, db_path=os.path.join(DATABASE_STORE_PATH, "SebenarnyaMY.db")):
-        self.database = db_path
-        self._initialize_db()
+    def __init__(self, db_path=os.path.join(DATABASE_STORE_PATH, "SebenarnyaMY.db"), batch_size=DEFAULT_BATCH_SIZE,
+                 dedup_mode=DEDUP_SET):
+        super().__init__(db_path, batch_size, dedup_mode)
 
     def _initialize_db(self):
         try:
-            with duckdb.connect(self.database) as conn:
-                conn.execute("""
-                    CREATE TABLE IF NOT EXISTS SebenarnyaMY (
-                        number INTEGER PRIMARY KEY,
-                        title VARCHAR NOT NULL,
-                        date DATE NOT NULL,
-                        url VARCHAR NOT NULL
-                    );
-                    CREATE SEQUENCE IF NOT EXISTS seq_number START 1;
-                """)
+            self.execute("""
+                CREATE TABLE IF NOT EXISTS SebenarnyaMY (
+                    number INTEGER PRIMARY KEY,
+                    title VARCHAR NOT NULL,
+                    date DATE NOT NULL,
+                    url VARCHAR NOT NULL
+                );
+                CREATE SEQUENCE IF NOT EXISTS seq_number START 1;
+                CREATE INDEX IF NOT EXISTS idx_sebenarnyamy_url ON SebenarnyaMY (url);
+            """)
             logger.info("Database initialized.")
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
 
-    def create_record(self, title, date, url):
-        try:
-            with duckdb.connect(self.database) as conn:
-                query = "INSERT INTO SebenarnyaMY (number, title, date, url) VALUES (NEXTVAL('seq_number'), ?, ?, ?)"
-                conn.execute(query, (title, date, url))
-            logger.info(f"Record created: {title}, {date}, {url}")
-        except Exception as e:
-            logger.error(f"Error creating record: {e}")
-
-    def read_records(self):
-        try:
-            with duckdb.connect(self.database) as conn:
-                return conn.execute("SELECT * FROM SebenarnyaMY").fetchall()
-        except Exception as e:
-            logger.error(f"Error reading records: {e}")
-            return []
-
     def update_record(self, number, new_title=None, new_date=None, new_url=None):
-        updates = []
-        parameters = []
-
-        if new_title:
-            updates.append("title = ?")
-            parameters.append(new_title)
-        if new_date:
-            updates.append("date = ?")
-            parameters.append(new_date)
-        if new_url:
-            updates.append("url = ?")
-            parameters.append(new_url)
-
-        if updates:
-            parameters.append(number)
-            query = f"UPDATE SebenarnyaMY SET {', '.join(updates)} WHERE number = ?"
-            try:
-                with duckdb.connect(self.database) as conn:
-                    conn.execute(query, parameters)
-                logger.info(f"Record updated: {number}")
-            except Exception as e:
-                logger.error(f"Error updating record: {e}")
-
-    def delete_record(self, number):
-        try:
-            with duckdb.connect(self.database) as conn:
-                conn.execute("DELETE FROM SebenarnyaMY WHERE number = ?", (number,))
-            logger.info(f"Record deleted: {number}")
-        except Exception as e:
-            logger.error(f"Error deleting record: {e}")
+        self.update_columns(number, {'title': new_title, 'date': new_date, 'url': new_url})
 
-    def get_latest_records(self, limit=10):
-        try:
-            with duckdb.connect(self.database) as conn:
-                query = "SELECT * FROM SebenarnyaMY ORDER BY date DESC LIMIT ?"
-                return conn.execute(query, (limit,)).fetchall()
-        except Exception as e:
-            logger.error(f"Error getting latest records: {e}")
-            return []
-
-    def is_link_in_database(self, url):
-        query = "SELECT 1 FROM SebenarnyaMY WHERE url = ? LIMIT 1"
-        try:
-            with duckdb.connect(self.database) as conn:
-                result = conn.execute(query, (url,)).fetchone()
-            return result is not None
-        except Exception as e:
-            logger.error(f"Error checking link in database: {e}")
-            return False
-
-def fetch_html(url):
+def fetch_response(url, headers=None, stream=False):
     try:
-        response = requests.get(url, verify=False)
-        response.raise_for_status()
-        return response.text
+        return get_client().get(url, headers=headers, stream=stream)
     except requests.RequestException as e:
         logger.error(f"Error fetching {url}: {e}")
-        return ""
+        return None
+
+def fetch_html(url):
+    response = fetch_response(url)
+    return response.text if response is not None else ""
 
-def parse_html(html):
+def parse_html(html, parse_only=None):
+    # bs4 is only needed when lxml is missing or reads a page differently.
+    from bs4 import BeautifulSoup
     try:
-        soup = BeautifulSoup(html, 'html.parser')
+        with get_metrics().timed("parse"):
+            soup = BeautifulSoup(html, 'html.parser', parse_only=parse_only)
         return soup
     except Exception as e:
         logger.error(f"Error parsing HTML: {e}")
         return None
 
+def article_header(link, title, date):
+    return f'Source: Sebenarnya My ({link})\nTitle: {title}\nDate: {date}\n'
+
 def extract_info_from_soup(soup, link):
     try:
-        title_tag = soup.find('h1', {'class': 'entry-title'})
-        title = title_tag.get_text(strip=True) if title_tag else link.split('/')[-2]
+        with get_metrics().timed("extract"):
+            title_tag = soup.find('h1', {'class': 'entry-title'})
+            title = title_tag.get_text(strip=True) if title_tag else link.split('/')[-2]
 
-        date_tag = soup.find('time', {'class': 'entry-date'})
-        date = date_tag.get_text(strip=True) if date_tag else "26/11/2002"
+            date_tag = soup.find('time', {'class': 'entry-date'})
+            date = date_tag.get_text(strip=True) if date_tag else "26/11/2002"
 
-        content_div = soup.find('div', {'class': 'td-post-content'})
-        content_text = ""
-        if content_div:
-            tags_of_interest = ['p', 'ol', 'ul', 'li']
-            elements = content_div.find_all(tags_of_interest)
-            content_text += f'Source: Sebenarnya My ({link})\nTitle: {title}\nDate: {date}\n'
-            for element in elements:
-                content_text += element.get_text(strip=True) + ' '
+            content_div = soup.find('div', {'class': 'td-post-content'})
+            content_text = ""
+            if content_div:
+                content_text = article_header(link, title, date) + soup_content_text(content_div)
 
         return title, date, content_text
     except Exception as e:
         logger.error(f"Error extracting info from soup: {e}")
         return "", "", ""
 
-def format_title(title):
+def extract_info_from_tree(root, link):
+    # extract_info_from_soup for an lxml tree.
     try:
-        title_part = title.split(':')[-1].strip()
-        max_length = 40
-        if len(title_part) > max_length:
-            title_part = title_part[:max_length]
-        return title_part.replace('/', '-').replace('\\', '-')
-    except Exception as e:
-        logger.error(f"Error formatting title: {e}")
-        return "untitled"
-
-def save_text_to_pdf(text, output_file):
-    try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        latin_text = text.encode('latin-1', 'replace').decode('latin-1')
-        cell_width = 190
-        cell_height = 10
-        pdf.multi_cell(cell_width, cell_height, txt=latin_text, align='L')
-        pdf.output(output_file)
-        logger.info(f"PDF saved: {output_file}")
-    except Exception as e:
-        logger.error(f"Error saving PDF: {e}")
+        with get_metrics().timed("extract"):
+            title_tag = find_first(root, 'h1', 'entry-title')
+            title = element_text(title_tag) if title_tag is not None else link.split('/')[-2]
 
-def main():
-    sebenarnyaMYData = SebenarnyaMYData()
-    page_number = NUMBER_PAGE_START
+            date_tag = find_first(root, 'time', 'entry-date')
+            date = element_text(date_tag) if date_tag is not None else "26/11/2002"
 
-    while True:
-        xml_url = XML_URL_TEMPLATE.format(page_number)
-        xml_content = fetch_html(xml_url)
+            content_div = find_first(root, 'div', 'td-post-content')
+            text = ""
+            if content_div is not None:
+                text = article_header(link, title, date) + content_text(content_div)
 
-        if not xml_content:
-            logger.info(f"Stopping. No content found at page {page_number}.")
-            break
-
-        xml_parts = xml_content.split("<loc>")
-        logger.info(f"Page {page_number}")
-        logger.info(f"Total links: {len(xml_parts) - 1}")
-
-        for part in xml_parts[1:]:
-            link = part.split("</loc>")[0].strip()
-            logger.info(f"Processing link: {link}")
-
-            if not sebenarnyaMYData.is_link_in_database(link):
-                html_content = fetch_html(link)
-                soup = parse_html(html_content)
-                if soup:
-                    title, date, content_text = extract_info_from_soup(soup, link)
+        return title, date, text
+    except Exception as e:
+        logger.error(f"Error extracting info from tree: {e}")
+        return "", "", ""
 
-                    formatted_date = date.split('/')[2] + "-" + date.split('/')[1] + "-" + date.split('/')[0]
-                    sanitized_title = format_title(title)
-                    filename = os.path.join(PDF_STORE_PATH, f"{formatted_date}_{sanitized_title}.pdf")
+def extract_article(html_content, link, extractor=None):
+    # (title, date, content_text) of an article page, or None if it cannot be
+    # parsed. The fast extractor reads only the title, date and content with
+    # lxml, or with a strained html.parser where lxml would read the page
+    # differently; both give exactly what the full soup gives.
+    if (extractor or get_extractor()) == EXTRACTOR_FAST:
+        root = parse_tree(html_content)
+        if root is not None:
+            return extract_info_from_tree(root, link)
+        soup = parse_html(html_content, class_strainer(*ARTICLE_CLASSES))
+    else:
+        soup = parse_html(html_content)
+    if not soup:
+        return None
+    return extract_info_from_soup(soup, link)
+
+def format_date(date):
+    date_parts = date.split('/')
+    return date_parts[2] + "-" + date_parts[1] + "-" + date_parts[0]
+
+def prepare_article(html_content, link, pdf_store_path=PDF_STORE_PATH, cache=None, content_hash=None,
+                    check_unchanged=True):
+    # Everything about one article short of rendering and committing it:
+    # (title, formatted_date, content_text, filename), or None if it cannot
+    # be read. filename is None when there is no PDF to render, in text-only
+    # crawls or when an unchanged body keeps its existing PDF.
+    extracted = extract_article(html_content, link) if html_content else None
+    if not extracted:
+        return None
 
-                    save_text_to_pdf(content_text, filename)
-                    sebenarnyaMYData.create_record(title, date, link)
-                    logger.info(f"Added: {link}")
-                else:
-                    logger.warning(f"Failed to parse HTML for link: {link}")
-            else:
-                logger.info(f"Already in database: {link}")
+    title, date, content_text = extracted
 
-        page_number += 1
+    try:
+        formatted_date = format_date(date)
+    except Exception as e:
+        logger.error(f"Error reading date '{date}' of {link}: {e}")
+        return None
+    if pdf_store_path is None:
+        return title, formatted_date, content_text, None
+    filename = os.path.join(pdf_store_path, f"{formatted_date}_{format_title(title)}.pdf")
+    if check_unchanged and cache is not None and cache.is_unchanged(link, content_hash, filename):
+        logger.debug(f"Content unchanged, keeping {filename}")
+        filename = None
+    return title, formatted_date, content_text, filename
+
+def read_sitemap_index(index_url):
+    response = fetch_response(index_url, stream=True)
+    if response is None:
+        return []
+    sitemaps, _ = read_sitemap(response, kind="sitemap")
+    page_urls = [loc for loc, _ in sitemaps if SITEMAP_PAGE_PATTERN in loc]
+    logger.info(f"Sitemap index lists {len(page_urls)} post sitemaps.")
+    return page_urls
+
+def sitemap_page_urls(xml_url_template, index_page_urls):
+    # Pages listed by the sitemap index, or numbered pages probed until the
+    # first empty one when there is no index.
+    if index_page_urls:
+        return index_page_urls, False
+    return (xml_url_template.format(n) for n in itertools.count(NUMBER_PAGE_START)), True
+
+def fetch_article(link, cache=None):
+    # Returns (html, content_hash); the hash is None when caching is off.
+    if cache is None:
+        return fetch_html(link), None
+    return cache.fetch_text(link, fetch_html)
+
+class SebenarnyaMYSource(Source):
+    # Runner plugin: articles listed by the post sitemaps. In incremental
+    # mode sitemap pages are requested conditionally and known articles are
+    # only scraped again once their <lastmod> moves on. With a cache the
+    # article bodies are kept, and reparse_from_cache rebuilds every cached
+    # article without any network I/O.
+    name = "sebenarnyamy"
+    store_class = SebenarnyaMYData
+
+    def __init__(self, xml_url_template=XML_URL_TEMPLATE, sitemap_index_url=SITEMAP_INDEX_URL,
+                 pdf_store_path=PDF_STORE_PATH, db_path=None, incremental=False, cache_dir=None,
+                 cache_max_mb=CACHE_MAX_MB, cache_max_age_days=CACHE_MAX_AGE_DAYS, reparse_from_cache=False):
+        self.xml_url_template = xml_url_template
+        self.sitemap_index_url = sitemap_index_url
+        self.pdf_store_path = pdf_store_path
+        self.db_path = db_path
+        self.incremental = incremental and not reparse_from_cache
+        self.cache_dir = cache_dir or (CACHE_STORE_PATH if reparse_from_cache else None)
+        self.cache_max_mb = cache_max_mb
+        self.cache_max_age_days = cache_max_age_days
+        self.reparse_from_cache = reparse_from_cache
+        self.cache = None
+        self.sitemap_state = None
+        self._pages = []
+
+    def start(self, store):
+        self.cache = open_cache(store.database, self.cache_dir, self.cache_max_mb, self.cache_max_age_days,
+                                offline=self.reparse_from_cache)
+        self.sitemap_state = SitemapState(store.database) if self.incremental else None
+        self._pages = []
+
+    def discover(self):
+        if self.reparse_from_cache:
+            for link in self.cache.urls():
+                yield Item(link, None)
+            return
+        index_page_urls = read_sitemap_index(self.sitemap_index_url) if self.sitemap_index_url else []
+        page_urls, probing = sitemap_page_urls(self.xml_url_template, index_page_urls)
+        for page_number, xml_url in enumerate(page_urls, NUMBER_PAGE_START):
+            headers = self.sitemap_state.conditional_headers(xml_url) if self.sitemap_state else None
+            response = fetch_response(xml_url, headers, stream=True)
+            if response is not None and response.status_code == 304:
+                logger.info(f"Page {page_number} unchanged since last run.")
+                response.close()
+                continue
+
+            # The entries are read up front so the sitemap connection is not
+            # held open while the items are written to the frontier.
+            entries, complete = read_sitemap(response) if response is not None else ([], False)
+            if not entries and probing:
+                logger.info(f"Stopping. No content found at page {page_number}.")
+                break
+            logger.info(f"Page {page_number}: {len(entries)} links")
+            if self.sitemap_state is not None and complete:
+                self._pages.append((xml_url, response.headers, [link for link, _ in entries]))
+            for link, lastmod in entries:
+                yield Item(link, lastmod)
+
+    def refresh(self, item):
+        if self.reparse_from_cache:
+            return True
+        if self.sitemap_state is None:
+            return False
+        status = self.sitemap_state.classify(item.url, item.context, True)
+        if status != ENTRY_UPDATED and self.sitemap_state.stored_lastmod(item.url) is None:
+            # Scraped before incremental mode was used; remember its lastmod.
+            self.sitemap_state.record_entry(item.url, item.context)
+        return status == ENTRY_UPDATED
+
+    def extract(self, item):
+        if self.reparse_from_cache:
+            html_content, content_hash = self.cache.read_text(item.url)
+        else:
+            html_content, content_hash = fetch_article(item.url, self.cache)
+        prepared = prepare_article(html_content, item.url, self.pdf_store_path, self.cache, content_hash,
+                                   check_unchanged=not self.reparse_from_cache)
+        if not prepared:
+            return None
+        title, formatted_date, content_text, filename = prepared
+        return Extracted((title, formatted_date, item.url), filename, content_text, None, content_hash)
+
+    def committed(self, item, extracted):
+        if self.sitemap_state is not None:
+            self.sitemap_state.record_entry(item.url, item.context)
+        if self.cache is not None:
+            self.cache.mark_rendered(item.url, extracted.content_hash)
+
+    def finish(self, store, failed):
+        # A page's validators are only stored once its records are durable
+        # and none of its entries failed, otherwise a 304 would hide the
+        # missing items forever.
+        if self.sitemap_state is not None:
+            self.sitemap_state.flush()
+            for xml_url, response_headers, links in self._pages:
+                if failed.isdisjoint(links):
+                    self.sitemap_state.save_page(xml_url, response_headers)
+        if self.cache is not None:
+            self.cache.evict()
+
+def main(xml_url_template=XML_URL_TEMPLATE, pdf_store_path=PDF_STORE_PATH, db_path=None,
+         batch_size=DEFAULT_BATCH_SIZE, dedup_mode=DEDUP_SET, incremental=False, sitemap_index_url=SITEMAP_INDEX_URL,
+         render_workers=DEFAULT_RENDER_WORKERS, cache_dir=None, cache_max_mb=CACHE_MAX_MB,
+         cache_max_age_days=CACHE_MAX_AGE_DAYS, reparse_from_cache=False, resume=False, retry_failed=False):
+    # One article at a time, while the render workers each have up to two
+    # PDFs in hand.
+    runner = Runner(2 * render_workers + 1, 1, 0, render_workers, batch_size, dedup_mode, respect_robots=False)
+    source = SebenarnyaMYSource(xml_url_template, sitemap_index_url, pdf_store_path, db_path, incremental, cache_dir,
+                                cache_max_mb, cache_max_age_days, reparse_from_cache)
+    asyncio.run(runner.run([source], resume, retry_failed, include_failed=True))
+    logger.info("Sebenarnya My Scrap - update done!")
 
+async def main_async(xml_url_template=XML_URL_TEMPLATE, pdf_store_path=PDF_STORE_PATH, db_path=None,
+                     max_concurrency=MAX_CONCURRENCY_PER_HOST, rate_limit=RATE_LIMIT_PER_HOST,
+                     batch_size=DEFAULT_BATCH_SIZE, dedup_mode=DEDUP_SET, incremental=False,
+                     sitemap_index_url=SITEMAP_INDEX_URL, render_workers=DEFAULT_RENDER_WORKERS, cache_dir=None,
+                     cache_max_mb=CACHE_MAX_MB, cache_max_age_days=CACHE_MAX_AGE_DAYS, respect_robots=True,
+                     resume=False, retry_failed=False):
+    runner = Runner(max_concurrency, max_concurrency, rate_limit, render_workers, batch_size, dedup_mode,
+                    respect_robots)
+    source = SebenarnyaMYSource(xml_url_template, sitemap_index_url, pdf_store_path, db_path, incremental, cache_dir,
+                                cache_max_mb, cache_max_age_days)
+    await runner.run([source], resume, retry_failed, include_failed=True)
     logger.info("Sebenarnya My Scrap - update done!")
 
+def check_extraction(cache):
+    # Golden check over the saved pages: the fast extractor must give exactly
+    # the title, date and text the full soup gives. Returns the pages that differ.
+    checked = differ = 0
+    for link in cache.urls():
+        html_content, _ = cache.read_text(link)
+        if not html_content:
+            continue
+        checked += 1
+        if extract_article(html_content, link, EXTRACTOR_FAST) != extract_article(html_content, link, EXTRACTOR_SOUP):
+            logger.error(f"Fast extraction differs from the full soup for {link}")
+            differ += 1
+    logger.info(f"Extraction check: {differ} of {checked} cached articles differ.")
+    return differ
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape sebenarnya.my articles into PDFs.")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="fetch articles concurrently")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY_PER_HOST,
+                        help="most in-flight requests per host in async mode; the actual number adapts to the host")
+    parser.add_argument("--rate-limit", type=float, default=RATE_LIMIT_PER_HOST,
+                        help="max requests per second per host in async mode, 0 to disable")
+    parser.add_argument("--ignore-robots", dest="respect_robots", action="store_false",
+                        help="do not slow down to the crawl-delay of robots.txt in async mode")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES,
+                        help="retries for timeouts, 429 and 5xx responses")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="records buffered before they are written to the database in one transaction")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="HTTP connections kept alive per host, raised to --concurrency in async mode")
+    parser.add_argument("--user-agent", default=DEFAULT_USER_AGENT, help="User-Agent header sent with every request")
+    parser.add_argument("--no-sitemap-index", dest="use_sitemap_index", action="store_false",
+                        help="probe numbered sitemap pages until the first empty one instead of reading wp-sitemap.xml")
+    parser.add_argument("--render-workers", type=int, default=DEFAULT_RENDER_WORKERS,
+                        help="worker processes that render PDFs while scraping continues, 0 renders inline")
+    parser.add_argument("--incremental", action="store_true",
+                        help="send conditional requests for sitemap pages and only scrape new or updated entries")
+    parser.add_argument("--dedup-index", choices=DEDUP_MODES, default=DEDUP_SET,
+                        help="in-memory index of known URLs: an exact set, or a bloom filter with bounded memory")
+    parser.add_argument("--cache", dest="use_cache", action="store_true",
+                        help="keep compressed copies of fetched articles and skip re-rendering unchanged ones")
+    parser.add_argument("--cache-dir", default=CACHE_STORE_PATH, help="directory of the response cache")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_MB,
+                        help="evict the oldest cached responses beyond this size, 0 keeps everything")
+    parser.add_argument("--cache-max-age-days", type=float, default=CACHE_MAX_AGE_DAYS,
+                        help="evict cached responses older than this, 0 keeps everything")
+    parser.add_argument("--reparse-from-cache", action="store_true",
+                        help="rebuild PDFs and records from the response cache without any network access")
+    parser.add_argument("--no-pdf", dest="render_pdfs", action="store_false",
+                        help="only store records and their text, without rendering PDFs")
+    parser.add_argument("--extractor", choices=EXTRACTORS, default=EXTRACTOR_FAST,
+                        help="read articles with lxml/a strained parse (fast) or a full BeautifulSoup tree (soup)")
+    parser.add_argument("--check-extraction", action="store_true",
+                        help="compare both extractors on every page in the response cache and exit")
+    parser.add_argument("--frontier", action="store_true",
+                        help="the same as --async, kept for older scripts: every run now tracks its items in a "
+                             "persistent work queue")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the previous run from its work queue, skipping discovery if it had completed")
+    parser.add_argument("--retry-failed", action="store_true", help="only retry items that failed in earlier runs")
+    parser.add_argument("--metrics-out", help="write a run summary as JSON, or as a Prometheus textfile if it ends in .prom")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="profile the run with cProfile (cpu) or tracemalloc (memory)")
+    parser.add_argument("--profile-out", help="where to write the profile, by default in the working directory")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    main()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    use_async = (args.use_async or args.frontier) and not args.reparse_from_cache
+    sitemap_index_url = SITEMAP_INDEX_URL if args.use_sitemap_index else None
+    pool_size = max(args.pool_size, args.concurrency) if use_async else args.pool_size
+    configure_client(pool_size=pool_size, user_agent=args.user_agent, retries=args.retries)
+    cache_dir = args.cache_dir if args.use_cache or args.reparse_from_cache else None
+    use_extractor(args.extractor)
+    pdf_store_path = PDF_STORE_PATH if args.render_pdfs else None
+    render_workers = args.render_workers if args.render_pdfs else 0
+    if args.check_extraction:
+        cache = open_cache(SebenarnyaMYData(dedup_mode=None).database, args.cache_dir, offline=True)
+        sys.exit(1 if check_extraction(cache) else 0)
+    with profiled(args.profile, args.profile_out):
+        if use_async:
+            asyncio.run(main_async(pdf_store_path=pdf_store_path, max_concurrency=args.concurrency,
+                                   rate_limit=args.rate_limit, batch_size=args.batch_size, dedup_mode=args.dedup_index,
+                                   incremental=args.incremental, sitemap_index_url=sitemap_index_url,
+                                   render_workers=render_workers, cache_dir=cache_dir, cache_max_mb=args.cache_max_mb,
+                                   cache_max_age_days=args.cache_max_age_days, respect_robots=args.respect_robots,
+                                   resume=args.resume, retry_failed=args.retry_failed))
+        else:
+            main(pdf_store_path=pdf_store_path, batch_size=args.batch_size, dedup_mode=args.dedup_index,
+                 incremental=args.incremental, sitemap_index_url=sitemap_index_url, render_workers=render_workers,
+                 cache_dir=cache_dir, cache_max_mb=args.cache_max_mb, cache_max_age_days=args.cache_max_age_days,
+                 reparse_from_cache=args.reparse_from_cache, resume=args.resume, retry_failed=args.retry_failed)
+    if args.metrics_out:
+        write_metrics(args.metrics_out)
@@ -0,0 +1,175 @@
+import logging
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+from store import get_connection, connection_lock, staged_rows, csv_source
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+ENTRY_NEW = "new"
+ENTRY_UPDATED = "updated"
+ENTRY_UNCHANGED = "unchanged"
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _read_entry(element):
+    loc = lastmod = None
+    for child in element:
+        child_name = _local_name(child.tag)
+        if child_name == "loc":
+            loc = (child.text or "").strip()
+        elif child_name == "lastmod":
+            lastmod = (child.text or "").strip() or None
+    return loc, lastmod
+
+
+def iter_sitemap(source):
+    # Yields ("url" | "sitemap", loc, lastmod) from a urlset or sitemap index
+    # as the bytes are read. Finished elements are dropped from the tree, so
+    # memory does not grow with the size of the document.
+    root = None
+    for event, element in ElementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+        name = _local_name(element.tag)
+        if name not in ("url", "sitemap"):
+            continue
+        loc, lastmod = _read_entry(element)
+        if loc:
+            yield name, loc, lastmod
+        root.clear()
+
+
+def read_sitemap(response, kind="url"):
+    # Reads a streamed requests response and returns (entries, complete);
+    # complete is False if the body was cut short or malformed.
+    entries = []
+    try:
+        response.raw.decode_content = True
+        for name, loc, lastmod in iter_sitemap(response.raw):
+            if name == kind:
+                entries.append((loc, lastmod))
+        get_metrics().add_bytes(response.raw.tell())
+        return entries, True
+    except Exception as e:
+        logger.error(f"Error parsing sitemap {response.url}: {e}")
+        return entries, False
+    finally:
+        response.close()
+
+
+def parse_lastmod(lastmod):
+    if not lastmod:
+        return None
+    try:
+        parsed = datetime.fromisoformat(lastmod.strip())
+    except ValueError:
+        logger.warning(f"Unrecognised lastmod: {lastmod}")
+        return None
+    # Date-only values carry no timezone; treat them as UTC so they compare
+    # with the timestamped ones.
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class SitemapState:
+    # Validators of every sitemap page and the <lastmod> of every entry, kept
+    # next to the scraped records so incremental runs can skip unchanged work.
+    def __init__(self, database):
+        self.database = database
+        self._pending_entries = {}
+        self._initialize_db()
+        self.entries = self._load_entries()
+
+    def _initialize_db(self):
+        try:
+            with connection_lock(self.database):
+                get_connection(self.database).execute("""
+                    CREATE TABLE IF NOT EXISTS sitemap_pages (
+                        url VARCHAR PRIMARY KEY,
+                        etag VARCHAR,
+                        last_modified VARCHAR,
+                        fetched_at TIMESTAMP
+                    );
+                    CREATE TABLE IF NOT EXISTS sitemap_entries (
+                        url VARCHAR PRIMARY KEY,
+                        lastmod VARCHAR
+                    );
+                """)
+        except Exception as e:
+            logger.error(f"Error initializing sitemap state: {e}")
+
+    def conditional_headers(self, page_url):
+        try:
+            with connection_lock(self.database):
+                row = get_connection(self.database).execute(
+                    "SELECT etag, last_modified FROM sitemap_pages WHERE url = ?", (page_url,)
+                ).fetchone()
+        except Exception as e:
+            logger.error(f"Error reading sitemap page state: {e}")
+            return {}
+        headers = {}
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def save_page(self, page_url, response_headers):
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        try:
+            with connection_lock(self.database):
+                get_connection(self.database).execute(
+                    "INSERT OR REPLACE INTO sitemap_pages VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+                    (page_url, etag, last_modified),
+                )
+        except Exception as e:
+            logger.error(f"Error saving sitemap page state: {e}")
+
+    def _load_entries(self):
+        # All known lastmods in one query; binding a list of URLs per page
+        # would cost more than holding them in memory.
+        try:
+            with connection_lock(self.database):
+                rows = get_connection(self.database).execute("SELECT url, lastmod FROM sitemap_entries").fetchall()
+            return dict(rows)
+        except Exception as e:
+            logger.error(f"Error reading sitemap entries: {e}")
+            return {}
+
+    def stored_lastmod(self, url):
+        return self._pending_entries.get(url, self.entries.get(url))
+
+    def classify(self, url, lastmod, known):
+        if not known:
+            return ENTRY_NEW
+        new_time = parse_lastmod(lastmod)
+        stored_time = parse_lastmod(self.stored_lastmod(url))
+        if new_time and stored_time and new_time > stored_time:
+            return ENTRY_UPDATED
+        return ENTRY_UNCHANGED
+
+    def record_entry(self, url, lastmod):
+        if lastmod:
+            self._pending_entries[url] = lastmod
+
+    def flush(self):
+        if not self._pending_entries:
+            return
+        rows, self._pending_entries = list(self._pending_entries.items()), {}
+        self.entries.update(rows)
+        try:
+            with staged_rows(rows, prefix="sitemap_entries") as staging_path:
+                with connection_lock(self.database):
+                    get_connection(self.database).execute(
+                        f"INSERT OR REPLACE INTO sitemap_entries SELECT url, lastmod FROM {csv_source(('url', 'lastmod'))}",
+                        (staging_path,),
+                    )
+        except Exception as e:
+            logger.error(f"Error saving sitemap entries: {e}")
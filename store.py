@@ -0,0 +1,324 @@
+import os
+import csv
+import atexit
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import duckdb
+
+from dedup import SeenUrlIndex, DEDUP_SET, MIN_BLOOM_CAPACITY
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+URL_INDEX_FETCH_SIZE = 10000
+
+_connections = {}
+_connection_locks = {}
+_registry_lock = threading.Lock()
+
+
+def get_connection(database):
+    with _registry_lock:
+        conn = _connections.get(database)
+        if conn is None:
+            directory = os.path.dirname(database)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = duckdb.connect(database)
+            _connections[database] = conn
+            _connection_locks[database] = threading.RLock()
+        return conn
+
+
+def connection_lock(database):
+    get_connection(database)
+    return _connection_locks[database]
+
+
+def close_connection(database):
+    with _registry_lock:
+        conn = _connections.pop(database, None)
+        _connection_locks.pop(database, None)
+    if conn is not None:
+        conn.close()
+
+
+def close_all_connections():
+    for database in list(_connections):
+        close_connection(database)
+
+
+atexit.register(close_all_connections)
+
+
+@contextmanager
+def staged_rows(rows, prefix="rows"):
+    # Binding Python parameters costs DuckDB about a millisecond per row even
+    # in a multi-row VALUES list, so bulk writes are staged as a CSV file and
+    # loaded with a single read_csv statement instead.
+    fd, staging_path = tempfile.mkstemp(prefix=f"{prefix}-", suffix=".csv")
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as staging_file:
+            csv.writer(staging_file, quoting=csv.QUOTE_ALL, lineterminator='\n').writerows(rows)
+        yield staging_path
+    finally:
+        os.remove(staging_path)
+
+
+def csv_source(columns):
+    # Table function reading a staged_rows() file, to be bound with its path.
+    # Every field is quoted and quoted values are never NULL, so empty strings
+    # survive the round trip. Columns are read as VARCHAR and DuckDB casts them
+    # to the target column types on insert.
+    column_types = ", ".join(f"'{column}': 'VARCHAR'" for column in columns)
+    return (
+        "read_csv(?, auto_detect = false, header = false, delim = ',', quote = '\"', escape = '\"', "
+        f"new_line = '\\n', allow_quoted_nulls = false, columns = {{{column_types}}})"
+    )
+
+
+class DuckDBStore:
+    table = None
+    columns = ()
+
+    def __init__(self, database, batch_size=DEFAULT_BATCH_SIZE, dedup_mode=DEDUP_SET):
+        self.database = database
+        self.batch_size = batch_size
+        self._pending = []
+        self._pending_urls = set()
+        self._pending_texts = {}
+        self._batch_depth = 0
+        self._initialize_db()
+        self._initialize_text_table()
+        self.url_index = self._load_url_index(dedup_mode)
+
+    def _initialize_db(self):
+        pass
+
+    @property
+    def text_table(self):
+        return f"{self.table}_text"
+
+    def _initialize_text_table(self):
+        # The plain text each record's PDF was rendered from, keyed by url.
+        try:
+            self.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.text_table} (
+                    url VARCHAR PRIMARY KEY,
+                    text VARCHAR NOT NULL,
+                    updated_at TIMESTAMP NOT NULL
+                )
+            """)
+        except Exception as e:
+            logger.error(f"Error initializing {self.text_table}: {e}")
+
+    def _load_url_index(self, dedup_mode):
+        # Without a dedup mode (read-only uses such as exports) every check
+        # goes to the database.
+        if dedup_mode is None:
+            return None
+        try:
+            with connection_lock(self.database):
+                count = self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+                # Twice the known URLs leaves room for a crawl that doubles them.
+                url_index = SeenUrlIndex(dedup_mode, capacity=max(count * 2, MIN_BLOOM_CAPACITY))
+                cursor = self.connection.execute(f"SELECT url FROM {self.table}")
+                while True:
+                    rows = cursor.fetchmany(URL_INDEX_FETCH_SIZE)
+                    if not rows:
+                        break
+                    url_index.update([row[0] for row in rows])
+            logger.info(f"Loaded {count} known URLs from {self.table} ({dedup_mode} index).")
+            return url_index
+        except Exception as e:
+            logger.error(f"Error loading URL index: {e}")
+            return None
+
+    def invalidate_url_index(self):
+        # Deletes and URL updates cannot be removed from the index, so from now
+        # on every hit is confirmed against the database.
+        if self.url_index is not None:
+            self.url_index.exact = False
+
+    @property
+    def connection(self):
+        return get_connection(self.database)
+
+    def execute(self, query, parameters=None):
+        with connection_lock(self.database):
+            self.connection.execute(query, parameters)
+
+    def fetchall(self, query, parameters=None):
+        with connection_lock(self.database):
+            return self.connection.execute(query, parameters).fetchall()
+
+    def fetchone(self, query, parameters=None):
+        with connection_lock(self.database):
+            return self.connection.execute(query, parameters).fetchone()
+
+    def _insert_query(self):
+        placeholders = ", ".join("?" for _ in self.columns)
+        return f"INSERT INTO {self.table} (number, {', '.join(self.columns)}) VALUES (NEXTVAL('seq_number'), {placeholders})"
+
+    def _bulk_insert_query(self):
+        return (
+            f"INSERT INTO {self.table} (number, {', '.join(self.columns)}) "
+            f"SELECT NEXTVAL('seq_number'), {', '.join(self.columns)} FROM {csv_source(self.columns)}"
+        )
+
+    def _text_upsert_query(self):
+        return (
+            f"INSERT INTO {self.text_table} (url, text, updated_at) "
+            f"SELECT url, text, CURRENT_TIMESTAMP FROM {csv_source(('url', 'text'))} "
+            "ON CONFLICT (url) DO UPDATE SET text = excluded.text, updated_at = excluded.updated_at"
+        )
+
+    def write_texts(self, texts):
+        # texts maps url to text. Returns False if they could not be written.
+        if not texts:
+            return True
+        try:
+            with get_metrics().timed("db_insert"), staged_rows(texts.items(), prefix=self.text_table) as staging_path:
+                self.execute(self._text_upsert_query(), (staging_path,))
+            return True
+        except Exception as e:
+            logger.error(f"Error writing {len(texts)} texts to {self.text_table}: {e}")
+            return False
+
+    def insert_row(self, row, text=None):
+        url = row[self.columns.index('url')]
+        if self._batch_depth == 0:
+            with get_metrics().timed("db_insert"):
+                self.execute(self._insert_query(), row)
+            if text is not None:
+                self.write_texts({url: text})
+        else:
+            self._pending.append(row)
+            self._pending_urls.add(url)
+            if text is not None:
+                self._pending_texts[url] = text
+        if self.url_index is not None:
+            self.url_index.add(url)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def is_pending(self, url):
+        return url in self._pending_urls
+
+    def is_link_in_database(self, url):
+        with get_metrics().timed("db_check"):
+            if self.is_pending(url):
+                return True
+            if self.url_index is not None:
+                if url not in self.url_index:
+                    return False
+                if self.url_index.exact:
+                    return True
+            query = f"SELECT 1 FROM {self.table} WHERE url = ? LIMIT 1"
+            try:
+                return self.fetchone(query, (url,)) is not None
+            except Exception as e:
+                logger.error(f"Error checking link in database: {e}")
+                get_metrics().error("db_check")
+                return False
+
+    def flush(self):
+        # Returns False if the pending records could not be written.
+        if not self._pending:
+            return True
+        rows, self._pending = self._pending, []
+        texts, self._pending_texts = self._pending_texts, {}
+        self._pending_urls = set()
+        try:
+            with get_metrics().timed("db_insert"), staged_rows(rows, prefix=self.table) as staging_path:
+                self.execute(self._bulk_insert_query(), (staging_path,))
+            logger.info(f"Flushed {len(rows)} records to {self.table}.")
+            # A record whose text is lost still counts as written.
+            self.write_texts(texts)
+            return True
+        except Exception as e:
+            logger.error(f"Error flushing {len(rows)} records to {self.table}: {e}")
+            self.invalidate_url_index()
+            return False
+
+    # Record helpers shared by every scraper table. Rows are tuples in
+    # `columns` order and are matched on url; text is the record's extracted
+    # plain text, kept in text_table.
+
+    def create_record(self, *values, text=None):
+        try:
+            self.insert_row(values, text)
+            logger.debug(f"Record created: {', '.join(str(value) for value in values)}")
+            get_metrics().page_done()
+        except Exception as e:
+            logger.error(f"Error creating record: {e}")
+
+    def refresh_record(self, *values, text=None):
+        changes = [(column, value) for column, value in zip(self.columns, values) if column != 'url']
+        url = values[self.columns.index('url')]
+        try:
+            self.flush()
+            with get_metrics().timed("db_insert"):
+                self.execute(
+                    f"UPDATE {self.table} SET {', '.join(f'{column} = ?' for column, _ in changes)} WHERE url = ?",
+                    [value for _, value in changes] + [url],
+                )
+            if text is not None:
+                self.write_texts({url: text})
+            logger.debug(f"Record refreshed: {', '.join(str(value) for value in values)}")
+            get_metrics().page_done()
+        except Exception as e:
+            logger.error(f"Error refreshing record: {e}")
+
+    def read_records(self):
+        try:
+            return self.fetchall(f"SELECT * FROM {self.table}")
+        except Exception as e:
+            logger.error(f"Error reading records: {e}")
+            return []
+
+    def update_columns(self, number, changes):
+        updates = [(column, value) for column, value in changes.items() if value]
+        if not updates:
+            return
+        query = f"UPDATE {self.table} SET {', '.join(f'{column} = ?' for column, _ in updates)} WHERE number = ?"
+        try:
+            self.execute(query, [value for _, value in updates] + [number])
+            if changes.get('url'):
+                self.invalidate_url_index()
+            logger.info(f"Record updated: {number}")
+        except Exception as e:
+            logger.error(f"Error updating record: {e}")
+
+    def delete_record(self, number):
+        try:
+            self.execute(f"DELETE FROM {self.text_table} WHERE url IN (SELECT url FROM {self.table} WHERE number = ?)",
+                         (number,))
+            self.execute(f"DELETE FROM {self.table} WHERE number = ?", (number,))
+            self.invalidate_url_index()
+            logger.info(f"Record deleted: {number}")
+        except Exception as e:
+            logger.error(f"Error deleting record: {e}")
+
+    def get_latest_records(self, limit=10):
+        try:
+            return self.fetchall(f"SELECT * FROM {self.table} ORDER BY date DESC LIMIT ?", (limit,))
+        except Exception as e:
+            logger.error(f"Error getting latest records: {e}")
+            return []
+
+    @contextmanager
+    def batch(self, batch_size=None):
+        if batch_size is not None:
+            self.batch_size = batch_size
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()